@@ -0,0 +1,72 @@
+import codecs
+import os
+import threading
+from collections import OrderedDict
+
+# Bytes read from the start of a file to decide whether it is text
+SNIFF_BYTES = 8192
+
+# Share of control characters above which non-UTF-8 data is considered binary
+CONTROL_CHARACTER_RATIO = 0.1
+
+# Number of (path, mtime, size) results kept in memory
+CACHE_SIZE = 100_000
+
+# Control characters that do not occur in text; bytes.translate deletes everything else
+_TEXT_CONTROL_BYTES = {7, 8, 9, 10, 12, 13, 27}
+_NOT_CONTROL_BYTES = bytes(
+    byte for byte in range(256) if not ((byte < 32 and byte not in _TEXT_CONTROL_BYTES) or byte == 127)
+)
+
+def looks_binary(block: bytes) -> bool:
+    """Sniffs the first block of a file: NUL bytes, or non-UTF-8 data full of control characters."""
+    if not block:
+        return False
+    if block.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return False
+    if b"\0" in block:
+        return True
+    try:
+        # A multi-byte character may be cut at the end of the block, so decode incrementally
+        codecs.getincrementaldecoder("utf-8")().decode(block, final=False)
+        return False
+    except UnicodeDecodeError:
+        pass
+    control = len(block.translate(None, _NOT_CONTROL_BYTES))
+    return control / len(block) > CONTROL_CHARACTER_RATIO
+
+class BinaryFileCache:
+    """Caches binary sniff results per path; an entry is reused while the file's mtime and size are unchanged."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_binary(self, path, stat_result=None) -> bool:
+        path = os.fspath(path)
+        if stat_result is None:
+            stat_result = os.stat(path)
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == key:
+                self._entries.move_to_end(path)
+                return cached[1]
+        with open(path, "rb") as f:
+            result = looks_binary(f.read(SNIFF_BYTES))
+        with self._lock:
+            self._entries[path] = (key, result)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+binary_file_cache = BinaryFileCache(CACHE_SIZE)
+
+def is_binary_file(path, stat_result=None) -> bool:
+    """
+    Tells whether a file looks binary (images, archives, compiled artifacts), so endpoints
+    that read content can skip it. Unreadable files raise OSError like open() would.
+    """
+    return binary_file_cache.is_binary(path, stat_result)
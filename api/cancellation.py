@@ -0,0 +1,36 @@
+from fastapi import HTTPException, Request
+import asyncio
+from api.config import logger
+from api import metrics
+
+# How often the client connection is checked while work is running
+DISCONNECT_POLL_INTERVAL = 0.5
+
+async def run_until_disconnected(request: Request, coro, name: str):
+    """
+    Runs coro as a task and cancels it if the HTTP client disconnects before it finishes,
+    so abandoned requests stop consuming CPU. Cancellations are counted in metrics as
+    "cancelled_on_disconnect.<name>".
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.warning(f"{name} failed while being cancelled: {e}")
+    metrics.increment(f"cancelled_on_disconnect.{name}")
+    logger.info(f"Client disconnected, cancelled {name}")
+    raise HTTPException(status_code=499, detail="Client disconnected.")
@@ -0,0 +1,306 @@
+import asyncio
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+from api.config import COMPRESSION_MIN_SIZE, COMPRESSION_CACHE_MB
+
+# brotli and zstandard are optional; without them responses are gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Preferred first when the client accepts several encodings equally
+ENCODINGS = tuple(
+    name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if module is not None
+)
+
+_TEXT_LEVELS = {"zstd": 6, "br": 5, "gzip": 6}
+
+# Compressed content types and the level used for each encoding. Snapshots and other large
+# JSON bodies are very redundant, so they get higher levels than plain text.
+COMPRESSION_LEVELS = {
+    "application/json": {"zstd": 9, "br": 6, "gzip": 6},
+    "application/javascript": _TEXT_LEVELS,
+    "application/xml": _TEXT_LEVELS,
+    "application/x-yaml": _TEXT_LEVELS,
+    "image/svg+xml": _TEXT_LEVELS,
+}
+
+# Responses with an ETag are compressed once and then served from the cache, so the
+# compression cost is paid once and the highest practical levels are used
+CACHED_LEVELS = {"zstd": 15, "br": 9, "gzip": 9}
+
+# Streamed frame by frame to clients that read them as they arrive
+UNCOMPRESSED_TYPES = ("application/x-ndjson", "text/event-stream")
+
+# Bodies larger than this are compressed in a worker thread instead of the event loop
+THREAD_COMPRESSION_SIZE = 256 * 1024
+
+def negotiate(accept_encoding: str):
+    """Returns the best supported encoding allowed by an Accept-Encoding header, or None."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        name, _, parameters = part.partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            qualities[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compression_levels(status: int, headers: Headers):
+    """Returns the levels to compress a response with, or None if it must be sent as is."""
+    if status < 200 or status in (204, 206, 304):
+        return None
+    if "content-encoding" in headers or "content-range" in headers:
+        return None
+    if "no-transform" in headers.get("cache-control", "").lower():
+        return None
+    media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type in UNCOMPRESSED_TYPES:
+        return None
+    if media_type.startswith("text/"):
+        return COMPRESSION_LEVELS.get(media_type, _TEXT_LEVELS)
+    return COMPRESSION_LEVELS.get(media_type)
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+class StreamEncoder:
+    """Compresses a streamed body chunk by chunk, flushing each chunk so nothing is held back."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes, final: bool) -> bytes:
+        if self.encoding == "zstd":
+            data = self._compressor.compress(chunk)
+            return data + self._compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        if self.encoding == "br":
+            data = self._compressor.process(chunk)
+            return data + (self._compressor.finish() if final else self._compressor.flush())
+        data = self._compressor.compress(chunk)
+        return data + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class EncodedBodyCache:
+    """
+    LRU cache of response bodies keyed by (path, ETag, encoding), bounded by total size.
+    "identity" entries hold uncompressed bodies, so endpoints can skip building a response
+    whose ETag they already served.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, etag: str, encoding: str):
+        with self._lock:
+            body = self._entries.get((path, etag, encoding))
+            if body is not None:
+                self._entries.move_to_end((path, etag, encoding))
+            return body
+
+    def put(self, path: str, etag: str, encoding: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((path, etag, encoding), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[(path, etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+encoded_body_cache = EncodedBodyCache(int(COMPRESSION_CACHE_MB * 1024 * 1024))
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    The ETag of a compressed representation: the encoding is appended to the opaque tag, so
+    the gzip and br bodies of one resource never share a strong ETag.
+    """
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+def decode_if_none_match(if_none_match: str, encoding: str):
+    """
+    Strips the `encoding` suffix from the tags of an If-None-Match header, so endpoints compare
+    them with their own ETags. Returns the new header value and the tags that had the suffix.
+    """
+    tags = []
+    suffixed = set()
+    suffix = f'-{encoding}"'
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.endswith(suffix):
+            tag = tag[:-len(suffix)] + '"'
+            suffixed.add(tag)
+        tags.append(tag)
+    return ", ".join(tags), suffixed
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = vary + ", Accept-Encoding"
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best encoding the client accepts (zstd, br or gzip).
+    Whole bodies under `minimum_size` are sent as is, and bodies with an ETag are cached
+    compressed and sent with an encoding-specific ETag (see encoded_etag); If-None-Match is
+    translated back before it reaches the endpoint. Streamed bodies are compressed chunk by chunk, except NDJSON and
+    server-sent events, which clients read frame by frame. Pure ASGI, like
+    ServerHeaderMiddleware, so client disconnects still reach the endpoints.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, cache: EncodedBodyCache = encoded_body_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        sender = _CompressingSender(self, scope["path"], encoding, send)
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match is not None:
+            scope = dict(scope)
+            headers = MutableHeaders(scope=scope)
+            headers["If-None-Match"], sender.suffixed_etags = decode_if_none_match(if_none_match, encoding)
+        await self.app(scope, receive, sender.send)
+
+    async def encode(self, path: str, etag, body: bytes, encoding: str, levels: dict) -> bytes:
+        if etag is not None:
+            cached = self.cache.get(path, etag, encoding)
+            if cached is not None:
+                return cached
+            level = CACHED_LEVELS[encoding]
+        else:
+            level = levels[encoding]
+        if len(body) > THREAD_COMPRESSION_SIZE:
+            encoded = await asyncio.to_thread(compress, body, encoding, level)
+        else:
+            encoded = compress(body, encoding, level)
+        if etag is not None:
+            self.cache.put(path, etag, encoding, encoded)
+        return encoded
+
+class _CompressingSender:
+    """Wraps the ASGI send of one response; decides on the first body message whether to compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, path: str, encoding: str, send):
+        self.middleware = middleware
+        self.path = path
+        self.encoding = encoding
+        self._send = send
+        self._start = None
+        self._levels = None
+        self._encoder = None
+        # Tags of the request's If-None-Match that carried this encoding's ETag suffix
+        self.suffixed_etags = set()
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self._levels = compression_levels(message["status"], headers)
+            if self._levels is None:
+                if message["status"] == 304 and headers.get("etag") in self.suffixed_etags:
+                    # Not modified: the client's cached copy is the compressed representation
+                    MutableHeaders(scope=message)["ETag"] = encoded_etag(headers["etag"], self.encoding)
+                await self._send(message)
+            else:
+                self._start = message
+            return
+        if message["type"] != "http.response.body":
+            if self._start is not None:
+                # e.g. http.response.pathsend: the server sends the file itself, uncompressed
+                start, self._start = self._start, None
+                await self._send(start)
+            await self._send(message)
+            return
+        if self._start is None:
+            if self._encoder is not None:
+                more_body = message.get("more_body", False)
+                message = {
+                    "type": "http.response.body",
+                    "body": self._encoder.compress(message.get("body", b""), final=not more_body),
+                    "more_body": more_body
+                }
+            await self._send(message)
+            return
+
+        start, self._start = self._start, None
+        headers = MutableHeaders(scope=start)
+        _add_vary(headers)
+        body = message.get("body", b"")
+        if not message.get("more_body", False):
+            if len(body) < self.middleware.minimum_size:
+                await self._send(start)
+                await self._send(message)
+                return
+            etag = headers.get("etag") if start["status"] == 200 else None
+            encoded = await self.middleware.encode(self.path, etag, body, self.encoding, self._levels)
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            headers["Content-Length"] = str(len(encoded))
+            await self._send(start)
+            await self._send({"type": "http.response.body", "body": encoded})
+            return
+
+        content_length = headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) < self.middleware.minimum_size:
+            await self._send(start)
+            await self._send(message)
+            return
+        self._encoder = StreamEncoder(self.encoding, self._levels[self.encoding])
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        await self._send(start)
+        await self._send({
+            "type": "http.response.body", "body": self._encoder.compress(body, final=False), "more_body": True
+        })
@@ -43,6 +43,66 @@ if not SAFE_COMMANDS:
 
 logger.info(f"SAFE_COMMANDS loaded from env: {SAFE_COMMANDS}")
 
+# Gitignore-style patterns skipped by every tree walk (search, for-chat-gpt, directory listings),
+# in addition to the .gitignore and .ignore files found in the tree
+ignore_patterns_str = os.getenv(
+    "IGNORE_PATTERNS", ".git,node_modules,__pycache__,.pytest_cache,.mypy_cache,.tox,venv,.venv"
+)
+IGNORE_PATTERNS = [pattern.strip() for pattern in ignore_patterns_str.split(",") if pattern.strip()]
+
+# Command execution limits
+MAX_CONCURRENT_COMMANDS = int(os.getenv("MAX_CONCURRENT_COMMANDS", "4"))
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "55"))
+
+# Command output kept in memory per stream (head + tail); the rest is spilled to COMMAND_OUTPUT_DIR
+COMMAND_OUTPUT_HEAD_BYTES = int(os.getenv("COMMAND_OUTPUT_HEAD_BYTES", str(64 * 1024)))
+COMMAND_OUTPUT_TAIL_BYTES = int(os.getenv("COMMAND_OUTPUT_TAIL_BYTES", str(64 * 1024)))
+COMMAND_OUTPUT_DIR = TMP_DIR / "command_output"
+
+# Resource limits applied to each command before exec (0 = unlimited)
+COMMAND_CPU_LIMIT = int(os.getenv("COMMAND_CPU_LIMIT", "0"))  # CPU seconds
+COMMAND_MEMORY_LIMIT = int(os.getenv("COMMAND_MEMORY_LIMIT", "0"))  # Address space in bytes
+COMMAND_MAX_OPEN_FILES = int(os.getenv("COMMAND_MAX_OPEN_FILES", "0"))
+COMMAND_MAX_OUTPUT_BYTES = int(os.getenv("COMMAND_MAX_OUTPUT_BYTES", "0"))  # Per output stream
+
+# Persistent command sessions: idle time in seconds before eviction and maximum number of sessions
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "16"))
+
+# Background job limits
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "3600"))
+
+# Persistent trigram index used by /search-files; refreshed at most once per interval (seconds)
+SEARCH_INDEX_DB = TMP_DIR / "search_index.sqlite3"
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", "5"))
+
+# Worker processes used by line/regex search (0 = one per CPU core)
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "0"))
+
+# Seconds between background refreshes of the /find-path index (directory mtimes are checked)
+PATH_INDEX_REFRESH_INTERVAL = float(os.getenv("PATH_INDEX_REFRESH_INTERVAL", "2"))
+
+# Seconds between incremental updates of the /symbols index of Python files
+SYMBOL_INDEX_REFRESH_INTERVAL = float(os.getenv("SYMBOL_INDEX_REFRESH_INTERVAL", "5"))
+
+# Seconds a /for-chat-gpt file manifest is reused before the tree is walked again
+MANIFEST_REFRESH_INTERVAL = float(os.getenv("MANIFEST_REFRESH_INTERVAL", "2"))
+
+# Content of recent /for-chat-gpt versions, kept for since=<version> delta requests
+SNAPSHOT_DB = TMP_DIR / "snapshots.sqlite3"
+SNAPSHOT_HISTORY = int(os.getenv("SNAPSHOT_HISTORY", "20"))
+
+# Response compression: smaller bodies are sent as is; compressed bodies with an ETag are cached (megabytes)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_CACHE_MB = float(os.getenv("COMPRESSION_CACHE_MB", "64"))
+
+# Seconds between incremental updates of the /relevant-files BM25 index
+RELEVANCE_INDEX_REFRESH_INTERVAL = float(os.getenv("RELEVANCE_INDEX_REFRESH_INTERVAL", "5"))
+
+# Number of /files/batch operations executed at the same time
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
 GPTONROIDS_API_KEY_header = APIKeyHeader(name="GPTONROIDS_API_KEY", auto_error=False)
 
 # Function to get API key
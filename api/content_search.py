@@ -0,0 +1,124 @@
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from api.config import SEARCH_WORKERS
+from api.binary_detection import is_binary_file
+
+def compile_pattern(pattern: str, regex: bool, case_sensitive: bool, whole_word: bool):
+    """
+    Builds the bytes pattern and flags used by the search workers. Raises re.error for an
+    invalid regular expression. Case-insensitive matching of bytes folds ASCII letters only.
+    """
+    source = pattern.encode("utf-8")
+    if not regex:
+        source = re.escape(source)
+    if whole_word:
+        source = rb"\b(?:" + source + rb")\b"
+    flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+    re.compile(source, flags)
+    return source, flags
+
+def _decode_line(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace").rstrip("\r")
+
+def _context_before(mm, line_start: int, count: int) -> list:
+    lines = []
+    position = line_start
+    while len(lines) < count and position > 0:
+        previous_start = mm.rfind(b"\n", 0, position - 1) + 1
+        lines.append(_decode_line(mm[previous_start:position - 1]))
+        position = previous_start
+    return lines[::-1]
+
+def _context_after(mm, line_end: int, count: int) -> list:
+    lines = []
+    position = line_end
+    while len(lines) < count and position + 1 < len(mm):
+        next_end = mm.find(b"\n", position + 1)
+        if next_end == -1:
+            next_end = len(mm)
+        lines.append(_decode_line(mm[position + 1:next_end]))
+        position = next_end
+    return lines
+
+def search_mapped(mm, regex, context_lines: int, limit: int) -> list:
+    """Returns one entry per matching line of a mapped file, with 1-based line and column."""
+    results = []
+    line_number = 1
+    counted_to = 0
+    last_line_start = -1
+    for match in regex.finditer(mm):
+        start = match.start()
+        line_start = mm.rfind(b"\n", 0, start) + 1
+        if line_start == last_line_start:
+            continue
+        last_line_start = line_start
+        line_number += mm[counted_to:line_start].count(b"\n")
+        counted_to = line_start
+        line_end = mm.find(b"\n", start)
+        if line_end == -1:
+            line_end = len(mm)
+        entry = {
+            "line": line_number,
+            "column": len(mm[line_start:start].decode("utf-8", errors="replace")) + 1,
+            "text": _decode_line(mm[line_start:line_end])
+        }
+        if context_lines:
+            entry["before"] = _context_before(mm, line_start, context_lines)
+            entry["after"] = _context_after(mm, line_end, context_lines)
+        results.append(entry)
+        if len(results) >= limit:
+            break
+    return results
+
+def search_file(path: str, regex, context_lines: int, limit: int) -> list:
+    """Searches a whole file through mmap, so large files are not read into memory. Binary files are skipped."""
+    try:
+        if is_binary_file(path):
+            return []
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return search_mapped(mm, regex, context_lines, limit)
+    except (OSError, ValueError):
+        return []
+
+def search_files_chunk(paths: list, pattern: bytes, flags: int, context_lines: int, limit: int) -> list:
+    """
+    Worker entry point: searches a chunk of files and returns [(path, matches)] for files that
+    match. At most `limit` matching lines are returned for the whole chunk.
+    """
+    regex = re.compile(pattern, flags)
+    results = []
+    for path in paths:
+        if limit <= 0:
+            break
+        matches = search_file(path, regex, context_lines, limit)
+        if matches:
+            results.append((path, matches))
+            limit -= len(matches)
+    return results
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_search_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared worker pool for content search and parsing, starting it on first use.
+    Workers are started by a forkserver: by then the server runs other threads (index
+    refreshers, to_thread and job workers), and forking it could copy a lock one of them holds.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=search_worker_count(), mp_context=multiprocessing.get_context("forkserver")
+            )
+        return _pool
+
+def search_worker_count() -> int:
+    return SEARCH_WORKERS or os.cpu_count() or 1
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from api.config import logger
+from api.tree_walker import translate_pattern
+
+# Word pieces, number groups, single symbols and whitespace runs roughly follow how BPE
+# tokenizers split source code, so their count is a close estimate of the token count
+TOKEN_PIECE = re.compile(r" ?[A-Za-z]{1,8}| ?\d{1,3}|[^\sA-Za-z\d]|\s+")
+
+# Number of file contents whose token count is remembered
+CACHE_SIZE = 50_000
+
+# A file that does not fit whole is truncated only if at least this many tokens are left
+MIN_TRUNCATED_TOKENS = 256
+
+def estimate_tokens(text: str) -> int:
+    return len(TOKEN_PIECE.findall(text))
+
+def truncate_to_tokens(text: str, max_tokens: int):
+    """Returns (the leading whole lines of text that fit in max_tokens, their token count)."""
+    kept = []
+    used = 0
+    for line in text.splitlines(keepends=True):
+        tokens = estimate_tokens(line)
+        if used + tokens > max_tokens:
+            break
+        kept.append(line)
+        used += tokens
+    return "".join(kept), used
+
+class TokenCountCache:
+    """
+    Token counts per content hash. The hash of each path is remembered with its size and mtime,
+    so a file whose count is already known can be skipped without reading it again.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def known(self, path: str, size: int, mtime_ns: int):
+        """Returns the token count of an unchanged file, or None if it has to be read."""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None or entry[:2] != (size, mtime_ns):
+                return None
+            return self._counts.get(entry[2])
+
+    def count(self, path: str, size: int, mtime_ns: int, text: str) -> int:
+        digest = hashlib.sha1(text.encode("utf-8", errors="surrogateescape")).hexdigest()
+        with self._lock:
+            tokens = self._counts.get(digest)
+        if tokens is None:
+            tokens = estimate_tokens(text)
+        with self._lock:
+            self._counts[digest] = tokens
+            self._counts.move_to_end(digest)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+            self._files[path] = (size, mtime_ns, digest)
+        return tokens
+
+token_count_cache = TokenCountCache(CACHE_SIZE)
+
+def compile_globs(globs) -> list:
+    """Compiles gitignore-style globs ("*.py", "api/**", "/README.md") matched against relative paths."""
+    return [re.compile(translate_pattern(glob.rstrip("/")) + "(?:/.*)?$") for glob in globs]
+
+def rank_entries(entries, include, exclude, relevance: dict, recent_first: bool) -> list:
+    """
+    Orders manifest entries by priority: files matching an earlier include glob first, then
+    by query relevance, then most recently modified (or by path).
+    """
+    include_patterns = compile_globs(include)
+    exclude_patterns = compile_globs(exclude)
+    ranked = []
+    for entry in entries:
+        path = entry[0].replace(os.sep, "/")
+        if any(pattern.match(path) for pattern in exclude_patterns):
+            continue
+        glob_rank = next(
+            (rank for rank, pattern in enumerate(include_patterns) if pattern.match(path)), len(include_patterns)
+        )
+        ranked.append(((glob_rank, -relevance.get(entry[0], 0), -entry[2] if recent_first else 0, entry[0]), entry))
+    ranked.sort(key=lambda item: item[0])
+    return [entry for _, entry in ranked]
+
+def pack_files(root, entries, token_budget: int, max_file_tokens=None, truncate: bool = True) -> dict:
+    """
+    Greedily packs files in the given order into token_budget. Files that fit are included
+    whole; a file that does not fit is cut to the remaining budget if at least
+    MIN_TRUNCATED_TOKENS are left, otherwise skipped. Files whose token count is cached are
+    skipped without reading them.
+    """
+    files = []
+    used = 0
+    omitted = 0
+    for path, size, mtime_ns in entries:
+        remaining = token_budget - used
+        limit = remaining if max_file_tokens is None else min(remaining, max_file_tokens)
+        if limit <= 0:
+            omitted += 1
+            continue
+        known = token_count_cache.known(path, size, mtime_ns)
+        if known is not None and known > limit and (not truncate or limit < MIN_TRUNCATED_TOKENS):
+            omitted += 1
+            continue
+        try:
+            with open(os.path.join(root, path), "r", encoding="utf-8", errors="ignore") as file:
+                content = file.read()
+        except OSError as e:
+            logger.warning(f"Skipping file due to error: {path}. Error: {e}")
+            omitted += 1
+            continue
+        tokens = token_count_cache.count(path, size, mtime_ns, content)
+        truncated = False
+        if tokens > limit:
+            if not truncate or limit < MIN_TRUNCATED_TOKENS:
+                omitted += 1
+                continue
+            content, tokens = truncate_to_tokens(content, limit)
+            truncated = True
+        files.append({"path": path, "content": content, "tokens": tokens, "truncated": truncated})
+        used += tokens
+    return {"tokens_used": used, "files_omitted": omitted, "files": files}
@@ -1,23 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
 from pathlib import Path
 from pydantic import BaseModel
 from api.config import logger, WORK_DIR, get_api_key
+from api.tree_walker import scan_directory, root_matcher, parent_matcher
+from api.workspace_changes import mark_changed
+import os
 
 router = APIRouter()
 
 # Endpoint to list directories
 @router.get("/directories", dependencies=[Depends(get_api_key)])
-def list_directories():
+def list_directories(
+    include_ignored: bool = Query(False, description="Also list directories skipped by .gitignore, .ignore and IGNORE_PATTERNS")
+):
     logger.info("Listing directories")
-    dirs = [d.name for d in WORK_DIR.iterdir() if d.is_dir()]
+    _, directories, _ = scan_directory(str(WORK_DIR), root_matcher(WORK_DIR), include_ignored, follow_symlinks=True)
+    dirs = [os.path.basename(d) for d in directories]
     if not dirs:
         raise HTTPException(status_code=404, detail="No directories found")
     return {"directories": dirs}
 
 # Endpoint to list contents of a specific directory or file
 @router.get("/directories/{dir_name:path}", dependencies=[Depends(get_api_key)])
-def list_directory_content(dir_name: str):
+def list_directory_content(
+    dir_name: str,
+    include_ignored: bool = Query(False, description="Also list entries skipped by .gitignore, .ignore and IGNORE_PATTERNS")
+):
     logger.info(f"Listing contents of directory: {dir_name}")
     dir_path = WORK_DIR / dir_name
 
@@ -26,7 +35,10 @@ def list_directory_content(dir_name: str):
 
     if dir_path.is_dir():
         # List files in the directory
-        files = [f.name for f in dir_path.iterdir()]
+        files, directories, _ = scan_directory(
+            str(dir_path), parent_matcher(WORK_DIR, dir_path), include_ignored, follow_symlinks=True
+        )
+        files = sorted(os.path.basename(entry) for entry in files + directories)
         return {"files": files}
     else:
         # If it's a file, return file metadata or content
@@ -41,6 +53,7 @@ def create_directory(dir_name: str):
         logger.error(f"Directory already exists: {dir_name}")
         raise HTTPException(status_code=400, detail="Directory already exists")
     dir_path.mkdir(parents=True, exist_ok=True)
+    mark_changed()
     return {"message": f"Directory '{dir_name}' created successfully"}
 
 # Endpoint to delete a directory
@@ -52,4 +65,5 @@ def delete_directory(dir_name: str):
         logger.error(f"Directory not found: {dir_name}")
         raise HTTPException(status_code=404, detail="Directory not found")
     dir_path.rmdir()
+    mark_changed()
     return {"message": f"Directory '{dir_name}' deleted successfully"}
@@ -1,8 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from pathlib import Path
-from api.config import logger, WORK_DIR, get_api_key
+from typing import Literal, Optional
+from contextlib import aclosing
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.datastructures import Headers
+import json
+import os
+import shutil
+import tempfile
+import stat
+from api.config import logger, WORK_DIR, BATCH_MAX_CONCURRENCY, get_api_key
 import aiofiles
+import asyncio
+from api.binary_detection import is_binary_file
+from api.line_index import read_line_range, read_tail
+from api.log_follow import follow_file
+from api.workspace_changes import mark_changed
 
 router = APIRouter()
 
@@ -18,6 +33,7 @@ async def append_to_file(filename: str, file_content: FileContent):
     try:
         async with aiofiles.open(file_path, "a") as f:
             await f.write(file_content.content)
+        mark_changed()
         return {"message": f"Content appended to '{filename}' successfully"}
     except Exception as e:
         logger.error(f"Failed to append to file: {str(e)}", exc_info=True)
@@ -29,21 +45,256 @@ async def write_file(filename: str, file_content: FileContent):
     try:
         async with aiofiles.open(file_path, "w") as f:
             await f.write(file_content.content)
+        mark_changed()
         return {"message": "File written successfully"}
     except Exception as e:
         logger.error(f"Failed to write to file: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to write to file: {str(e)}")
 
+class BatchOperation(BaseModel):
+    op: Literal["read", "write", "append", "delete"]
+    path: str
+    content: Optional[str] = None
+    start_line: Optional[int] = Field(None, ge=1)
+    end_line: Optional[int] = Field(None, ge=1)
+    tail: Optional[int] = Field(None, ge=0, le=100000)
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(..., min_length=1, max_length=500)
+    atomic: bool = False
+
+async def run_operation(operation: BatchOperation):
+    """Runs one batch operation with the same handler as its single-file endpoint."""
+    if operation.op == "read":
+        return await read_file_content(operation.path, operation.start_line, operation.end_line, operation.tail)
+    if operation.op == "delete":
+        return await asyncio.to_thread(delete_file, operation.path)
+    if operation.content is None:
+        raise HTTPException(status_code=400, detail=f"content is required for {operation.op}")
+    if operation.op == "write":
+        return await write_file(operation.path, FileContent(content=operation.content))
+    return await append_to_file(operation.path, FileContent(content=operation.content))
+
+def backup_files(paths, backup_dir: str) -> dict:
+    """Copies files that are about to change; None marks a path that did not exist."""
+    backups = {}
+    for i, path in enumerate(paths):
+        if path.is_file():
+            backups[path] = shutil.copy2(path, os.path.join(backup_dir, str(i)))
+        else:
+            backups[path] = None
+    return backups
+
+def restore_files(backups: dict):
+    for path, backup in backups.items():
+        if backup is not None:
+            shutil.copy2(backup, path)
+        elif path.is_file():
+            path.unlink()
+
+@router.post("/files/batch", dependencies=[Depends(get_api_key)])
+async def batch_files(request: BatchRequest):
+    """
+    Runs many reads, writes, appends and deletes in one request. Operations on the same path
+    run in the given order; different paths run concurrently, at most BATCH_MAX_CONCURRENCY
+    at a time. Each result has its own status code. With atomic=true the files written,
+    appended to or deleted are backed up first and restored if any operation fails.
+    """
+    groups = {}
+    for index, operation in enumerate(request.operations):
+        groups.setdefault(os.path.normpath(WORK_DIR / operation.path), []).append(index)
+    results = [None] * len(request.operations)
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run_group(indexes):
+        for index in indexes:
+            operation = request.operations[index]
+            result = {"index": index, "op": operation.op, "path": operation.path}
+            async with semaphore:
+                try:
+                    result.update(status=200, result=await run_operation(operation))
+                except HTTPException as e:
+                    result.update(status=e.status_code, detail=e.detail)
+                except Exception as e:
+                    logger.error(f"Batch operation failed: {str(e)}", exc_info=True)
+                    result.update(status=500, detail=f"Batch operation failed: {str(e)}")
+            results[index] = result
+
+    with tempfile.TemporaryDirectory() as backup_dir:
+        backups = {}
+        if request.atomic:
+            changed = {
+                Path(path) for path, indexes in groups.items()
+                if any(request.operations[i].op != "read" for i in indexes)
+            }
+            try:
+                backups = await asyncio.to_thread(backup_files, changed, backup_dir)
+            except Exception as e:
+                logger.error(f"Failed to back up files: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Failed to back up files: {str(e)}")
+        await asyncio.gather(*(run_group(indexes) for indexes in groups.values()))
+        failed = sum(1 for result in results if result["status"] != 200)
+        rolled_back = request.atomic and failed > 0
+        if rolled_back:
+            try:
+                await asyncio.to_thread(restore_files, backups)
+                mark_changed()
+            except Exception as e:
+                logger.error(f"Failed to restore files: {str(e)}", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Failed to restore files: {str(e)}")
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed, "rolled_back": rolled_back}
+
+def file_etag(stat_result) -> str:
+    """Strong validator from stat data: replacing or modifying the file changes it."""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag, as RFC 9110 requires for GET."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def not_modified_since(if_modified_since: str, stat_result) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since is None or since.tzinfo is None:
+        return False
+    return int(stat_result.st_mtime) <= since.timestamp()
+
+class SendfileResponse(FileResponse):
+    """
+    FileResponse that hands the file to the server with the ASGI pathsend extension when
+    the server offers it, so the body is sent by the server without passing through Python.
+    Other servers, HEAD and Range requests fall back to FileResponse's chunked reads.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if (
+            "http.response.pathsend" not in scope.get("extensions", {})
+            or self.stat_result is None
+            or scope["method"] == "HEAD"
+            or "range" in Headers(scope=scope)
+        ):
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+
+@router.get("/files-raw/{filename:path}", dependencies=[Depends(get_api_key)])
+async def download_file(filename: str, request: Request):
+    """
+    Streams a file's bytes from disk as is (any file type), with ETag and Last-Modified from
+    its stat data. A matching If-None-Match or If-Modified-Since gets an empty 304, and Range
+    requests get 206.
+    """
+    file_path = WORK_DIR / filename
+    try:
+        stat_result = await asyncio.to_thread(os.stat, file_path)
+    except OSError:
+        logger.error(f"File not found: {filename}")
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+    etag = file_etag(stat_result)
+    headers = {"ETag": etag, "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True)}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and not_modified_since(if_modified_since, stat_result)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return SendfileResponse(file_path, stat_result=stat_result, headers=headers)
+
+@router.get("/files-tail/{filename:path}", dependencies=[Depends(get_api_key)])
+async def tail_file(
+    filename: str,
+    lines: int = Query(10, ge=0, le=100000, description="Number of last lines to return"),
+    follow: bool = Query(False, description="Keep streaming lines appended to the file"),
+    timeout_ms: Optional[int] = Query(None, ge=1, description="End a followed stream after this many milliseconds")
+):
+    """
+    Returns the last lines of a file. With follow=true the response is an NDJSON stream: a
+    {"type": "tail"} frame with those lines, then {"type": "data"} frames as the file grows.
+    Truncation and rotation are followed ({"type": "truncated"} / {"type": "rotated"}), and the
+    stream ends when the client disconnects or with {"type": "end"} after timeout_ms.
+    """
+    file_path = WORK_DIR / filename
+    if not file_path.is_file():
+        logger.error(f"File not found: {filename}")
+        raise HTTPException(status_code=404, detail="File not found")
+    if not follow:
+        try:
+            return await asyncio.to_thread(read_tail, file_path, lines)
+        except Exception as e:
+            logger.error(f"Failed to read file: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+
+    timeout = None if timeout_ms is None else timeout_ms / 1000
+
+    async def frames():
+        # Nothing is logged per frame: the followed file may be the server's own log
+        try:
+            async with aclosing(follow_file(file_path, lines, timeout)) as follower:
+                async for frame in follower:
+                    yield json.dumps(frame) + "\n"
+        except Exception as e:
+            logger.error(f"Failed to follow file: {str(e)}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": f"Failed to follow file: {str(e)}"}) + "\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/files/{filename:path}", dependencies=[Depends(get_api_key)])
-async def read_file(filename: str):
+async def read_file(
+    filename: str,
+    request: Request,
+    start_line: Optional[int] = Query(None, ge=1, description="First line to return (1-based)"),
+    end_line: Optional[int] = Query(None, ge=1, description="Last line to return (inclusive)"),
+    tail: Optional[int] = Query(None, ge=0, le=100000, description="Return only the last N lines")
+):
+    """
+    Returns the content of a file. A Range header returns the requested bytes (206);
+    start_line/end_line or tail return only those lines, without reading the whole file.
+    """
+    if "range" in request.headers and start_line is None and end_line is None and tail is None:
+        file_path = WORK_DIR / filename
+        if not file_path.is_file():
+            logger.error(f"File not found: {filename}")
+            raise HTTPException(status_code=404, detail="File not found")
+        # Like a whole read, only text is returned here; /files-raw serves binary files
+        if await asyncio.to_thread(is_binary_file, file_path):
+            raise HTTPException(status_code=415, detail="Binary file, content not returned")
+        # FileResponse serves single and multiple byte ranges, If-Range and 416 itself
+        return FileResponse(file_path)
+    return await read_file_content(filename, start_line, end_line, tail)
+
+async def read_file_content(filename: str, start_line=None, end_line=None, tail=None):
+    """Returns a text file's content, or a dict with the requested lines."""
     file_path = WORK_DIR / filename
     if not file_path.exists():
         logger.error(f"File not found: {filename}")
         raise HTTPException(status_code=404, detail="File not found")
     try:
+        if await asyncio.to_thread(is_binary_file, file_path):
+            raise HTTPException(status_code=415, detail="Binary file, content not returned")
+        if tail is not None:
+            return await asyncio.to_thread(read_tail, file_path, tail)
+        if start_line is not None or end_line is not None:
+            if end_line is not None and start_line is not None and end_line < start_line:
+                raise HTTPException(status_code=400, detail="end_line must not be before start_line")
+            return await asyncio.to_thread(read_line_range, file_path, start_line or 1, end_line)
         async with aiofiles.open(file_path, "r") as f:
             content = await f.read()
         return content
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to read file: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
@@ -56,6 +307,7 @@ def delete_file(filename: str):
         raise HTTPException(status_code=404, detail="File not found")
     try:
         file_path.unlink()
+        mark_changed()
         return {"message": "File deleted successfully"}
     except Exception as e:
         logger.error(f"Failed to delete file: {str(e)}", exc_info=True)
@@ -68,6 +320,7 @@ async def append_lines_to_file(filename: str, file_lines: FileLines):
         async with aiofiles.open(file_path, "a") as f:
             for line in file_lines.lines:
                 await f.write(line + "\n")
+        mark_changed()
         return {"message": f"Lines appended to '{filename}' successfully"}
     except Exception as e:
         logger.error(f"Failed to append lines to file: {str(e)}", exc_info=True)
@@ -0,0 +1,265 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+import asyncio
+import heapq
+import os
+import re
+import threading
+import time
+from api.config import logger, WORK_DIR, get_api_key, PATH_INDEX_REFRESH_INTERVAL
+from api.tree_walker import root_matcher, scan_directory
+from api.workspace_changes import change_generation
+
+router = APIRouter()
+
+# fzf-style scoring: every matched character scores, characters at word boundaries and
+# runs of consecutive characters score more, and gaps between matched characters cost
+SCORE_MATCH = 16
+SCORE_GAP_START = -3
+SCORE_GAP_EXTENSION = -1
+BONUS_SEGMENT_START = 10
+BONUS_WORD_START = 8
+BONUS_CAMEL_CASE = 7
+BONUS_CONSECUTIVE = 4
+BONUS_FIRST_CHARACTER_MULTIPLIER = 2
+BONUS_BASENAME = 20
+
+WORD_SEPARATORS = "_-. "
+
+# Broad queries match most paths; only this many of them are scored exactly
+MAX_SCORED_PATHS = 1000
+
+NONZERO_BYTE = re.compile(b"[^\x00]")
+
+def _match_window(text: str, query: str, start: int):
+    """Returns the shortest (start, end) window of text containing query as a subsequence, or None."""
+    position = start
+    for char in query:
+        position = text.find(char, position)
+        if position < 0:
+            return None
+        position += 1
+    end = position
+    for char in reversed(query):
+        position = text.rfind(char, start, position)
+    return position, end
+
+def _boundary_bonus(path: str, position: int) -> int:
+    if position == 0 or path[position - 1] == "/":
+        return BONUS_SEGMENT_START
+    previous = path[position - 1]
+    if previous in WORD_SEPARATORS:
+        return BONUS_WORD_START
+    if previous.islower() and path[position].isupper():
+        return BONUS_CAMEL_CASE
+    return 0
+
+def fuzzy_score(path: str, lower_path: str, query: str):
+    """
+    Scores a path against a lowercase query, or returns None if the query is not a
+    subsequence of the path. Matches inside the file name are preferred.
+    """
+    basename_start = lower_path.rstrip("/").rfind("/") + 1
+    window = _match_window(lower_path, query, basename_start)
+    in_basename = window is not None
+    if window is None:
+        window = _match_window(lower_path, query, 0)
+        if window is None:
+            return None
+    start, end = window
+    score = BONUS_BASENAME if in_basename else 0
+    previous = -1
+    position = start
+    for index, char in enumerate(query):
+        position = lower_path.find(char, position, end)
+        bonus = _boundary_bonus(path, position)
+        if index == 0:
+            bonus *= BONUS_FIRST_CHARACTER_MULTIPLIER
+        if position == previous + 1:
+            bonus = max(bonus, BONUS_CONSECUTIVE)
+        elif previous >= 0:
+            score += SCORE_GAP_START + SCORE_GAP_EXTENSION * (position - previous - 2)
+        score += SCORE_MATCH + bonus
+        previous = position
+        position += 1
+    return score
+
+class _Directory:
+    __slots__ = ("mtime_ns", "parent_matcher", "matcher", "files", "subdirectories")
+
+    def __init__(self, mtime_ns, parent_matcher, matcher, files, subdirectories):
+        self.mtime_ns = mtime_ns
+        self.parent_matcher = parent_matcher
+        self.matcher = matcher
+        self.files = files
+        self.subdirectories = subdirectories
+
+class PathIndex:
+    """
+    In-memory index of every relative path under a root (directories end with "/").
+    A background thread keeps it fresh: a directory is re-listed only when its mtime changes,
+    so a refresh costs one stat per directory. Queries work on an immutable snapshot, so
+    they never wait for a refresh.
+    """
+
+    def __init__(self, root, refresh_interval: float):
+        self.root = os.path.abspath(root)
+        self.refresh_interval = refresh_interval
+        self._directories = {}
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refresher = None
+        self.refreshed_generation = None
+
+    def _scan(self, relative: str, parent_matcher):
+        """Lists one directory and, recursively, the subdirectories not indexed yet."""
+        pending = [(relative, parent_matcher)]
+        while pending:
+            relative, parent_matcher = pending.pop()
+            full_path = os.path.join(self.root, relative)
+            try:
+                mtime_ns = os.stat(full_path).st_mtime_ns
+            except OSError:
+                self._drop(relative)
+                continue
+            files, subdirectories, matcher = scan_directory(full_path, parent_matcher)
+            previous = self._directories.get(relative)
+            names = [os.path.basename(path) for path in subdirectories]
+            self._directories[relative] = _Directory(
+                mtime_ns, parent_matcher, matcher, [os.path.basename(path) for path in files], names
+            )
+            # Changed ignore rules apply to the whole subtree, so it is listed again
+            rules_changed = previous is not None and previous.matcher.rule_sets != matcher.rule_sets
+            if previous is not None:
+                for name in set(previous.subdirectories) - set(names):
+                    self._drop(os.path.join(relative, name))
+            for name in names:
+                child = os.path.join(relative, name)
+                if child not in self._directories or rules_changed:
+                    pending.append((child, matcher))
+
+    def _drop(self, relative: str):
+        prefix = relative + os.sep
+        for key in [key for key in self._directories if key == relative or key.startswith(prefix)]:
+            del self._directories[key]
+
+    def refresh(self):
+        with self._lock:
+            started = time.time()
+            self.refreshed_generation = change_generation()
+            changed = False
+            if "" not in self._directories:
+                self._scan("", root_matcher(self.root))
+                changed = True
+            else:
+                for relative in list(self._directories):
+                    directory = self._directories.get(relative)
+                    if directory is None:
+                        continue
+                    try:
+                        mtime_ns = os.stat(os.path.join(self.root, relative)).st_mtime_ns
+                    except OSError:
+                        self._drop(relative)
+                        changed = True
+                        continue
+                    if mtime_ns != directory.mtime_ns:
+                        self._scan(relative, directory.parent_matcher)
+                        changed = True
+            if changed or self._snapshot is None:
+                self._build_snapshot()
+                logger.info(f"Path index refreshed: {len(self._snapshot[0])} paths in {time.time() - started:.2f}s")
+
+    def _build_snapshot(self):
+        paths = []
+        for relative in sorted(self._directories):
+            directory = self._directories[relative]
+            if relative:
+                paths.append(relative + "/")
+            paths.extend(os.path.join(relative, name) for name in directory.files)
+        lower_paths = [path.lower() for path in paths]
+        basename_starts = [path.rstrip("/").rfind("/") + 1 for path in lower_paths]
+        # One byte per path for every character; as integers they filter paths with a few ANDs
+        columns = {}
+        for index, path in enumerate(lower_paths):
+            for char in set(path):
+                column = columns.get(char)
+                if column is None:
+                    column = columns[char] = bytearray(len(paths))
+                column[index] = 1
+        char_masks = {char: int.from_bytes(column, "little") for char, column in columns.items()}
+        self._snapshot = (paths, lower_paths, basename_starts, char_masks)
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Path index refresh failed: {e}", exc_info=True)
+
+    def ensure_ready(self):
+        """
+        Builds the index on first use and starts the background refresher. Files written
+        through the API since the last refresh are picked up at once.
+        """
+        if self._snapshot is None or self.refreshed_generation != change_generation():
+            self.refresh()
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="path-index", daemon=True)
+                self._refresher.start()
+
+    def find(self, query: str, limit: int):
+        """Returns (total matches, top `limit` (path, score) pairs) for a fuzzy query."""
+        paths, lower_paths, basename_starts, char_masks = self._snapshot
+        query = "".join(query.lower().split())
+        # Paths that contain every character of the query, in any order
+        mask = -1
+        for char in set(query):
+            mask &= char_masks.get(char, 0)
+        if not mask:
+            return 0, []
+        candidates = [m.start() for m in NONZERO_BYTE.finditer(mask.to_bytes(len(paths), "little"))]
+        subsequence = re.compile("".join(f"[^{re.escape(char)}]*{re.escape(char)}" for char in query))
+        matches = [index for index in candidates if subsequence.match(lower_paths[index])]
+        if len(matches) > MAX_SCORED_PATHS:
+            # Too many to score one by one: keep paths whose file name matches, shortest first
+            scored_matches = heapq.nsmallest(MAX_SCORED_PATHS, matches, key=lambda index: (
+                subsequence.match(lower_paths[index], basename_starts[index]) is None, len(paths[index])
+            ))
+        else:
+            scored_matches = matches
+        scored = sorted(
+            (-fuzzy_score(paths[index], lower_paths[index], query), len(paths[index]), paths[index])
+            for index in scored_matches
+        )
+        return len(matches), [(path, -score) for score, _, path in scored[:limit]]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_path_index() -> PathIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PathIndex(WORK_DIR, PATH_INDEX_REFRESH_INTERVAL)
+        return _index
+
+@router.get("/find-path", dependencies=[Depends(get_api_key)])
+async def find_path(
+    query: str = Query(..., description="Fuzzy pattern, e.g. 'srchep' for search_files_endpoint.py"),
+    limit: int = Query(20, ge=1, le=500, description="Maximum number of results")
+):
+    """
+    Finds files and directories by fuzzy matching their relative path, like fzf. Only paths
+    are matched, no file is opened. Results are ranked best first; directories end with "/".
+    """
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query is required.")
+    index = get_path_index()
+    await asyncio.to_thread(index.ensure_ready)
+    total, results = index.find(query, limit)
+    return {
+        "query": query,
+        "total_matches": total,
+        "results": [{"path": path, "score": score} for path, score in results]
+    }
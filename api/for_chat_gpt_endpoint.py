@@ -1,80 +1,164 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
 from pathlib import Path
+from typing import Optional
+import asyncio
 import os
-import gzip
+import re
 import json
 from api.config import logger, WORK_DIR, get_api_key
+from api.workspace_manifest import Manifest, get_manifest_store, encode_cursor, decode_cursor
+from api.context_packing import rank_entries, pack_files
+from api.search_index import get_search_index
+from api.snapshot_store import get_snapshot_store
+from api.compression import encoded_body_cache
 
 router = APIRouter()
 
+class PackRequest(BaseModel):
+    token_budget: int = Field(..., ge=1, le=2_000_000)
+    include: list[str] = Field(default_factory=list, description="Globs packed first, in this order")
+    exclude: list[str] = Field(default_factory=list, description="Globs never packed")
+    query: Optional[str] = Field(None, description="Files whose name or content contain its words rank higher")
+    recent_first: bool = True
+    max_file_tokens: Optional[int] = Field(None, ge=1)
+    truncate: bool = True
+
+def read_page(manifest: Manifest, offset: int, page_size: int) -> list:
+    """Reads the content of the files on one page of a manifest; files deleted since are left out."""
+    files_data = []
+    for path, _, _ in manifest.entries[offset:offset + page_size]:
+        file_path = os.path.join(WORK_DIR, path)
+        try:
+            with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+                file_content = file.read()
+            files_data.append({"path": path, "content": file_content})
+            logger.debug(f"Successfully processed file: {file_path}")
+        except Exception as file_error:
+            logger.warning(f"Skipping file due to error: {file_path}. Error: {file_error}")
+    return files_data
+
 @router.get("/for-chat-gpt", dependencies=[Depends(get_api_key)])
 def get_files_for_chat_gpt(
+    request: Request,
     page: int = Query(1, ge=1, description="Page number"),
-    page_size: int = Query(50, ge=1, le=500, description="Number of items per page")
+    page_size: int = Query(50, ge=1, le=500, description="Number of items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; overrides page"),
+    since: Optional[str] = Query(None, description="version of an earlier response; only changes are returned"),
+    diff: bool = Query(False, description="With since, return modified files as unified diffs")
 ):
-    logger.info("Collecting files for chat gpt")
-    files_data = []
+    """
+    Returns one page of the text files under WORK_DIR with their content. The file list is a
+    manifest built from a single directory walk; only the files on the requested page are read.
+    Following next_cursor pages through the same manifest, so page boundaries do not move
+    when files change between calls.
 
-    # Collect matching files
+    Every response has a version token. With since=<version> the response lists only the
+    files added, modified and deleted after that version.
+    """
+    logger.info("Collecting files for chat gpt")
+    store = get_manifest_store()
     try:
-        for root, dirs, filenames in os.walk(WORK_DIR):
-            # Exclude certain directories
-            dirs[:] = [d for d in dirs if d not in {"__pycache__", ".pytest_cache__", "venv"}]
-            for filename in filenames:
-                # Filter by extension or other logic
-                if filename.endswith((".py", ".txt", ".md", ".yaml", ".sh")):
-                    file_path = os.path.join(root, filename)
-                    try:
-                        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-                            file_content = file.read()
-                        files_data.append({
-                            "path": os.path.relpath(file_path, WORK_DIR),
-                            "content": file_content
-                        })
-                        logger.debug(f"Successfully processed file: {file_path}")
-                    except Exception as file_error:
-                        logger.warning(f"Skipping file due to error: {file_path}. Error: {file_error}")
+        if since is not None:
+            return delta_response(store.current(), since, diff)
+        if cursor is not None:
+            manifest_id, offset = decode_cursor(cursor)
+            manifest = store.get(manifest_id)
+            if manifest is None:
+                raise HTTPException(status_code=410, detail="Cursor has expired, start again without a cursor")
+        else:
+            manifest = store.current()
+            offset = (page - 1) * page_size
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to collect files: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to collect files: {e}")
 
-    total_files = len(files_data)
+    total_files = len(manifest)
     if total_files == 0:
         logger.info("No files matched the criteria or directory is empty.")
         return JSONResponse(content={"message": "No files found"}, status_code=200)
 
-    # Calculate pagination
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-
-    # If the start is beyond the total number, return empty
-    if start_index >= total_files:
-        return JSONResponse(content={
-            "page": page,
-            "page_size": page_size,
-            "total_files": total_files,
-            "files": []
-        }, status_code=200)
+    # The manifest id covers every file's size and mtime, so it identifies the page content
+    etag = f'"{manifest.id}-{offset}-{page_size}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    # A page served before is not read and serialized again; its compressed forms are cached too
+    cached = encoded_body_cache.get(request.url.path, etag, "identity")
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers={"ETag": etag})
 
-    # Slice the data for this page
-    paged_data = files_data[start_index:end_index]
+    try:
+        version = get_snapshot_store().record(manifest)
+    except Exception as e:
+        logger.error(f"Failed to record version: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to record version: {e}")
 
+    end_index = offset + page_size
     # Wrap in a structure so the client knows how to request more
     response_body = {
-        "page": page,
+        "page": offset // page_size + 1,
         "page_size": page_size,
         "total_files": total_files,
-        "files": paged_data
+        "manifest_id": manifest.id,
+        "version": version,
+        "next_cursor": encode_cursor(manifest.id, end_index) if end_index < total_files else None,
+        "files": read_page(manifest, offset, page_size) if offset < total_files else []
     }
 
-    # Serialize and compress
     serialized_data = json.dumps(response_body).encode("utf-8")
-    compressed_data = gzip.compress(serialized_data)
-    logger.info(f"Returning compressed data of size: {len(compressed_data)} bytes")
+    encoded_body_cache.put(request.url.path, etag, "identity", serialized_data)
+    logger.info(f"Returning data of size: {len(serialized_data)} bytes")
+    # CompressionMiddleware compresses the body with the encoding the client accepts
+    return Response(content=serialized_data, media_type="application/json", headers={"ETag": etag})
 
-    return Response(
-        content=compressed_data,
-        media_type="application/gzip",
-        headers={"Content-Encoding": "gzip"}
+def delta_response(manifest: Manifest, since: str, unified_diff: bool) -> JSONResponse:
+    """Returns the files that changed between version `since` and the current manifest."""
+    snapshots = get_snapshot_store()
+    version = snapshots.record(manifest)
+    changes = snapshots.delta(since, version, unified_diff)
+    if changes is None:
+        raise HTTPException(status_code=410, detail="Unknown or expired version, fetch a full snapshot")
+    logger.info(
+        f"Returning changes since {since}: {len(changes['added'])} added, "
+        f"{len(changes['modified'])} modified, {len(changes['deleted'])} deleted"
     )
+    return JSONResponse(content={"version": version, "since": since, **changes})
+
+def query_relevance(query: str) -> dict:
+    """Counts, per relative path, the words of the query found in the file's name or content."""
+    relevance = {}
+    words = {word.lower() for word in re.findall(r"\w{3,}", query)}
+    if not words:
+        return relevance
+    index = get_search_index()
+    index.refresh_if_stale()
+    for word in words:
+        for path in index.candidates(word):
+            relevance[path] = relevance.get(path, 0) + 1
+    return relevance
+
+def pack_context(request: PackRequest) -> dict:
+    manifest = get_manifest_store().current()
+    relevance = query_relevance(request.query) if request.query else {}
+    entries = rank_entries(manifest.entries, request.include, request.exclude, relevance, request.recent_first)
+    packed = pack_files(WORK_DIR, entries, request.token_budget, request.max_file_tokens, request.truncate)
+    return {"token_budget": request.token_budget, "manifest_id": manifest.id, **packed}
+
+@router.post("/for-chat-gpt/pack", dependencies=[Depends(get_api_key)])
+async def pack_files_for_chat_gpt(request: PackRequest):
+    """
+    Returns the most relevant text files that fit in a token budget, in one response.
+    Files are prioritized by include globs, query relevance and modification time, and the
+    files that do not fit whole can be truncated. Token counts are estimates.
+    """
+    logger.info(f"Packing files for chat gpt into {request.token_budget} tokens")
+    try:
+        return await asyncio.to_thread(pack_context, request)
+    except Exception as e:
+        logger.error(f"Failed to pack files: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to pack files: {e}")
@@ -0,0 +1,362 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel, Field
+from typing import Optional
+import asyncio
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from api.config import (
+    logger, WORK_DIR, LOGS_DIR, get_api_key, MAX_CONCURRENT_JOBS, JOB_TIMEOUT, COMMAND_MAX_OUTPUT_BYTES
+)
+from api.run_command_endpoint import split_commands, prepare_pipeline, spawn_pipeline, command_resource_limits
+
+router = APIRouter()
+
+FINAL_STATUSES = {"succeeded", "failed", "cancelled", "timed_out", "interrupted"}
+
+# Seconds between SIGTERM and SIGKILL when a job is cancelled
+CANCEL_GRACE_PERIOD = 5
+
+# Upper bound for a job's own timeout, in seconds
+MAX_JOB_TIMEOUT = 24 * 3600
+
+class JobRequest(BaseModel):
+    command: str
+    plan: str
+    timeout: Optional[float] = Field(None, gt=0, le=MAX_JOB_TIMEOUT)
+
+def kill_process_group(pid: int, sig: int = signal.SIGKILL):
+    """Sends a signal to the whole process group led by pid, ignoring groups that are already gone."""
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _parse_pgids(value) -> list:
+    return [int(pgid) for pgid in value.split(",")] if value else []
+
+async def _copy_output(stream, output, stream_name: str, totals: dict, on_limit):
+    """
+    Copies a job's output stream to its log file as it arrives. Bytes are counted per stream
+    name, as /run-command does; past COMMAND_MAX_OUTPUT_BYTES the rest is dropped and
+    on_limit is called.
+    """
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return
+        written = totals.get(stream_name, 0)
+        totals[stream_name] = written + len(chunk)
+        if COMMAND_MAX_OUTPUT_BYTES > 0 and totals[stream_name] > COMMAND_MAX_OUTPUT_BYTES:
+            output.write(chunk[:max(COMMAND_MAX_OUTPUT_BYTES - written, 0)])
+            output.flush()
+            on_limit()
+            return
+        output.write(chunk)
+        output.flush()
+
+class JobManager:
+    """
+    Runs long commands in the background on a bounded pool of asyncio workers.
+    Job metadata is stored in SQLite and output is written to a log file per job,
+    so both survive a server restart. The process groups of a running job are stored
+    too, so that they can be killed after a restart.
+    """
+
+    def __init__(self, db_path, output_dir, max_workers: int):
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    command TEXT NOT NULL,
+                    plan TEXT,
+                    status TEXT NOT NULL,
+                    exit_code INTEGER,
+                    error TEXT,
+                    timeout REAL,
+                    pid INTEGER,
+                    owner INTEGER,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    pgids TEXT
+                )
+                """
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "pgids" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN pgids TEXT")
+        self._loop = None
+        self._queue = None
+        self._workers = []
+        self._processes = {}
+        self._cancelled = set()
+        self._recover()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _recover(self):
+        """
+        Marks jobs of a dead server process as interrupted, killing the process groups they
+        may have left running, and adopts their queued jobs.
+        """
+        owner = os.getpid()
+        rows = self._execute("SELECT id, status, owner, pgids FROM jobs WHERE status IN ('queued', 'running')")
+        for row in rows:
+            if row["owner"] == owner or (row["owner"] and _pid_alive(row["owner"])):
+                continue
+            if row["status"] == "running":
+                logger.warning(f"Job {row['id']} was interrupted by a server restart")
+                for pgid in _parse_pgids(row["pgids"]):
+                    kill_process_group(pgid)
+                self._update(row["id"], status="interrupted", finished=time.time())
+            else:
+                self._update(row["id"], owner=owner)
+
+    def _ensure_workers(self):
+        """Starts the worker pool on the running event loop and enqueues this process's queued jobs."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.max_workers)]
+        rows = self._execute(
+            "SELECT id FROM jobs WHERE status = 'queued' AND owner = ? ORDER BY created",
+            (os.getpid(),)
+        )
+        for row in rows:
+            self._queue.put_nowait(row["id"])
+
+    def output_path(self, job_id: str):
+        return self.output_dir / f"{job_id}.log"
+
+    def get(self, job_id: str):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50):
+        if status:
+            rows = self._execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?", (status, limit)
+            )
+        else:
+            rows = self._execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    def submit(self, command: str, plan: str, timeout: Optional[float]) -> dict:
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, command, plan, status, timeout, owner, created) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, command, plan, timeout, os.getpid(), time.time())
+        )
+        self.output_path(job_id).touch()
+        self._queue.put_nowait(job_id)
+        logger.info(f"Job {job_id} queued: {command}")
+        return self.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            return job
+        if job["status"] == "queued":
+            self._update(job_id, status="cancelled", finished=time.time())
+            return self.get(job_id)
+
+        self._cancelled.add(job_id)
+        processes = self._processes.get(job_id)
+        if processes:
+            for process in processes:
+                kill_process_group(process.pid, signal.SIGTERM)
+                self._loop.call_later(CANCEL_GRACE_PERIOD, self._force_kill, process)
+        else:
+            # The job runs in another server worker process; signal its process groups directly
+            for pgid in _parse_pgids(job["pgids"]):
+                kill_process_group(pgid)
+        logger.info(f"Job {job_id} cancellation requested")
+        return self.get(job_id)
+
+    def _force_kill(self, process):
+        if process.returncode is None:
+            kill_process_group(process.pid, signal.SIGKILL)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                self._update(job_id, status="failed", error=str(e), finished=time.time())
+            finally:
+                self._cancelled.discard(job_id)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        timeout = job["timeout"] or JOB_TIMEOUT
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self._update(job_id, status="running", started=time.time())
+
+        status = "succeeded"
+        exit_code = 0
+        error = None
+        with open(self.output_path(job_id), "ab") as output:
+            for stages in split_commands(job["command"]):
+                if job_id in self._cancelled:
+                    status = "cancelled"
+                    break
+                try:
+                    processed_stages = prepare_pipeline(stages)
+                except HTTPException as he:
+                    status, error = "failed", he.detail
+                    break
+                # Every stage gets its own session so cancellation can kill its whole process group.
+                # Stages run with the rlimits of /run-command, and their output is copied to the
+                # log through pipes so that COMMAND_MAX_OUTPUT_BYTES applies too.
+                processes = await spawn_pipeline(
+                    processed_stages,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=WORK_DIR,
+                    resource_limits=command_resource_limits(),
+                    start_new_session=True
+                )
+                self._processes[job_id] = processes
+                # A session leader's pid is also its process group id
+                self._update(
+                    job_id, pid=processes[-1].pid, pgids=",".join(str(process.pid) for process in processes)
+                )
+                output_limit_exceeded = False
+
+                def on_output_limit():
+                    nonlocal output_limit_exceeded
+                    output_limit_exceeded = True
+                    logger.warning(f"Job {job_id} output exceeded {COMMAND_MAX_OUTPUT_BYTES} bytes, killing it")
+                    for process in processes:
+                        kill_process_group(process.pid)
+
+                totals = {}
+                copies = [_copy_output(processes[-1].stdout, output, "stdout", totals, on_output_limit)]
+                copies += [_copy_output(process.stderr, output, "stderr", totals, on_output_limit) for process in processes]
+                try:
+                    await asyncio.wait_for(
+                        asyncio.gather(*copies, *(process.wait() for process in processes)),
+                        timeout=max(deadline - loop.time(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    for process in processes:
+                        kill_process_group(process.pid)
+                    await asyncio.gather(*(process.wait() for process in processes))
+                    status = "timed_out"
+                finally:
+                    self._processes.pop(job_id, None)
+                    self._update(job_id, pgids=None)
+                exit_code = processes[-1].returncode
+                if output_limit_exceeded:
+                    status, error = "failed", f"Output exceeded {COMMAND_MAX_OUTPUT_BYTES} bytes"
+
+                if job_id in self._cancelled:
+                    status = "cancelled"
+                if status != "succeeded":
+                    break
+                # Stop the chain on the first failing command, like /run-command
+                if exit_code != 0:
+                    status = "failed"
+                    break
+
+        self._update(job_id, status=status, exit_code=exit_code, error=error, finished=time.time())
+        logger.info(f"Job {job_id} finished with status {status} (exit code {exit_code})")
+
+job_manager = JobManager(LOGS_DIR / "jobs.sqlite3", LOGS_DIR / "jobs", MAX_CONCURRENT_JOBS)
+
+@router.post("/jobs", dependencies=[Depends(get_api_key)])
+async def submit_job(request: JobRequest):
+    """
+    Queues a command chain for background execution and returns its job id immediately.
+    The command is validated with the same SAFE_COMMANDS rules as /run-command.
+    """
+    logger.info(f"Received job request: {request.command}")
+    commands_list = split_commands(request.command)
+    if not commands_list:
+        raise HTTPException(status_code=400, detail="No command provided.")
+    for stages in commands_list:
+        prepare_pipeline(stages)
+    return job_manager.submit(request.command, request.plan, request.timeout)
+
+@router.get("/jobs", dependencies=[Depends(get_api_key)])
+def list_jobs(
+    status: Optional[str] = Query(None, description="Only return jobs with this status"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of jobs to return")
+):
+    return {"jobs": job_manager.list(status, limit)}
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(get_api_key)])
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/output", dependencies=[Depends(get_api_key)])
+def get_job_output(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="Byte offset to continue reading from"),
+    limit: int = Query(64 * 1024, ge=1, le=4 * 1024 * 1024, description="Maximum number of bytes to return")
+):
+    """Returns job output starting at a byte offset, so clients can poll incrementally."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        with open(job_manager.output_path(job_id), "rb") as f:
+            f.seek(offset)
+            data = f.read(limit)
+    except FileNotFoundError:
+        data = b""
+    next_offset = offset + len(data)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "offset": offset,
+        "next_offset": next_offset,
+        "output": data.decode("utf-8", errors="replace"),
+        "complete": job["status"] in FINAL_STATUSES and len(data) < limit
+    }
+
+@router.post("/jobs/{job_id}/cancel", dependencies=[Depends(get_api_key)])
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
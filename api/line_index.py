@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# The offset of every CHECKPOINT_LINES-th line is kept, so the index of a file with 20M lines
+# is 20k offsets; reaching any line is one seek plus reading fewer than this many lines
+CHECKPOINT_LINES = 1024
+
+# Files are scanned and tails are read in blocks of this size
+BLOCK_SIZE = 1024 * 1024
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Number of files whose line index is kept in memory
+CACHE_SIZE = 64
+
+class LineIndex:
+    """Offsets of line 1, 1 + CHECKPOINT_LINES, 1 + 2 * CHECKPOINT_LINES, ... of one version of a file."""
+
+    def __init__(self, checkpoints, total_lines: int):
+        self.checkpoints = checkpoints
+        self.total_lines = total_lines
+
+def build_line_index(f) -> LineIndex:
+    """Scans an open binary file once, counting newlines with numpy block by block."""
+    f.seek(0)
+    checkpoints = [np.zeros(1, dtype=np.int64)]
+    newlines = 0
+    offset = 0
+    last_byte = b""
+    while True:
+        block = f.read(BLOCK_SIZE)
+        if not block:
+            break
+        positions = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+        # The k-th newline (counting from 1) starts line k + 1
+        numbers = np.arange(newlines + 1, newlines + len(positions) + 1)
+        checkpoints.append(positions[numbers % CHECKPOINT_LINES == 0].astype(np.int64) + offset + 1)
+        newlines += len(positions)
+        offset += len(block)
+        last_byte = block[-1:]
+    total_lines = newlines + (1 if offset and last_byte != b"\n" else 0)
+    return LineIndex(np.concatenate(checkpoints), total_lines)
+
+class LineIndexCache:
+    """Line indexes by path, reused while the file's mtime and size are unchanged."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, f) -> LineIndex:
+        st = os.fstat(f.fileno())
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == key:
+                self._entries.move_to_end(path)
+                return cached[1]
+        index = build_line_index(f)
+        with self._lock:
+            self._entries[path] = (key, index)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def peek(self, path: str, st):
+        """Returns the cached index of a file version without building one, or None."""
+        with self._lock:
+            cached = self._entries.get(path)
+        if cached is not None and cached[0] == (st.st_mtime_ns, st.st_size):
+            return cached[1]
+        return None
+
+line_index_cache = LineIndexCache(CACHE_SIZE)
+
+def _decode(lines) -> str:
+    return b"".join(lines).decode("utf-8", errors="replace")
+
+def read_line_range(path, start_line: int, end_line=None) -> dict:
+    """
+    Returns lines start_line..end_line (1-based, inclusive; to the end of the file without
+    end_line) with their actual range and the file's line count.
+    """
+    path = os.fspath(path)
+    with open(path, "rb") as f:
+        index = line_index_cache.get(path, f)
+        end_line = index.total_lines if end_line is None else min(end_line, index.total_lines)
+        lines = []
+        if start_line <= end_line:
+            checkpoint = (start_line - 1) // CHECKPOINT_LINES
+            f.seek(int(index.checkpoints[checkpoint]))
+            for _ in range(start_line - 1 - checkpoint * CHECKPOINT_LINES):
+                f.readline()
+            lines = [f.readline() for _ in range(end_line - start_line + 1)]
+    return {
+        "start_line": start_line,
+        "end_line": max(end_line, start_line - 1),
+        "total_lines": index.total_lines,
+        "content": _decode(lines)
+    }
+
+def tail_lines(f, end: int, count: int) -> list:
+    """Returns the last `count` lines of an open binary file before offset `end`, reading backwards."""
+    position = end
+    data = b""
+    # A final newline ends the last line, it does not start a new one
+    needed = count + 1 if position else 0
+    while position > 0 and data.count(b"\n") < needed:
+        step = min(TAIL_BLOCK_SIZE, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+    return data.splitlines(keepends=True)[-count:] if count else []
+
+def read_tail(path, count: int) -> dict:
+    """
+    Returns the last `count` lines of a file by reading backwards from the end, so the cost
+    does not depend on the file size. Line numbers are included when the file's line index
+    is already cached.
+    """
+    path = os.fspath(path)
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        lines = tail_lines(f, st.st_size, count)
+    result = {"content": _decode(lines)}
+    index = line_index_cache.peek(path, st)
+    if index is not None:
+        result.update({
+            "start_line": index.total_lines - len(lines) + 1,
+            "end_line": index.total_lines,
+            "total_lines": index.total_lines
+        })
+    return result
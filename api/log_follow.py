@@ -0,0 +1,167 @@
+import asyncio
+import codecs
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+from api.config import logger
+from api.line_index import tail_lines
+
+# How often a followed file is checked when no inotify event arrives; also the polling
+# interval on systems without inotify
+POLL_INTERVAL = 0.5
+
+# Appended data is sent in frames of at most this many bytes
+READ_CHUNK_SIZE = 64 * 1024
+
+# inotify event mask: the file was written, or an entry of its directory was created,
+# moved or deleted (rotation)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_libc = None
+
+def _inotify_libc():
+    """Returns libc if it provides inotify (Linux), otherwise None."""
+    global _libc
+    if _libc is None:
+        _libc = False
+        if sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1
+                _libc = libc
+            except (OSError, AttributeError):
+                pass
+    return _libc or None
+
+class ChangeWaiter:
+    """
+    Waits until a file may have changed. With inotify the directory holding the file is
+    watched, so writes, truncation and rotation wake the waiter at once; without it (or if
+    the watch cannot be added) the waiter simply sleeps for the poll interval. Either way
+    the caller decides what changed from stat data, so a missed event only costs latency.
+    """
+
+    def __init__(self, path: str, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._event = asyncio.Event()
+        libc = _inotify_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify unavailable, polling instead: {os.strerror(ctypes.get_errno())}")
+            return
+        directory = os.path.dirname(os.path.abspath(path)).encode()
+        if libc.inotify_add_watch(fd, directory, WATCH_MASK) < 0:
+            logger.warning(f"Could not watch {path}, polling instead: {os.strerror(ctypes.get_errno())}")
+            os.close(fd)
+            return
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._event.set)
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    async def wait(self):
+        try:
+            await asyncio.wait_for(self._event.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+        if self._fd is not None:
+            # Events only wake the follower; drain them without parsing
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+def _open(path: str):
+    try:
+        return open(path, "rb")
+    except OSError:
+        return None
+
+async def follow_file(path, lines: int, timeout=None, poll_interval: float = POLL_INTERVAL):
+    """
+    Yields frames for a growing file: first {"type": "tail"} with its last `lines` lines, then
+    {"type": "data"} with bytes as they are appended. When the file is truncated it is read
+    again from the start ({"type": "truncated"}); when it is replaced (rotated) the rest of
+    the old file is sent and the new one is followed from its start ({"type": "rotated"}).
+    Ends with {"type": "end"} after `timeout` seconds, if given.
+    """
+    path = os.fspath(path)
+    f = open(path, "rb")
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    waiter = ChangeWaiter(path, poll_interval)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def read_chunk():
+        chunk = f.read(READ_CHUNK_SIZE)
+        return decoder.decode(chunk) if chunk else None
+
+    async def read_appended():
+        # A large append is read chunk by chunk in a worker thread, one frame per chunk
+        while True:
+            text = await asyncio.to_thread(read_chunk)
+            if text is None:
+                return
+            if text:
+                yield {"type": "data", "content": text}
+
+    try:
+        position = os.fstat(f.fileno()).st_size
+        tail = await asyncio.to_thread(tail_lines, f, position, lines)
+        yield {
+            "type": "tail",
+            "content": b"".join(tail).decode("utf-8", errors="replace"),
+            "inotify": waiter.uses_inotify
+        }
+        f.seek(position)
+        while deadline is None or time.monotonic() < deadline:
+            await waiter.wait()
+            try:
+                current = os.stat(path)
+            except OSError:
+                current = None
+            opened = os.fstat(f.fileno())
+            if opened.st_size < f.tell():
+                # Truncated in place (e.g. "> app.log" or copytruncate rotation)
+                f.seek(0)
+                decoder.reset()
+                yield {"type": "truncated"}
+            async for frame in read_appended():
+                yield frame
+            if current is not None and (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+                # Replaced by a new file (rename rotation); the old one has been read to its end
+                replacement = _open(path)
+                if replacement is not None:
+                    f.close()
+                    f = replacement
+                    decoder.reset()
+                    yield {"type": "rotated"}
+                    async for frame in read_appended():
+                        yield frame
+        yield {"type": "end", "reason": "timeout"}
+    finally:
+        waiter.close()
+        f.close()
@@ -0,0 +1,14 @@
+from collections import Counter
+import threading
+
+# Process-wide counters exposed through /metrics
+_lock = threading.Lock()
+_counters = Counter()
+
+def increment(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(_counters)
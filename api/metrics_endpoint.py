@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Depends
+from api.config import get_api_key
+from api import metrics
+
+router = APIRouter()
+
+@router.get("/metrics", dependencies=[Depends(get_api_key)])
+def get_metrics():
+    """Returns the server's counters, e.g. requests cancelled because the client disconnected."""
+    return {"counters": metrics.snapshot()}
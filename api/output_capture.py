@@ -0,0 +1,121 @@
+import os
+import re
+import time
+import uuid
+from api.config import logger, COMMAND_OUTPUT_DIR
+
+# Spill files older than this are removed when new ones are created
+SPILL_RETENTION_SECONDS = 24 * 60 * 60
+
+HANDLE_PATTERN = re.compile(r"^[0-9a-f]{32}\.log$")
+
+class RingBuffer:
+    """Fixed-size byte ring buffer that keeps only the most recent `capacity` bytes."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = None
+        self._start = 0
+        self._size = 0
+
+    def write(self, data: bytes):
+        if self.capacity <= 0 or not data:
+            return
+        if self._buffer is None:
+            self._buffer = bytearray(self.capacity)
+        if len(data) >= self.capacity:
+            self._buffer[:] = data[-self.capacity:]
+            self._start = 0
+            self._size = self.capacity
+            return
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._buffer[end:end + first] = data[:first]
+        self._buffer[:len(data) - first] = data[first:]
+        self._size += len(data)
+        if self._size > self.capacity:
+            self._start = (self._start + self._size - self.capacity) % self.capacity
+            self._size = self.capacity
+
+    def getvalue(self) -> bytes:
+        if not self._size:
+            return b""
+        end = self._start + self._size
+        if end <= self.capacity:
+            return bytes(self._buffer[self._start:end])
+        return bytes(self._buffer[self._start:]) + bytes(self._buffer[:end - self.capacity])
+
+class OutputCapture:
+    """
+    Captures one output stream with constant memory: the first `head_bytes` and the last
+    `tail_bytes` are kept in memory. Once the stream outgrows them, the full stream is
+    spilled to a file in COMMAND_OUTPUT_DIR which can be paged through with its handle.
+    """
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total_bytes = 0
+        self.handle = None
+        self._head = bytearray()
+        self._tail = RingBuffer(tail_bytes)
+        self._spill = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > self.head_bytes + self.tail_bytes
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self.total_bytes += len(data)
+        if self._spill is None and self.truncated:
+            # Nothing has been dropped yet, so head + tail is still the complete stream so far
+            self._open_spill()
+            self._spill.write(bytes(self._head))
+            self._spill.write(self._tail.getvalue())
+        if self._spill is not None:
+            self._spill.write(data)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        self._tail.write(data)
+
+    def _open_spill(self):
+        COMMAND_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        cleanup_spill_files()
+        self.handle = f"{uuid.uuid4().hex}.log"
+        self._spill = open(COMMAND_OUTPUT_DIR / self.handle, "wb")
+        logger.info(f"Command output exceeded the in-memory limit, spilling to {self.handle}")
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+
+    def getvalue(self) -> bytes:
+        """Returns the retained head and tail, with a marker in place of the dropped middle."""
+        if not self.truncated:
+            return bytes(self._head) + self._tail.getvalue()
+        omitted = self.total_bytes - self.head_bytes - self.tail_bytes
+        marker = f"\n... [{omitted} bytes truncated, full output: {self.handle}] ...\n".encode("utf-8")
+        return bytes(self._head) + marker + self._tail.getvalue()
+
+    def text(self) -> str:
+        return self.getvalue().decode("utf-8", errors="replace")
+
+def spill_file_path(handle: str):
+    """Resolves a spill handle to its file, or None if the handle is not valid."""
+    if not HANDLE_PATTERN.match(handle):
+        return None
+    return COMMAND_OUTPUT_DIR / handle
+
+def cleanup_spill_files():
+    cutoff = time.time() - SPILL_RETENTION_SECONDS
+    try:
+        with os.scandir(COMMAND_OUTPUT_DIR) as entries:
+            for entry in entries:
+                if HANDLE_PATTERN.match(entry.name) and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+    except OSError as e:
+        logger.warning(f"Failed to clean up command output files: {e}")
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import re
+import stat
+import threading
+import time
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from api.config import logger, WORK_DIR, RELEVANCE_INDEX_REFRESH_INTERVAL
+from api.tree_walker import walk_files
+from api.binary_detection import is_binary_file
+from api.workspace_changes import change_generation
+
+# Files are split into chunks of this many lines; a chunk is the unit that is ranked
+CHUNK_LINES = 50
+
+# Only the start of each file is indexed, the same amount /search-files reads from a file
+MAX_INDEXED_BYTES = 1024 * 1024
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words of identifiers: "parseHTTPRequest" and "parse_http_request" both give parse, http, request
+WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+")
+# snake_case identifiers are also indexed whole, so an exact name ranks higher
+SNAKE_CASE_IDENTIFIER = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have if in into is it its no not of on or "
+    "so that the their then there these this to was were will with".split()
+)
+
+def tokenize(text: str) -> list:
+    """Splits text into lowercase words of one character or more, without stop words."""
+    words = [word.lower() for word in WORD.findall(text)]
+    words.extend(identifier.lower() for identifier in SNAKE_CASE_IDENTIFIER.findall(text))
+    return [word for word in words if word not in STOP_WORDS]
+
+class _FileChunks:
+    """Tokenized chunks of one file: line ranges and, per chunk, term ids with their counts."""
+    __slots__ = ("size", "mtime_ns", "digest", "line_ranges", "term_ids", "counts")
+
+    def __init__(self, size, mtime_ns, digest, line_ranges, term_ids, counts):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.line_ranges = line_ranges
+        self.term_ids = term_ids
+        self.counts = counts
+
+class RelevanceIndex:
+    """
+    BM25 index of the text files under a root, split into chunks of CHUNK_LINES lines.
+    Files are re-tokenized only when their size or mtime changes, and the sparse weight
+    matrix is rebuilt from the cached token counts, so a query is one sparse matrix-vector
+    product. All text files the tree walker lists are indexed; binary files are skipped.
+    The vocabulary is compacted whenever the matrix is rebuilt, so it holds only the terms
+    of the files indexed now.
+    """
+
+    def __init__(self, root, refresh_interval: float):
+        self.root = os.path.abspath(root)
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0.0
+        self.refreshed_generation = None
+        self._vocabulary = {}
+        self._files = {}
+        self._snapshot = None
+        self._refresh_lock = threading.RLock()
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._vocabulary.get(term)
+        if term_id is None:
+            term_id = self._vocabulary[term] = len(self._vocabulary)
+        return term_id
+
+    def _scan(self) -> dict:
+        """Returns {relative path: (size, mtime_ns)} of the regular, not ignored text files under the root."""
+        files = {}
+        for full_path in walk_files(self.root):
+            try:
+                st = os.stat(full_path)
+                if not stat.S_ISREG(st.st_mode) or is_binary_file(full_path, st):
+                    continue
+            except OSError:
+                continue
+            files[os.path.relpath(full_path, self.root)] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def _tokenize_file(self, path: str, size: int, mtime_ns: int):
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                data = f.read(MAX_INDEXED_BYTES)
+        except OSError as e:
+            logger.warning(f"Could not index {path}: {e}")
+            return None
+        digest = hashlib.sha1(data).hexdigest()
+        previous = self._files.get(path)
+        if previous is not None and previous.digest == digest:
+            previous.size, previous.mtime_ns = size, mtime_ns
+            return previous
+        lines = data.decode("utf-8", errors="ignore").splitlines()
+        # Every chunk also carries the words of the path, so file names count toward relevance
+        path_words = tokenize(path)
+        line_ranges, term_ids, counts = [], [], []
+        for start in range(0, len(lines), CHUNK_LINES):
+            words = Counter(tokenize("\n".join(lines[start:start + CHUNK_LINES])))
+            words.update(path_words)
+            line_ranges.append((start + 1, min(start + CHUNK_LINES, len(lines))))
+            term_ids.append(np.fromiter((self._term_id(word) for word in words), dtype=np.int32, count=len(words)))
+            counts.append(np.fromiter(words.values(), dtype=np.float32, count=len(words)))
+        return _FileChunks(size, mtime_ns, digest, line_ranges, term_ids, counts)
+
+    def _compact_vocabulary(self):
+        """
+        Drops the terms no indexed chunk uses any more and renumbers the rest. The old
+        vocabulary dict is left as it is, for queries still using the previous snapshot.
+        """
+        used = [ids for chunks in self._files.values() for ids in chunks.term_ids]
+        used = np.unique(np.concatenate(used)) if used else np.zeros(0, dtype=np.int32)
+        if len(used) == len(self._vocabulary):
+            return
+        new_ids = np.full(len(self._vocabulary), -1, dtype=np.int32)
+        new_ids[used] = np.arange(len(used), dtype=np.int32)
+        for chunks in self._files.values():
+            chunks.term_ids = [new_ids[ids] for ids in chunks.term_ids]
+        self._vocabulary = {
+            term: int(new_ids[term_id]) for term, term_id in self._vocabulary.items() if new_ids[term_id] >= 0
+        }
+
+    def _build_snapshot(self):
+        """Builds the chunk x term BM25 weight matrix from the tokenized files."""
+        self._compact_vocabulary()
+        paths = sorted(self._files)
+        chunk_files, line_ranges, term_ids, counts = [], [], [], []
+        for file_index, path in enumerate(paths):
+            chunks = self._files[path]
+            chunk_files.extend([file_index] * len(chunks.line_ranges))
+            line_ranges.extend(chunks.line_ranges)
+            term_ids.extend(chunks.term_ids)
+            counts.extend(chunks.counts)
+        if not line_ranges:
+            self._snapshot = None
+            return
+        lengths = np.fromiter((len(ids) for ids in term_ids), dtype=np.int64, count=len(term_ids))
+        rows = np.repeat(np.arange(len(term_ids)), lengths)
+        columns = np.concatenate(term_ids)
+        tf = np.concatenate(counts)
+        chunk_lengths = np.bincount(rows, weights=tf, minlength=len(term_ids))
+        length_norm = 1 - BM25_B + BM25_B * chunk_lengths / max(chunk_lengths.mean(), 1.0)
+        document_frequency = np.bincount(columns, minlength=len(self._vocabulary))
+        idf = np.log1p((len(term_ids) - document_frequency + 0.5) / (document_frequency + 0.5))
+        weights = (idf[columns] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm[rows])).astype(np.float32)
+        matrix = sparse.csr_matrix((weights, (rows, columns)), shape=(len(term_ids), len(self._vocabulary)))
+        self._snapshot = (self._vocabulary, paths, np.array(chunk_files, dtype=np.int64), line_ranges, matrix)
+
+    def refresh(self):
+        """Re-tokenizes added and changed files and rebuilds the weight matrix if anything changed."""
+        with self._refresh_lock:
+            started = time.time()
+            generation = change_generation()
+            on_disk = self._scan()
+            removed = [path for path in self._files if path not in on_disk]
+            changed = [
+                path for path, (size, mtime_ns) in on_disk.items()
+                if path not in self._files or (self._files[path].size, self._files[path].mtime_ns) != (size, mtime_ns)
+            ]
+            for path in removed:
+                del self._files[path]
+            for path in changed:
+                chunks = self._tokenize_file(path, *on_disk[path])
+                if chunks is not None:
+                    self._files[path] = chunks
+            if removed or changed or self._snapshot is None:
+                self._build_snapshot()
+                logger.info(
+                    f"Relevance index refreshed: {len(changed)} files tokenized, {len(removed)} removed "
+                    f"in {time.time() - started:.2f}s"
+                )
+            self.last_refresh = time.time()
+            self.refreshed_generation = generation
+
+    def is_stale(self) -> bool:
+        """True when the refresh interval has passed or the workspace was marked changed since the last refresh."""
+        return (
+            time.time() - self.last_refresh >= self.refresh_interval
+            or self.refreshed_generation != change_generation()
+        )
+
+    def refresh_if_stale(self):
+        if self.is_stale():
+            with self._refresh_lock:
+                # Another thread may have refreshed the index while this one waited
+                if self.is_stale():
+                    self.refresh()
+
+    def query(self, text: str, top_k: int, chunks_per_file: int) -> list:
+        """
+        Returns up to top_k (path, score, [(start_line, end_line, score)]) for the files whose
+        best chunk scores highest; each file lists its best chunks.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        vocabulary, paths, chunk_files, line_ranges, matrix = snapshot
+        term_ids = [vocabulary[word] for word in set(tokenize(text)) if word in vocabulary]
+        # Terms added by files tokenized after this snapshot was built have no column yet
+        term_ids = [term_id for term_id in term_ids if term_id < matrix.shape[1]]
+        if not term_ids:
+            return []
+        query_vector = np.zeros(matrix.shape[1], dtype=np.float32)
+        query_vector[term_ids] = 1.0
+        scores = matrix @ query_vector
+        matching = np.flatnonzero(scores > 0)
+        if not len(matching):
+            return []
+        # Best chunks first; a file is ranked by its best chunk
+        ordered = matching[np.argsort(-scores[matching], kind="stable")]
+        results = {}
+        complete = 0
+        for chunk in ordered:
+            file_index = int(chunk_files[chunk])
+            entry = results.get(file_index)
+            if entry is None:
+                if len(results) >= top_k:
+                    continue
+                entry = results[file_index] = (paths[file_index], float(scores[chunk]), [])
+            if len(entry[2]) < chunks_per_file:
+                start_line, end_line = line_ranges[chunk]
+                entry[2].append((start_line, end_line, float(scores[chunk])))
+                if len(entry[2]) == chunks_per_file:
+                    complete += 1
+            if complete >= top_k:
+                break
+        return list(results.values())
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_relevance_index() -> RelevanceIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RelevanceIndex(WORK_DIR, RELEVANCE_INDEX_REFRESH_INTERVAL)
+        return _index
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel, Field
+import asyncio
+import os
+from api.config import logger, WORK_DIR, get_api_key
+from api.relevance_index import get_relevance_index
+
+router = APIRouter()
+
+class RelevantFilesRequest(BaseModel):
+    query: str
+    top_k: int = Field(10, ge=1, le=100)
+    chunks_per_file: int = Field(3, ge=1, le=20)
+    include_text: bool = False
+
+def read_lines(path: str, ranges) -> list:
+    """Returns the text of the given 1-based, inclusive line ranges of a file."""
+    try:
+        with open(os.path.join(WORK_DIR, path), "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return [None] * len(ranges)
+    return ["\n".join(lines[start - 1:end]) for start, end in ranges]
+
+def rank_files(request: RelevantFilesRequest) -> list:
+    index = get_relevance_index()
+    index.refresh_if_stale()
+    results = []
+    for path, score, chunks in index.query(request.query, request.top_k, request.chunks_per_file):
+        texts = read_lines(path, [(start, end) for start, end, _ in chunks]) if request.include_text else None
+        results.append({
+            "path": path,
+            "score": round(score, 4),
+            "chunks": [
+                {"start_line": start, "end_line": end, "score": round(chunk_score, 4),
+                 **({"text": texts[i]} if texts is not None else {})}
+                for i, (start, end, chunk_score) in enumerate(chunks)
+            ]
+        })
+    return results
+
+@router.post("/relevant-files", dependencies=[Depends(get_api_key)])
+async def relevant_files(request: RelevantFilesRequest):
+    """
+    Ranks the text files under WORK_DIR by relevance to a natural-language query (BM25 over
+    chunks of 50 lines) and returns the top files with their best matching line ranges.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query is required.")
+    try:
+        results = await asyncio.to_thread(rank_files, request)
+    except Exception as e:
+        logger.error(f"Relevance ranking failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Relevance ranking failed: {str(e)}")
+    return {"query": request.query, "results": results}
@@ -1,30 +1,95 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import subprocess
+import asyncio
+import json
+import resource
+import select
 import shlex
 import shutil
+import signal
+import subprocess
+import threading
+import time
 import traceback
 import os
-from api.config import logger, WORK_DIR, get_api_key, SAFE_COMMANDS
+from api.config import (
+    logger, WORK_DIR, get_api_key, SAFE_COMMANDS, MAX_CONCURRENT_COMMANDS, COMMAND_TIMEOUT,
+    COMMAND_OUTPUT_HEAD_BYTES, COMMAND_OUTPUT_TAIL_BYTES, COMMAND_CPU_LIMIT, COMMAND_MEMORY_LIMIT,
+    COMMAND_MAX_OPEN_FILES, COMMAND_MAX_OUTPUT_BYTES
+)
+from api.output_capture import OutputCapture, spill_file_path
+from api.cancellation import run_until_disconnected
+from api import metrics
+from api.workspace_changes import mark_changed
 
 router = APIRouter()
 
+# Rajoittaa samanaikaisesti suoritettavien komentojen määrää koko prosessissa
+command_semaphore = asyncio.Semaphore(MAX_CONCURRENT_COMMANDS)
+
+# Striimattavan rivin maksimipituus; pidemmät rivit lähetetään paloina
+STREAM_LINE_LIMIT = 1024 * 1024
+
+# Yhdessä erässä sallittujen komentojen enimmäismäärä
+MAX_BATCH_COMMANDS = 50
+
+# Komennon muistihuippu luetaan aluksi tiheästi ja sitten enintään näin usein (sekuntia)
+PEAK_RSS_SAMPLE_INTERVAL = 0.05
+
+# Tulkit, jotka haetaan istunnon aktivoimasta virtuaaliympäristöstä; muut komennot haetaan
+# aina palvelimen PATH:sta, jottei sallittu nimi osoita WORK_DIR:iin kirjoitettuun ohjelmaan
+VENV_COMMANDS = {"python", "python3", "pip", "pip3"}
+
 class RunCommandRequest(BaseModel):
     command: str
     plan: str  # Yhteensopivuuden vuoksi, lokitusta varten tulevaisuudessa
 
-def fallback_split(command_str: str):
+class BatchCommandRequest(BaseModel):
+    commands: list[str]
+    plan: str
+
+def split_commands(command_str: str):
     """
-    Jos shlexin punctuation_chars ei ole käytettävissä, pilkotaan komentojono manuaalisesti
-    tukien erotusoperaattoreita "&&" ja ";" huomioiden lainausmerkit.
+    Pilkkoo annetun komentojonon listaksi putkia. Komennot erotetaan operaattoreilla ";" ja "&&",
+    ja jokainen komento pilkotaan edelleen "|"-operaattorin kohdalta putken vaiheiksi.
+    Lainausmerkkien sisällä tai kenoviivan jälkeen olevia operaattoreita ei tulkita. Jokainen
+    vaihe pilkotaan shlex.split-funktiolla, esim.
+      'git log | grep fix && ls' -> [[['git', 'log'], ['grep', 'fix']], [['ls']]]
     """
-    commands = []
+    pipelines = []
+    stages = []
     current = ""
     in_single = False
     in_double = False
+
+    def end_stage(is_pipe: bool):
+        nonlocal current
+        if current.strip():
+            try:
+                stages.append(shlex.split(current))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid command format: {str(e)}")
+        elif is_pipe or stages:
+            raise HTTPException(status_code=400, detail="Empty command in pipeline.")
+        current = ""
+
+    def end_command():
+        nonlocal stages
+        end_stage(False)
+        if stages:
+            pipelines.append(stages)
+        stages = []
+
     i = 0
     while i < len(command_str):
         ch = command_str[i]
+        if ch == "\\" and not in_single:
+            # Kenoviivan jälkeinen merkki on aina osa sanaa (myös lainausmerkki tai operaattori);
+            # molemmat jätetään shlex.split-funktion tulkittaviksi
+            current += command_str[i:i+2]
+            i += 2
+            continue
         if ch == "'" and not in_double:
             in_single = not in_single
             current += ch
@@ -32,82 +97,34 @@ def fallback_split(command_str: str):
             in_double = not in_double
             current += ch
         elif not in_single and not in_double:
-            # Tarkistetaan "&&"
+            # Tarkistetaan "&&" ja "||" ennen yksittäisiä merkkejä
             if command_str[i:i+2] == "&&":
-                if current.strip():
-                    commands.append(current.strip())
-                current = ""
+                end_command()
                 i += 2
                 continue
+            elif command_str[i:i+2] == "||":
+                raise HTTPException(status_code=400, detail="Operator '||' is not supported.")
             elif ch == ';':
-                if current.strip():
-                    commands.append(current.strip())
-                current = ""
+                end_command()
+            elif ch == '|':
+                end_stage(True)
             else:
                 current += ch
         else:
             current += ch
         i += 1
-    if current.strip():
-        commands.append(current.strip())
-    # Käytetään shlex.split jokaiselle osakomennolle, jotta lainaukset otetaan huomioon oikein
-    return [shlex.split(cmd) for cmd in commands]
+    end_command()
+    return pipelines
 
-def split_commands(command_str: str):
-    """
-    Pilkkoo annetun komentojonon listaksi komentoja. Tukee sekä ";" että "&&" erotuksina.
-    Yritetään ensin shlexin punctuation_chars -attribuuttia, ja jos se epäonnistuu,
-    käytetään fallback_split-funktiota.
-    """
-    if hasattr(shlex, 'punctuation_chars'):
-        try:
-            lexer = shlex.shlex(command_str, posix=True)
-            lexer.whitespace_split = True
-            # Määritellään erotinmerkkeinä puolipiste ja ampersandi (jolloin "&&" tulee erikseen kahta '&'-merkkiä)
-            lexer.punctuation_chars = ";&"
-            tokens = list(lexer)
-            commands = []
-            current_cmd = []
-            i = 0
-            while i < len(tokens):
-                token = tokens[i]
-                if token == ';':
-                    if current_cmd:
-                        commands.append(current_cmd)
-                        current_cmd = []
-                    i += 1
-                    continue
-                elif token == '&':
-                    # Jos seuraava token on myös "&", käsitellään niitä erotinmerkkinä
-                    if i + 1 < len(tokens) and tokens[i + 1] == '&':
-                        if current_cmd:
-                            commands.append(current_cmd)
-                            current_cmd = []
-                        i += 2
-                        continue
-                    else:
-                        # Yksittäinen '&' – lisätään se osaksi komentoa
-                        current_cmd.append(token)
-                        i += 1
-                        continue
-                else:
-                    current_cmd.append(token)
-                    i += 1
-            if current_cmd:
-                commands.append(current_cmd)
-            return commands
-        except Exception as e:
-            logger.warning(f"punctuation_chars -attribuutin käyttö epäonnistui: {e}")
-            return fallback_split(command_str)
-    else:
-        return fallback_split(command_str)
-
-def process_command_tokens(command_tokens):
+def process_command_tokens(command_tokens, cwd=None, venv_bin=None):
     """
     Tarkistaa ja valmistaa yhden käskyn tokenit:
       - Varmistetaan, että käskyn ensimmäinen sana (komento) on SAFE_COMMANDS-listassa.
       - Jos komennossa on polku, varmistetaan, ettei yritetä directory traversalia ja että tiedosto on suoritettava.
       - Jos kyseessä on .sh-tiedosto ilman shebangia, lisätään 'bash' suoritukseen.
+    Suhteelliset polut ratkotaan hakemistosta cwd (oletuksena WORK_DIR) ja komennot haetaan
+    aina palvelimen omasta PATH:sta. Vain tulkit (VENV_COMMANDS) haetaan ensin aktivoidun
+    virtuaaliympäristön hakemistosta venv_bin.
     """
     if not command_tokens:
         raise HTTPException(status_code=400, detail="Tyhjä komento.")
@@ -119,9 +136,9 @@ def process_command_tokens(command_tokens):
 
     WORK_DIR_abs = os.path.abspath(WORK_DIR)
 
-    # Jos komennossa on polku, ratkotaan se WORK_DIR:iin nähden
+    # Jos komennossa on polku, ratkotaan se työhakemistoon nähden ja varmistetaan, että se on WORK_DIR:n sisällä
     if '/' in cmd:
-        full_path = os.path.abspath(os.path.join(WORK_DIR, cmd))
+        full_path = os.path.abspath(os.path.join(cwd or WORK_DIR, cmd))
         if not (full_path == WORK_DIR_abs or full_path.startswith(WORK_DIR_abs + os.sep)):
             logger.warning(f"Blocked path traversal attempt: {cmd}")
             raise HTTPException(status_code=403, detail="Path traversal not allowed.")
@@ -149,8 +166,9 @@ def process_command_tokens(command_tokens):
                 if command_tokens[0] != "bash":
                     command_tokens.insert(0, "bash")
     else:
-        # Haetaan komennon polku järjestelmän PATH:sta
-        cmd_path = shutil.which(cmd)
+        # Haetaan komennon polku järjestelmän PATH:sta; virtuaaliympäristöstä vain tulkit
+        cmd_path = shutil.which(cmd, path=venv_bin) if venv_bin and cmd in VENV_COMMANDS else None
+        cmd_path = cmd_path or shutil.which(cmd)
         if not cmd_path:
             logger.warning(f"Command not found in system PATH: {cmd}")
             raise HTTPException(status_code=404, detail=f"Command '{cmd}' not found on system.")
@@ -158,59 +176,584 @@ def process_command_tokens(command_tokens):
 
     return command_tokens
 
-@router.post("/run-command", dependencies=[Depends(get_api_key)])
-async def run_command(request: RunCommandRequest):
+class AccountedProcess:
     """
-    Suorittaa valkoistetut shell-komennot turvallisesti ja palauttaa tuloksen.
-    Tukee komentojen ketjuttamista erotinoperaattoreilla ";" ja "&&", esim.
-      "sleep 30; cat flutter.log -n 50"
-      "git add . && git commit -m \"Added dynamic animations (bounce & glow) to letter cards.\""
+    Aliprosessi, jonka päättymistä odotetaan os.wait4-kutsulla omassa säikeessään, jolloin prosessin
+    resurssienkäyttö (CPU-ajat, muistihuippu) saadaan talteen. asyncion oma aliprosessirajapinta
+    korjaa prosessin itse eikä palauta näitä tietoja. Rajapinta vastaa asyncio.subprocess.Process-luokan
+    täällä käytettyjä osia.
     """
-    logger.info(f"Received command request: {request.command}")
 
+    def __init__(self, popen, stdout, stderr, process_group: bool = False):
+        self._popen = popen
+        self.pid = popen.pid
+        self.process_group = process_group
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+        self.rusage = None
+        self.peak_rss_kb = None
+        self.started = time.monotonic()
+        self.wall_time = None
+        self._loop = asyncio.get_running_loop()
+        self._exited = self._loop.create_future()
+        threading.Thread(target=self._wait4, name=f"wait4-{self.pid}", daemon=True).start()
+
+    def _wait4(self):
+        self.peak_rss_kb = sample_peak_rss(self.pid)
+        try:
+            _, status, rusage = os.wait4(self.pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            returncode, rusage = -1, None
+        try:
+            self._loop.call_soon_threadsafe(self._set_exited, returncode, rusage)
+        except RuntimeError:
+            # Tapahtumasilmukka on jo suljettu
+            pass
+
+    def _set_exited(self, returncode: int, rusage):
+        # Komento on voinut muuttaa tiedostoja, joten indeksit päivitetään seuraavassa haussa
+        mark_changed()
+        self.wall_time = time.monotonic() - self.started
+        self.returncode = returncode
+        self.rusage = rusage
+        self._popen.returncode = returncode
+        if not self._exited.done():
+            self._exited.set_result(returncode)
+
+    async def wait(self):
+        return await asyncio.shield(self._exited)
+
+    def send_signal(self, sig: int):
+        """Lähettää signaalin prosessille, tai koko prosessiryhmälle jos prosessi johtaa omaa ryhmäänsä."""
+        if self.returncode is None:
+            try:
+                if self.process_group:
+                    os.killpg(self.pid, sig)
+                else:
+                    os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+def command_resource_limits():
+    """Palauttaa konfiguroidut rlimit-rajat listana (resurssi, arvo)."""
+    limits = []
+    if COMMAND_CPU_LIMIT > 0:
+        limits.append((resource.RLIMIT_CPU, COMMAND_CPU_LIMIT))
+    if COMMAND_MEMORY_LIMIT > 0:
+        limits.append((resource.RLIMIT_AS, COMMAND_MEMORY_LIMIT))
+    if COMMAND_MAX_OPEN_FILES > 0:
+        limits.append((resource.RLIMIT_NOFILE, COMMAND_MAX_OPEN_FILES))
+    return limits
+
+def resource_limit_setter(limits):
+    """
+    Palauttaa preexec_fn-funktion, joka asettaa rajat lapsiprosessissa ennen exec-kutsua, jotta
+    komento ei ehdi ajaa hetkeäkään ilman niitä, tai None jos rajoja ei ole konfiguroitu (jolloin
+    Popen voi käyttää vforkia). Rajat lasketaan valmiiksi vanhemmassa, joten lapsessa tehdään
+    pelkät setrlimit-kutsut. Myös kova raja lasketaan, ettei komento voi nostaa pehmeää takaisin.
+    """
+    if not limits:
+        return None
+    values = []
+    for resource_id, value in limits:
+        _, hard = resource.getrlimit(resource_id)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        values.append((resource_id, (value, value)))
+
+    def set_limits():
+        for resource_id, pair in values:
+            resource.setrlimit(resource_id, pair)
+
+    return set_limits
+
+def _read_peak_rss(pid: int):
+    """Lukee prosessin muistihuipun (VmHWM, kt) /proc-tiedostosta, tai None jos sitä ei ole."""
     try:
-        # Jaetaan komentojono yksittäisiksi komennoiksi
-        commands_list = split_commands(request.command)
-        if not commands_list:
-            raise HTTPException(status_code=400, detail="No command provided.")
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
 
-        combined_stdout = []
-        combined_stderr = []
-        exit_code = 0
+def sample_peak_rss(pid: int):
+    """
+    Seuraa prosessin muistihuippua, kunnes prosessi päättyy, ja palauttaa suurimman luetun arvon
+    kilotavuina. exec aloittaa uuden muistiavaruuden, joten VmHWM kuvaa vain komentoa itseään;
+    rusagen ru_maxrss sisältäisi myös palvelinprosessin huipun, josta lapsi haarautui.
+    Päättyminen odotetaan pidfd:llä, joten seuranta ei viivästytä tulosta. Arvo on näytteistetty,
+    eli viimeisen näytevälin aikainen huippu voi jäädä näkemättä. Palauttaa None, jos prosessi
+    päättyi ennen ensimmäistä näytettä tai pidfd ja /proc eivät ole käytettävissä.
+    """
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+    peak = None
+    interval = 0.005
+    try:
+        while True:
+            value = _read_peak_rss(pid)
+            if value is not None:
+                peak = value if peak is None else max(peak, value)
+            readable, _, _ = select.select([pidfd], [], [], interval)
+            if readable:
+                return peak
+            interval = min(interval * 2, PEAK_RSS_SAMPLE_INTERVAL)
+    finally:
+        os.close(pidfd)
 
-        # Suoritetaan käskyt yksi kerrallaan
-        for cmd_tokens in commands_list:
-            processed_tokens = process_command_tokens(cmd_tokens)
-            logger.info(f"Executing command: {' '.join(processed_tokens)}")
-            result = subprocess.run(
-                processed_tokens,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=WORK_DIR,
-                timeout=55
+async def _connect_reader(pipe, limit: int):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit, loop=loop)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe)
+    return reader
+
+async def spawn_process(tokens, stdin=None, stdout=None, stderr=None, limit: int = 2 ** 16, resource_limits=None, **kwargs):
+    """
+    Käynnistää yhden aliprosessin AccountedProcess-oliona. PIPE-virrat kytketään asyncion
+    StreamReader-olioihin ja resource_limits-rajat asetetaan lapsessa ennen komennon käynnistymistä.
+    """
+    popen = subprocess.Popen(
+        tokens, stdin=stdin, stdout=stdout, stderr=stderr, preexec_fn=resource_limit_setter(resource_limits), **kwargs
+    )
+    try:
+        stdout_reader = await _connect_reader(popen.stdout, limit) if popen.stdout else None
+        stderr_reader = await _connect_reader(popen.stderr, limit) if popen.stderr else None
+    except Exception:
+        popen.kill()
+        popen.wait()
+        raise
+    return AccountedProcess(popen, stdout_reader, stderr_reader, kwargs.get("start_new_session", False))
+
+def pipeline_usage(processes, wall_time: float) -> dict:
+    """
+    Kokoaa putken prosessien resurssienkäytön: CPU-ajat summataan ja muistihuipuista otetaan suurin.
+    max_rss_kb on None, jos yksikään vaihe ei ehtinyt näytteistää muistihuippuaan (hyvin lyhyet komennot).
+    """
+    usages = [process.rusage for process in processes if process.rusage is not None]
+    peaks = [process.peak_rss_kb for process in processes if process.peak_rss_kb is not None]
+    return {
+        "wall_time": round(wall_time, 3),
+        "user_time": round(sum(usage.ru_utime for usage in usages), 3),
+        "system_time": round(sum(usage.ru_stime for usage in usages), 3),
+        "max_rss_kb": max(peaks, default=None)
+    }
+
+async def _capture_stream(stream, capture: OutputCapture, on_limit=None):
+    """
+    Lukee virtaa paloina OutputCapture-olioon, jolloin muistinkäyttö pysyy vakiona.
+    Jos COMMAND_MAX_OUTPUT_BYTES ylittyy, kutsutaan on_limit ja lopetetaan lukeminen.
+    """
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            break
+        capture.write(chunk)
+        if COMMAND_MAX_OUTPUT_BYTES > 0 and capture.total_bytes > COMMAND_MAX_OUTPUT_BYTES:
+            if on_limit is not None:
+                on_limit()
+            break
+
+def prepare_pipeline(stages, cwd=None, venv_bin=None):
+    """Tarkistaa ja valmistaa putken jokaisen vaiheen process_command_tokens-funktiolla."""
+    return [process_command_tokens(stage_tokens, cwd, venv_bin) for stage_tokens in stages]
+
+def pipeline_text(stages) -> str:
+    return " | ".join(shlex.join(stage_tokens) for stage_tokens in stages)
+
+async def spawn_pipeline(stages, stdout, stderr, stdin=None, **kwargs):
+    """
+    Käynnistää putken vaiheet ja kytkee ne toisiinsa käyttöjärjestelmän putkilla (os.pipe), joten
+    data kulkee vaiheelta toiselle ytimen kautta ilman Pythonin puskurointia. Viimeisen vaiheen
+    stdout on parametrin stdout mukainen ja kaikkien vaiheiden stderr parametrin stderr mukainen.
+    Palauttaa prosessit putken järjestyksessä.
+    """
+    processes = []
+    read_fd = None
+    try:
+        for i, stage_tokens in enumerate(stages):
+            last = i == len(stages) - 1
+            next_read_fd, write_fd = (None, None) if last else os.pipe()
+            try:
+                process = await spawn_process(
+                    stage_tokens,
+                    stdin=stdin if read_fd is None else read_fd,
+                    stdout=stdout if last else write_fd,
+                    stderr=stderr,
+                    **kwargs
+                )
+            finally:
+                # Suljetaan vanhemman kopiot, jotta EOF ja SIGPIPE kulkevat vaiheiden välillä
+                if read_fd is not None:
+                    os.close(read_fd)
+                if write_fd is not None:
+                    os.close(write_fd)
+                read_fd = next_read_fd
+            processes.append(process)
+    except Exception:
+        if read_fd is not None:
+            os.close(read_fd)
+        await terminate_pipeline(processes)
+        raise
+    return processes
+
+async def terminate_pipeline(processes):
+    """Tappaa putken kaikki vielä käynnissä olevat prosessit ja odottaa niiden päättymistä."""
+    for process in processes:
+        process.kill()
+    for process in processes:
+        await process.wait()
+
+async def execute_command(processed_stages, timeout: float = COMMAND_TIMEOUT, cwd=None, env=None):
+    """
+    Suorittaa yhden valmistellun putken asynkronisesti ilman, että tapahtumasilmukka blokkaantuu.
+    Palauttaa tuplen (returncode, stdout_capture, stderr_capture, usage), jossa paluukoodi on putken
+    viimeisen vaiheen ja usage putken resurssienkäyttö. Tulosteista pidetään muistissa vain alku
+    ja loppu; pidempi tuloste tallennetaan kokonaisuudessaan tiedostoon.
+    Aikakatkaisussa prosessit tapetaan ja asyncio.TimeoutError nostetaan kutsujalle.
+    """
+    stdout_capture = OutputCapture(COMMAND_OUTPUT_HEAD_BYTES, COMMAND_OUTPUT_TAIL_BYTES)
+    stderr_capture = OutputCapture(COMMAND_OUTPUT_HEAD_BYTES, COMMAND_OUTPUT_TAIL_BYTES)
+    output_limit_exceeded = False
+    try:
+        async with command_semaphore:
+            started = time.monotonic()
+            processes = await spawn_pipeline(
+                processed_stages,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd or WORK_DIR,
+                env=env,
+                resource_limits=command_resource_limits(),
+                start_new_session=True
             )
-            combined_stdout.append(result.stdout.strip())
-            combined_stderr.append(result.stderr.strip())
-            exit_code = result.returncode
 
-            # Jos käsky epäonnistuu, keskeytetään ketjun suoritus
-            if result.returncode != 0:
-                logger.warning(f"Command failed with exit code {result.returncode}. Keskeytetään ketjun suoritus.")
+            def on_output_limit():
+                nonlocal output_limit_exceeded
+                output_limit_exceeded = True
+                logger.warning(f"Command output exceeded {COMMAND_MAX_OUTPUT_BYTES} bytes, killing it")
+                for process in processes:
+                    process.kill()
+
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        _capture_stream(processes[-1].stdout, stdout_capture, on_output_limit),
+                        *(_capture_stream(process.stderr, stderr_capture, on_output_limit) for process in processes),
+                        *(process.wait() for process in processes)
+                    ),
+                    timeout=timeout
+                )
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # Aikakatkaisu tai pyynnön peruutus: tapetaan putken prosessiryhmät
+                await terminate_pipeline(processes)
+                raise
+            usage = pipeline_usage(processes, time.monotonic() - started)
+            usage["output_limit_exceeded"] = output_limit_exceeded
+    finally:
+        stdout_capture.close()
+        stderr_capture.close()
+    return processes[-1].returncode, stdout_capture, stderr_capture, usage
+
+async def _pump_stream(stream, stream_name: str, index: int, queue: asyncio.Queue, totals: dict, on_limit):
+    """
+    Lukee aliprosessin virtaa rivi kerrallaan ja siirtää rivit jonoon kehyksinä. Virran tavut
+    lasketaan totals-sanakirjaan; jos COMMAND_MAX_OUTPUT_BYTES ylittyy, kutsutaan on_limit ja
+    lopetetaan lukeminen. Lopuksi jonoon laitetaan None merkiksi virran sulkeutumisesta.
+    """
+    try:
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Rivi on pidempi kuin STREAM_LINE_LIMIT, luetaan se paloina
+                line = await stream.read(STREAM_LINE_LIMIT)
+            if not line:
                 break
+            totals[stream_name] = totals.get(stream_name, 0) + len(line)
+            if COMMAND_MAX_OUTPUT_BYTES > 0 and totals[stream_name] > COMMAND_MAX_OUTPUT_BYTES:
+                on_limit()
+                break
+            await queue.put({
+                "type": stream_name,
+                "index": index,
+                "line": line.decode("utf-8", errors="replace").rstrip("\n")
+            })
+    finally:
+        await queue.put(None)
+
+async def stream_command(processed_stages, index: int, timeout: float = COMMAND_TIMEOUT):
+    """
+    Suorittaa yhden valmistellun putken ja tuottaa stdout- ja stderr-rivit kehyksinä sitä mukaa
+    kuin ne valmistuvat. Viimeinen kehys on tyyppiä "exit" ja sisältää paluukoodin.
+    Jos aikaraja ylittyy tai kuluttaja lopettaa lukemisen, prosessit tapetaan.
+    """
+    async with command_semaphore:
+        started = time.monotonic()
+        processes = await spawn_pipeline(
+            processed_stages,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=WORK_DIR,
+            limit=STREAM_LINE_LIMIT,
+            resource_limits=command_resource_limits(),
+            start_new_session=True
+        )
+        output_limit_exceeded = False
+
+        def on_output_limit():
+            nonlocal output_limit_exceeded
+            output_limit_exceeded = True
+            logger.warning(f"Command output exceeded {COMMAND_MAX_OUTPUT_BYTES} bytes, killing it")
+            for process in processes:
+                process.kill()
+
+        # Kuten execute_command: stdout ja kaikkien vaiheiden yhteinen stderr rajataan kumpikin erikseen
+        queue = asyncio.Queue()
+        totals = {}
+        pumps = [asyncio.create_task(_pump_stream(processes[-1].stdout, "stdout", index, queue, totals, on_output_limit))]
+        pumps += [
+            asyncio.create_task(_pump_stream(process.stderr, "stderr", index, queue, totals, on_output_limit))
+            for process in processes
+        ]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            finished = 0
+            while finished < len(pumps):
+                frame = await asyncio.wait_for(queue.get(), timeout=max(deadline - loop.time(), 0))
+                if frame is None:
+                    finished += 1
+                    continue
+                yield frame
+            for process in processes:
+                await asyncio.wait_for(process.wait(), timeout=max(deadline - loop.time(), 0))
+        finally:
+            await terminate_pipeline(processes)
+            for pump in pumps:
+                pump.cancel()
+    usage = pipeline_usage(processes, time.monotonic() - started)
+    usage["output_limit_exceeded"] = output_limit_exceeded
+    yield {
+        "type": "exit",
+        "index": index,
+        "exit_code": processes[-1].returncode,
+        "resources": usage
+    }
+
+async def run_command_chain(command: str, session=None) -> dict:
+    """
+    Suorittaa komentojonon ja kokoaa /run-command-vastauksen. Jos session annetaan, komennot
+    ajetaan istunnon työhakemistossa ja ympäristössä, ja istunnon sisäiset komennot (esim. cd)
+    suoritetaan istunnossa itsessään.
+    """
+    # Jaetaan komentojono yksittäisiksi komennoiksi
+    commands_list = split_commands(command)
+    if not commands_list:
+        raise HTTPException(status_code=400, detail="No command provided.")
 
-        return {
-            "command": request.command,
-            "stdout": "\n".join(combined_stdout).strip(),
-            "stderr": "\n".join(combined_stderr).strip(),
-            "exit_code": exit_code
-        }
+    cwd = session.cwd if session is not None else WORK_DIR
+    env = session.environment() if session is not None else None
+    venv_bin = session.venv_bin() if session is not None else None
+
+    combined_stdout = []
+    combined_stderr = []
+    output_files = []
+    resources = []
+    exit_code = 0
+
+    # Suoritetaan käskyt yksi kerrallaan
+    for index, stages in enumerate(commands_list):
+        if session is not None and session.is_builtin(stages):
+            returncode, stdout_text, stderr_text = session.run_builtin(stages)
+            combined_stdout.append(stdout_text.strip())
+            combined_stderr.append(stderr_text.strip())
+            # Sisäinen komento voi muuttaa työhakemistoa tai ympäristöä seuraaville käskyille
+            cwd, env, venv_bin = session.cwd, session.environment(), session.venv_bin()
+        else:
+            command_text = pipeline_text(stages)
+            processed_stages = prepare_pipeline(stages, cwd, venv_bin)
+            logger.info(f"Executing command: {pipeline_text(processed_stages)}")
+            returncode, stdout_capture, stderr_capture, usage = await execute_command(processed_stages, cwd=cwd, env=env)
+            logger.info(f"Command finished with exit code {returncode}: {usage}")
+            resources.append({"index": index, "command": command_text, **usage})
+            combined_stdout.append(stdout_capture.text().strip())
+            combined_stderr.append(stderr_capture.text().strip())
+            for stream_name, capture in (("stdout", stdout_capture), ("stderr", stderr_capture)):
+                if capture.truncated:
+                    output_files.append({
+                        "index": index,
+                        "stream": stream_name,
+                        "handle": capture.handle,
+                        "total_bytes": capture.total_bytes
+                    })
+        exit_code = returncode
+
+        # Jos käsky epäonnistuu, keskeytetään ketjun suoritus
+        if returncode != 0:
+            logger.warning(f"Command failed with exit code {returncode}. Keskeytetään ketjun suoritus.")
+            break
+
+    return {
+        "command": command,
+        "stdout": "\n".join(combined_stdout).strip(),
+        "stderr": "\n".join(combined_stderr).strip(),
+        "exit_code": exit_code,
+        "truncated": bool(output_files),
+        "output_files": output_files,
+        "resources": resources
+    }
+
+@router.post("/run-command", dependencies=[Depends(get_api_key)])
+async def run_command(request: RunCommandRequest, http_request: Request):
+    """
+    Suorittaa valkoistetut shell-komennot turvallisesti ja palauttaa tuloksen.
+    Tukee komentojen ketjuttamista erotinoperaattoreilla ";" ja "&&" sekä putkia "|", esim.
+      "sleep 30; cat flutter.log -n 50"
+      "git add . && git commit -m \"Added dynamic animations (bounce & glow) to letter cards.\""
+      "git log --oneline | grep fix | head -n 5"
+    Komennot ajetaan asynkronisina aliprosesseina, joten muut pyynnöt palvellaan suorituksen aikana.
+    Jos asiakas katkaisee yhteyden, suoritus perutaan ja prosessiryhmät tapetaan.
+    """
+    logger.info(f"Received command request: {request.command}")
 
+    try:
+        return await run_until_disconnected(http_request, run_command_chain(request.command), "run_command")
     except HTTPException as he:
         raise he
-    except subprocess.TimeoutExpired as te:
+    except asyncio.TimeoutError as te:
         logger.error(f"Command timeout: {str(te)}")
         raise HTTPException(status_code=504, detail="Command execution timed out.")
     except Exception as e:
         logger.error(f"Command execution failed: {str(e)}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail="Command execution failed.")
+
+async def _run_batch_item(index: int, command: str) -> dict:
+    """Suorittaa yhden erän komennon ja palauttaa sen tuloksen tai virheen ajoaikoineen."""
+    started = time.monotonic()
+    try:
+        result = await run_command_chain(command)
+        result["error"] = None
+    except HTTPException as he:
+        result = {"command": command, "status_code": he.status_code, "error": he.detail}
+    except asyncio.TimeoutError:
+        logger.error(f"Batch command timeout: {command}")
+        result = {"command": command, "status_code": 504, "error": "Command execution timed out."}
+    except Exception as e:
+        logger.error(f"Batch command failed: {str(e)}\n{traceback.format_exc()}")
+        result = {"command": command, "status_code": 500, "error": "Command execution failed."}
+    result["index"] = index
+    result["elapsed"] = round(time.monotonic() - started, 3)
+    return result
+
+@router.post("/run-command/batch", dependencies=[Depends(get_api_key)])
+async def run_command_batch(request: BatchCommandRequest, http_request: Request):
+    """
+    Suorittaa joukon toisistaan riippumattomia komentojonoja rinnakkain yhdellä pyynnöllä.
+    Jokainen komento tarkistetaan kuten /run-command-pyynnössä, ja rinnakkaisuutta rajoittaa
+    sama MAX_CONCURRENT_COMMANDS-raja. Tulokset palautetaan pyynnön järjestyksessä; yksittäisen
+    komennon virhe palautetaan sen omassa tuloksessa error- ja status_code-kentissä.
+    """
+    logger.info(f"Received batch command request: {request.commands}")
+    if not request.commands:
+        raise HTTPException(status_code=400, detail="No command provided.")
+    if len(request.commands) > MAX_BATCH_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_COMMANDS} commands per batch.")
+
+    started = time.monotonic()
+    results = await run_until_disconnected(
+        http_request,
+        asyncio.gather(*(_run_batch_item(index, command) for index, command in enumerate(request.commands))),
+        "run_command_batch"
+    )
+    return {"results": results, "elapsed": round(time.monotonic() - started, 3)}
+
+@router.get("/run-command/output/{handle}", dependencies=[Depends(get_api_key)])
+def get_command_output(
+    handle: str,
+    offset: int = Query(0, ge=0, description="Tavusiirtymä, josta luku aloitetaan"),
+    limit: int = Query(64 * 1024, ge=1, le=4 * 1024 * 1024, description="Palautettavien tavujen enimmäismäärä")
+):
+    """
+    Palauttaa sivun katkaistun komennon täydestä tulosteesta. Handle saadaan /run-command-vastauksen
+    output_files-listasta; seuraava sivu luetaan next_offset-kohdasta.
+    """
+    file_path = spill_file_path(handle)
+    if file_path is None or not file_path.exists():
+        raise HTTPException(status_code=404, detail="Output not found")
+    with open(file_path, "rb") as f:
+        total_bytes = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read(limit)
+    return {
+        "handle": handle,
+        "offset": offset,
+        "next_offset": offset + len(data),
+        "total_bytes": total_bytes,
+        "output": data.decode("utf-8", errors="replace")
+    }
+
+@router.post("/run-command/stream", dependencies=[Depends(get_api_key)])
+async def run_command_stream(request: RunCommandRequest):
+    """
+    Kuten /run-command, mutta tulosteet striimataan NDJSON-muodossa rivi kerrallaan niiden valmistuessa.
+    Jokainen kehys sisältää kentän "index", joka kertoo mikä ketjun osakomento tuotti rivin:
+      {"type": "start", "index": 0, "command": "git log"}
+      {"type": "stdout", "index": 0, "line": "..."}
+      {"type": "exit", "index": 0, "exit_code": 0}
+    Viimeinen kehys on {"type": "end", "exit_code": ...}. Kaikki osakomennot tarkistetaan ennen
+    suorituksen aloittamista, jotta virheellinen komento palauttaa normaalin HTTP-virheen.
+    """
+    logger.info(f"Received streaming command request: {request.command}")
+
+    commands_list = split_commands(request.command)
+    if not commands_list:
+        raise HTTPException(status_code=400, detail="No command provided.")
+    command_texts = [pipeline_text(stages) for stages in commands_list]
+    prepared_commands = [prepare_pipeline(stages) for stages in commands_list]
+
+    async def frames():
+        exit_code = 0
+        for index, processed_stages in enumerate(prepared_commands):
+            logger.info(f"Streaming command: {pipeline_text(processed_stages)}")
+            yield json.dumps({"type": "start", "index": index, "command": command_texts[index]}) + "\n"
+            try:
+                async for frame in stream_command(processed_stages, index):
+                    if frame["type"] == "exit":
+                        exit_code = frame["exit_code"]
+                    yield json.dumps(frame) + "\n"
+            except asyncio.TimeoutError:
+                logger.error(f"Streaming command timeout: {command_texts[index]}")
+                exit_code = -1
+                yield json.dumps({"type": "error", "index": index, "detail": "Command execution timed out."}) + "\n"
+                break
+            except asyncio.CancelledError:
+                # Asiakas katkaisi yhteyden; stream_command tappaa prosessit
+                metrics.increment("cancelled_on_disconnect.run_command_stream")
+                logger.info("Client disconnected, cancelled streaming command")
+                raise
+            except Exception as e:
+                logger.error(f"Streaming command failed: {str(e)}\n{traceback.format_exc()}")
+                exit_code = -1
+                yield json.dumps({"type": "error", "index": index, "detail": "Command execution failed."}) + "\n"
+                break
+
+            # Jos käsky epäonnistuu, keskeytetään ketjun suoritus
+            if exit_code != 0:
+                logger.warning(f"Command failed with exit code {exit_code}. Keskeytetään ketjun suoritus.")
+                break
+        yield json.dumps({"type": "end", "exit_code": exit_code}) + "\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,27 +1,46 @@
-from fastapi import APIRouter, HTTPException, Depends
-import subprocess
+from fastapi import APIRouter, HTTPException, Depends, Request
+import asyncio
 import logging
 from api.config import logger, BASE_DIR, get_api_key
+from api.cancellation import run_until_disconnected
+from api.run_command_endpoint import spawn_process
 
 
 
 router = APIRouter()
 
+async def _run_test_script(script_path):
+    process = await spawn_process(
+        ["bash", str(script_path)],
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+    try:
+        stdout, stderr, _ = await asyncio.gather(process.stdout.read(), process.stderr.read(), process.wait())
+    except asyncio.CancelledError:
+        # Kill the whole test run, including the pytest processes started by the script
+        process.kill()
+        await process.wait()
+        raise
+    return {
+        "stdout": stdout.decode("utf-8", errors="replace"),
+        "stderr": stderr.decode("utf-8", errors="replace"),
+        "returncode": process.returncode
+    }
+
 @router.get("/run-tests", dependencies=[Depends(get_api_key)])
-def run_api_tests():
-    """Runs the API test script."""
+async def run_api_tests(request: Request):
+    """Runs the API test script. The run is killed if the client disconnects."""
     logger.info("Running API tests")
     script_path = BASE_DIR / "run_api_tests.sh"
     if not script_path.exists():
         logger.error("Test script not found")
         raise HTTPException(status_code=404, detail="Test script not found")
     try:
-        result = subprocess.run(["bash", str(script_path)], capture_output=True, text=True)
-        return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode
-        }
+        return await run_until_disconnected(request, _run_test_script(script_path), "run_api_tests")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to execute test script: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to execute test script: {str(e)}")
@@ -1,22 +1,54 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pathlib import Path
 from api.config import WORK_DIR, get_api_key, logger
-from pydantic import BaseModel
+from api.cancellation import run_until_disconnected
+from api.search_index import get_search_index
+from api.tree_walker import root_matcher, scan_directory
+from api.binary_detection import is_binary_file
+from api.content_search import compile_pattern, search_files_chunk, get_search_pool, search_worker_count
+from api import metrics
+from pydantic import BaseModel, Field
+from contextlib import aclosing
+from typing import Optional
 import os
+import json
 import asyncio
 import aiofiles
+import re
 
 class FileSearchRequest(BaseModel):
     query: str
+    max_results: Optional[int] = Field(None, ge=1)
+    timeout_ms: Optional[int] = Field(None, ge=1)
+
+class LineSearchRequest(BaseModel):
+    pattern: str
+    regex: bool = False
+    case_sensitive: bool = False
+    whole_word: bool = False
+    context_lines: int = Field(0, ge=0, le=20)
+    max_results: int = Field(500, ge=1, le=10000)
+    timeout_ms: Optional[int] = Field(None, ge=1)
 
 router = APIRouter()
 
+# Rinnakkaisten tiedostonlukijoiden määrä ja jonojen koko; muistinkäyttö ei kasva tiedostomäärän mukana
+SEARCH_READERS = 32
+SEARCH_QUEUE_SIZE = 256
+
+# Rivihaussa työprosessille annetaan kerralla näin monta tiedostoa
+LINE_SEARCH_CHUNK_FILES = 64
+
 async def search_in_file(file_path: str, query: str, max_bytes: int = 1024 * 1024) -> bool:
     """
     Tarkistaa, löytyykö haettava teksti tiedostosta.
     Lukee tiedostosta enintään max_bytes (oletuksena 1 Mt) ja etsii hakutermiä.
+    Binääritiedostoja (kuvat, arkistot, käännetyt tiedostot) ei lueta.
     """
     try:
+        if await asyncio.to_thread(is_binary_file, file_path):
+            return False
         async with aiofiles.open(file_path, mode='rb') as f:
             content = await f.read(max_bytes)
             # Yritetään purkaa utf-8:n mukaisesti, virheet ohitetaan
@@ -26,7 +58,7 @@ async def search_in_file(file_path: str, query: str, max_bytes: int = 1024 * 102
         logger.warning(f"Ei voitu lukea tiedostoa {file_path}: {e}")
         return False
 
-async def process_file(file_path: str, query: str, semaphore: asyncio.Semaphore) -> str:
+async def process_file(file_path: str, query: str) -> str:
     """
     Käsittelee yksittäisen tiedoston: jos hakutermi löytyy joko tiedostonimestä
     tai sen sisällöstä, palauttaa tiedostopolun suhteellisena WORK_DIR:stä, muuten None.
@@ -34,42 +66,270 @@ async def process_file(file_path: str, query: str, semaphore: asyncio.Semaphore)
     # Tarkistetaan ensin tiedostonimi (nopea vertailu)
     if query in os.path.basename(file_path).lower():
         return os.path.relpath(file_path, WORK_DIR)
-    async with semaphore:
-        if await search_in_file(file_path, query):
-            return os.path.relpath(file_path, WORK_DIR)
+    if await search_in_file(file_path, query):
+        return os.path.relpath(file_path, WORK_DIR)
     return None
 
-async def search_files_async(query: str) -> list:
+async def walk_files(root):
     """
-    Asynkronisesti hakee tiedostoja WORK_DIR:stä, joissa hakutermi esiintyy.
-    Samanaikaisuutta rajoitetaan semaforilla (oletuksena 100 rinnakkaista lukua).
+    Käy hakemistopuun läpi hakemisto kerrallaan, joten ensimmäiset tiedostot saadaan heti.
+    .gitignore- ja .ignore-tiedostojen sekä IGNORE_PATTERNS-asetuksen ohittamat polut jätetään pois.
     """
-    tasks = []
-    semaphore = asyncio.Semaphore(100)
-    
-    for root, _, filenames in os.walk(WORK_DIR):
-        for filename in filenames:
-            file_path = os.path.join(root, filename)
-            tasks.append(process_file(file_path, query, semaphore))
-    
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-    # Palautetaan vain ne polut, joissa hakutermi löytyi
-    matches = [result for result in results if result is not None]
-    return matches
+    pending = [(str(root), root_matcher(root))]
+    while pending:
+        directory, matcher = pending.pop()
+        files, directories, matcher = await asyncio.to_thread(scan_directory, directory, matcher)
+        for file_path in files:
+            yield file_path
+        pending.extend((subdirectory, matcher) for subdirectory in reversed(directories))
 
-@router.post("/search-files", dependencies=[Depends(get_api_key)])
-async def search_files(request: FileSearchRequest):
+async def index_candidates(query: str, whole_files: bool = False):
     """
-    Asynkroninen endpoint, joka hakee tiedostoja tiedostonimen tai sisällön perusteella.
-    Lukee kunkin tiedoston enintään 1 Mt dataa suorituskyvyn varmistamiseksi.
+    Päivittää trigrammi-indeksin ja tuottaa ehdokastiedostot, jotka pitää vielä varmistaa.
+    whole_files lisää ehdokkaisiin tiedostot, joista indeksissä on vain alku (yli 1 Mt).
+    """
+    index = get_search_index()
+    await asyncio.to_thread(index.refresh_if_stale)
+    for path in await asyncio.to_thread(index.candidates, query, whole_files):
+        yield os.path.join(WORK_DIR, path)
+
+class FileSearch:
     """
+    Tiedostohaku tuottaja-kuluttaja -putkena: tuottaja syöttää polkuja rajattuun jonoon,
+    kiinteä joukko lukijoita tarkistaa tiedostot ja osumat palautetaan sitä mukaa kuin
+    ne löytyvät. Haku pysähtyy, kun max_results osumaa on löytynyt tai timeout_ms on kulunut.
+    Alle kolmen tavun hakutermeille ei ole trigrammeja, joten ne käyvät koko puun läpi;
+    muuten avataan vain trigrammi-indeksin ehdokastiedostot.
+    """
+
+    def __init__(self, query: str, max_results: Optional[int] = None, timeout_ms: Optional[int] = None):
+        self.query = query
+        self.max_results = max_results
+        self.timeout_ms = timeout_ms
+        self.truncated = False
+        self.timed_out = False
+
+    def _source(self):
+        if len(self.query.encode("utf-8")) < 3:
+            return walk_files(WORK_DIR)
+        return index_candidates(self.query)
+
+    async def _produce(self, paths: asyncio.Queue):
+        error = None
+        try:
+            async with aclosing(self._source()) as source:
+                async for file_path in source:
+                    await paths.put(file_path)
+        except Exception as e:
+            error = e
+        # Lukijat lopettavat saatuaan None-merkin; virhe välitetään kutsujalle lukijoiden jälkeen
+        for _ in range(SEARCH_READERS):
+            await paths.put(None)
+        if error is not None:
+            raise error
+
+    async def _read(self, paths: asyncio.Queue, results: asyncio.Queue):
+        while (file_path := await paths.get()) is not None:
+            match = await process_file(file_path, self.query)
+            if match is not None:
+                await results.put(match)
+        await results.put(None)
+
+    async def matches(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_ms / 1000 if self.timeout_ms else None
+        paths = asyncio.Queue(SEARCH_QUEUE_SIZE)
+        results = asyncio.Queue(SEARCH_QUEUE_SIZE)
+        tasks = [asyncio.create_task(self._produce(paths))]
+        tasks += [asyncio.create_task(self._read(paths, results)) for _ in range(SEARCH_READERS)]
+        try:
+            found = 0
+            running_readers = SEARCH_READERS
+            while running_readers:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                try:
+                    match = await asyncio.wait_for(results.get(), timeout)
+                except asyncio.TimeoutError:
+                    self.timed_out = True
+                    return
+                if match is None:
+                    running_readers -= 1
+                    continue
+                yield match
+                found += 1
+                if self.max_results and found >= self.max_results:
+                    self.truncated = True
+                    return
+            await tasks[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def search_files_async(search: FileSearch) -> list:
+    """Kerää kaikki haun osumat listaksi."""
+    async with aclosing(search.matches()) as matches:
+        return sorted([match async for match in matches])
+
+def _validated_query(request: FileSearchRequest) -> str:
     query = request.query.lower().strip()
     if not query:
         raise HTTPException(status_code=400, detail="Hakutermi on pakollinen.")
-    
+    return query
+
+@router.post("/search-files", dependencies=[Depends(get_api_key)])
+async def search_files(request: FileSearchRequest, http_request: Request):
+    """
+    Asynkroninen endpoint, joka hakee tiedostoja tiedostonimen tai sisällön perusteella.
+    Lukee kunkin tiedoston enintään 1 Mt dataa suorituskyvyn varmistamiseksi.
+    Valinnaiset max_results ja timeout_ms lopettavat haun aikaisemmin; tällöin vastauksen
+    kenttä truncated tai timed_out on tosi. Haku perutaan, jos asiakas katkaisee yhteyden.
+    """
+    query = _validated_query(request)
+    search = FileSearch(query, request.max_results, request.timeout_ms)
+
     try:
-        matches = await search_files_async(query)
-        return {"matches": matches}
+        matches = await run_until_disconnected(http_request, search_files_async(search), "search_files")
+        return {"matches": matches, "truncated": search.truncated, "timed_out": search.timed_out}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Tiedostojen haku epäonnistui: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Tiedostojen haku epäonnistui: {str(e)}")
+
+@router.post("/search-files/stream", dependencies=[Depends(get_api_key)])
+async def search_files_stream(request: FileSearchRequest):
+    """
+    Kuten /search-files, mutta osumat striimataan NDJSON-muodossa heti niiden löytyessä:
+      {"type": "match", "path": "src/main.py"}
+    Viimeinen kehys on {"type": "end", "matches": ..., "truncated": ..., "timed_out": ...}.
+    Haku perutaan, jos asiakas katkaisee yhteyden.
+    """
+    query = _validated_query(request)
+    search = FileSearch(query, request.max_results, request.timeout_ms)
+
+    async def frames():
+        found = 0
+        try:
+            async with aclosing(search.matches()) as matches:
+                async for match in matches:
+                    found += 1
+                    yield json.dumps({"type": "match", "path": match}) + "\n"
+        except asyncio.CancelledError:
+            metrics.increment("cancelled_on_disconnect.search_files_stream")
+            logger.info("Client disconnected, cancelled streaming search")
+            raise
+        except Exception as e:
+            logger.error(f"Tiedostojen haku epäonnistui: {str(e)}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": f"Tiedostojen haku epäonnistui: {str(e)}"}) + "\n"
+        yield json.dumps({
+            "type": "end", "matches": found, "truncated": search.truncated, "timed_out": search.timed_out
+        }) + "\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def search_lines_async(request: LineSearchRequest, pattern: bytes, flags: int) -> dict:
+    """
+    Hakee rivit, joilla hakulauseke esiintyy. Tiedostot jaetaan paloina ProcessPoolExecutorin
+    työprosesseille, jotka lukevat kokonaiset tiedostot mmapin kautta. Kerralla työn alla on
+    enintään kaksi palaa työprosessia kohden, joten muistinkäyttö pysyy rajattuna.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_search_pool()
+    max_in_flight = 2 * search_worker_count()
+    deadline = loop.time() + request.timeout_ms / 1000 if request.timeout_ms else None
+    results = []
+    pending = set()
+    found = 0
+    timed_out = False
+
+    def submit(chunk):
+        # Yksi ylimääräinen osuma kertoo, että tuloksia jäi pois
+        limit = request.max_results + 1 - found
+        pending.add(loop.run_in_executor(
+            pool, search_files_chunk, chunk, pattern, flags, request.context_lines, limit
+        ))
+
+    async def drain(max_pending: int) -> bool:
+        """Odottaa valmistuneita paloja, kunnes kesken on enintään max_pending. Palauttaa True, jos haku lopetetaan."""
+        nonlocal found, timed_out
+        while len(pending) > max_pending:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                timed_out = True
+                return True
+            for future in done:
+                pending.discard(future)
+                for path, matches in future.result():
+                    relative_path = os.path.relpath(path, WORK_DIR)
+                    results.extend({"path": relative_path, **match} for match in matches)
+                    found += len(matches)
+            if found > request.max_results:
+                return True
+        return False
+
+    # Literaalihaussa trigrammi-indeksi rajaa tiedostot; säännöllisille lausekkeille käydään koko puu.
+    # Rivihaku lukee tiedostot kokonaan, joten yli 1 Mt:n tiedostot ovat aina ehdokkaita.
+    if request.regex or len(request.pattern.encode("utf-8")) < 3:
+        source = walk_files(WORK_DIR)
+    else:
+        source = index_candidates(request.pattern.lower(), whole_files=True)
+
+    try:
+        async with aclosing(source) as paths:
+            chunk = []
+            stopped = False
+            async for path in paths:
+                chunk.append(path)
+                if len(chunk) >= LINE_SEARCH_CHUNK_FILES:
+                    submit(chunk)
+                    chunk = []
+                    if await drain(max_in_flight - 1):
+                        stopped = True
+                        break
+            if chunk and not stopped:
+                submit(chunk)
+            if not stopped:
+                await drain(0)
+    finally:
+        for future in pending:
+            future.cancel()
+
+    results.sort(key=lambda match: (match["path"], match["line"]))
+    results = results[:request.max_results]
+    return {
+        "matches": results,
+        "files": len({match["path"] for match in results}),
+        "truncated": found > request.max_results,
+        "timed_out": timed_out
+    }
+
+@router.post("/search-files/lines", dependencies=[Depends(get_api_key)])
+async def search_lines(request: LineSearchRequest, http_request: Request):
+    """
+    Hakee tiedostojen sisällöstä osumarivit rivinumeroineen. Hakulauseke voi olla
+    säännöllinen lauseke (regex), ja haku voi huomioida kirjainkoon (case_sensitive)
+    tai vain kokonaiset sanat (whole_word). context_lines lisää jokaiseen osumaan
+    ympäröivät rivit kenttiin "before" ja "after". Tiedostot luetaan kokonaan.
+    """
+    if not request.pattern:
+        raise HTTPException(status_code=400, detail="Hakulauseke on pakollinen.")
+    try:
+        pattern, flags = compile_pattern(request.pattern, request.regex, request.case_sensitive, request.whole_word)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Virheellinen säännöllinen lauseke: {e}")
+
+    try:
+        return await run_until_disconnected(
+            http_request, search_lines_async(request, pattern, flags), "search_files_lines"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Rivihaku epäonnistui: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Rivihaku epäonnistui: {str(e)}")
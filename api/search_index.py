@@ -0,0 +1,297 @@
+import os
+import sqlite3
+import stat
+import threading
+import time
+from array import array
+from api.config import logger, WORK_DIR, SEARCH_INDEX_DB, SEARCH_INDEX_REFRESH_INTERVAL
+from api.tree_walker import walk_files
+from api.binary_detection import is_binary_file
+from api.workspace_changes import change_generation
+
+# Only the start of each file is indexed, the same amount /search-files reads from a file
+MAX_INDEXED_BYTES = 1024 * 1024
+
+# Queries longer than this are narrowed with an evenly spread subset of their trigrams
+MAX_QUERY_TRIGRAMS = 32
+
+# Number of changed files read and written per transaction while refreshing
+REFRESH_BATCH_SIZE = 200
+
+# Posting lists are split by file id into segments of this many files, so updating one
+# file rewrites a few small blobs instead of the whole list of a common trigram
+SEGMENT_SIZE = 1024
+
+# Maximum number of bound parameters used in one IN (...) query
+SQL_CHUNK_SIZE = 500
+
+SCHEMA_VERSION = 1
+
+def text_trigrams(data: bytes) -> set:
+    """Returns the distinct byte trigrams of lowercased UTF-8 text."""
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+def normalize_content(content: bytes) -> bytes:
+    """Normalizes file content the same way search_in_file compares it."""
+    return content.decode("utf-8", errors="ignore").lower().encode("utf-8")
+
+def pack_trigrams(trigrams) -> bytes:
+    return b"".join(sorted(trigrams))
+
+def unpack_trigrams(data: bytes) -> set:
+    return {data[i:i + 3] for i in range(0, len(data), 3)}
+
+def pack_ids(ids) -> bytes:
+    return array("I", sorted(ids)).tobytes()
+
+def unpack_ids(data: bytes) -> array:
+    ids = array("I")
+    ids.frombytes(data)
+    return ids
+
+class TrigramIndex:
+    """
+    Persistent trigram inverted index of a directory tree, stored in SQLite.
+    Files are re-indexed only when their mtime or size changes, so keeping the index
+    fresh costs one stat per file. Queries return candidate files that contain every
+    trigram of the query; callers still confirm the match from the file itself.
+    """
+
+    def __init__(self, root, db_path, refresh_interval: float):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0.0
+        self.refreshed_generation = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            root = None
+            if version == SCHEMA_VERSION:
+                row = self._conn.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+                root = row[0] if row else None
+            if version != SCHEMA_VERSION or root != self.root:
+                # Paths are stored relative to the root, so an index of another tree is useless
+                self._conn.execute("DROP TABLE IF EXISTS postings")
+                self._conn.execute("DROP TABLE IF EXISTS files")
+                self._conn.execute("DROP TABLE IF EXISTS meta")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    trigrams BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS postings (
+                    trigram BLOB NOT NULL,
+                    segment INTEGER NOT NULL,
+                    ids BLOB NOT NULL,
+                    PRIMARY KEY (trigram, segment)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root', ?)", (self.root,))
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _scan(self) -> dict:
+        """Returns {relative path: (mtime_ns, size)} of the regular, not ignored files under the root."""
+        files = {}
+        db_path = os.path.abspath(self.db_path)
+        for full_path in walk_files(self.root):
+            if full_path.startswith(db_path):
+                continue
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files[os.path.relpath(full_path, self.root)] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def _read_trigrams(self, path: str) -> set:
+        """Returns the trigrams of a file's content; binary files are indexed by name only."""
+        full_path = os.path.join(self.root, path)
+        try:
+            if is_binary_file(full_path):
+                return set()
+            with open(full_path, "rb") as f:
+                return text_trigrams(normalize_content(f.read(MAX_INDEXED_BYTES)))
+        except OSError as e:
+            logger.warning(f"Could not index {path}: {e}")
+            return set()
+
+    def _apply_postings(self, changes: dict):
+        """Applies {(trigram, segment): (added ids, removed ids)} to the stored posting lists."""
+        for (trigram, segment), (added, removed) in changes.items():
+            row = self._conn.execute(
+                "SELECT ids FROM postings WHERE trigram = ? AND segment = ?", (trigram, segment)
+            ).fetchone()
+            ids = set(unpack_ids(row[0])) if row else set()
+            ids -= removed
+            ids |= added
+            if ids:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO postings (trigram, segment, ids) VALUES (?, ?, ?)",
+                    (trigram, segment, pack_ids(ids))
+                )
+            elif row:
+                self._conn.execute("DELETE FROM postings WHERE trigram = ? AND segment = ?", (trigram, segment))
+
+    def _write_batch(self, updates, removed_ids):
+        """Stores re-indexed files and drops removed ones in a single transaction."""
+        changes = {}
+
+        def record(file_id, trigrams, slot):
+            segment = file_id // SEGMENT_SIZE
+            for trigram in trigrams:
+                changes.setdefault((trigram, segment), (set(), set()))[slot].add(file_id)
+
+        with self._lock, self._conn:
+            for file_id in removed_ids:
+                row = self._conn.execute("SELECT trigrams FROM files WHERE id = ?", (file_id,)).fetchone()
+                if row:
+                    record(file_id, unpack_trigrams(row[0]), 1)
+                self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            for path, (mtime_ns, size), trigrams in updates:
+                row = self._conn.execute("SELECT id, trigrams FROM files WHERE path = ?", (path,)).fetchone()
+                if row:
+                    file_id, old_trigrams = row[0], unpack_trigrams(row[1])
+                    self._conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ?, trigrams = ? WHERE id = ?",
+                        (mtime_ns, size, pack_trigrams(trigrams), file_id)
+                    )
+                    record(file_id, old_trigrams - trigrams, 1)
+                    record(file_id, trigrams - old_trigrams, 0)
+                else:
+                    file_id = self._conn.execute(
+                        "INSERT INTO files (path, name, mtime_ns, size, trigrams) VALUES (?, ?, ?, ?, ?)",
+                        (path, os.path.basename(path).lower(), mtime_ns, size, pack_trigrams(trigrams))
+                    ).lastrowid
+                    record(file_id, trigrams, 0)
+            self._apply_postings(changes)
+
+    def refresh(self):
+        """Brings the index up to date with the files on disk."""
+        with self._refresh_lock:
+            started = time.time()
+            generation = change_generation()
+            on_disk = self._scan()
+            with self._lock:
+                indexed = {
+                    path: (mtime_ns, size)
+                    for path, mtime_ns, size in self._conn.execute("SELECT path, mtime_ns, size FROM files")
+                }
+                removed = [
+                    row[0] for row in self._conn.execute("SELECT id, path FROM files")
+                    if row[1] not in on_disk
+                ]
+            changed = [path for path, file_stat in on_disk.items() if indexed.get(path) != file_stat]
+            if removed:
+                self._write_batch([], removed)
+            for start in range(0, len(changed), REFRESH_BATCH_SIZE):
+                # Files are read outside the database lock so queries are not blocked by I/O,
+                # and in batches so a first build does not hold every trigram set in memory
+                batch = changed[start:start + REFRESH_BATCH_SIZE]
+                self._write_batch([(path, on_disk[path], self._read_trigrams(path)) for path in batch], [])
+            self.last_refresh = time.time()
+            self.refreshed_generation = generation
+            if removed or changed:
+                logger.info(
+                    f"Search index refreshed: {len(changed)} files indexed, {len(removed)} removed "
+                    f"in {self.last_refresh - started:.2f}s"
+                )
+
+    def is_stale(self) -> bool:
+        """True when the refresh interval has passed or the workspace was marked changed since the last refresh."""
+        return (
+            time.time() - self.last_refresh >= self.refresh_interval
+            or self.refreshed_generation != change_generation()
+        )
+
+    def refresh_if_stale(self):
+        if self.is_stale():
+            with self._refresh_lock:
+                # Another thread may have refreshed the index while this one waited
+                if self.is_stale():
+                    self.refresh()
+
+    def _content_candidates(self, trigrams) -> set:
+        """Returns ids of files that contain every trigram, intersecting the rarest lists first."""
+        placeholders = ", ".join("?" for _ in trigrams)
+        sizes = dict(self._conn.execute(
+            f"SELECT trigram, SUM(length(ids)) FROM postings WHERE trigram IN ({placeholders}) GROUP BY trigram",
+            trigrams
+        ).fetchall())
+        if len(sizes) < len(trigrams):
+            return set()
+        file_ids = None
+        for trigram in sorted(trigrams, key=sizes.get):
+            ids = set()
+            for (data,) in self._conn.execute("SELECT ids FROM postings WHERE trigram = ?", (trigram,)):
+                ids.update(unpack_ids(data))
+            file_ids = ids if file_ids is None else file_ids & ids
+            if not file_ids:
+                break
+        return file_ids
+
+    def candidates(self, query: str, whole_files: bool = False) -> list:
+        """
+        Returns relative paths of files whose name contains the query or whose indexed
+        content contains every trigram of it. The query must be at least 3 bytes long.
+        With whole_files, files larger than MAX_INDEXED_BYTES are always included, since
+        the query may occur past their indexed start.
+        """
+        query = query.lower()
+        trigrams = sorted(text_trigrams(query.encode("utf-8")))
+        if not trigrams:
+            raise ValueError("Query is too short for the trigram index")
+        if len(trigrams) > MAX_QUERY_TRIGRAMS:
+            step = len(trigrams) / MAX_QUERY_TRIGRAMS
+            trigrams = [trigrams[int(i * step)] for i in range(MAX_QUERY_TRIGRAMS)]
+        with self._lock:
+            paths = {
+                row[0] for row in self._conn.execute("SELECT path FROM files WHERE instr(name, ?) > 0", (query,))
+            }
+            if whole_files:
+                paths.update(
+                    row[0] for row in self._conn.execute("SELECT path FROM files WHERE size > ?", (MAX_INDEXED_BYTES,))
+                )
+            file_ids = list(self._content_candidates(trigrams))
+            for start in range(0, len(file_ids), SQL_CHUNK_SIZE):
+                chunk = file_ids[start:start + SQL_CHUNK_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                paths.update(
+                    row[0] for row in self._conn.execute(f"SELECT path FROM files WHERE id IN ({placeholders})", chunk)
+                )
+        return sorted(paths)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_search_index() -> TrigramIndex:
+    """Returns the shared index of WORK_DIR, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            SEARCH_INDEX_DB.parent.mkdir(parents=True, exist_ok=True)
+            _index = TrigramIndex(WORK_DIR, SEARCH_INDEX_DB, SEARCH_INDEX_REFRESH_INTERVAL)
+        return _index
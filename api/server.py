@@ -21,7 +21,9 @@ import time
 import logging
 from github import Github, Auth
 from fastapi.openapi.utils import get_openapi
+from starlette.datastructures import MutableHeaders
 from api.config import logger, BASE_DIR, get_api_key
+from api.compression import CompressionMiddleware
 
 # Aseta FastAPI-sovellus oletusserveriksi localhost:8000.
 # NGROK_URL päivitetään myöhemmin OpenAPI-skeemassa.
@@ -32,14 +34,31 @@ app = FastAPI(
     servers=[{"url": "http://localhost:8000", "description": "Local server"}]
 )
 
-# Middleware: asetetaan custom Server-header
-@app.middleware("http")
-async def custom_server_header(request: Request, call_next):
-    response: Response = await call_next(request)
-    # Jos haluttu, voidaan myös tarkastella NGROK_URL:a tässäkin,
-    # mutta tässä käytetään sitä vain OpenAPI-skeemassa.
-    response.headers["Server"] = "FastAPI"
-    return response
+# Middleware: asetetaan custom Server-header.
+# Toteutettu puhtaana ASGI-middlewarena, koska BaseHTTPMiddleware (@app.middleware("http"))
+# kätkee asiakkaan yhteyden katkeamisen reitiltä, jolloin request.is_disconnected() ei toimi.
+class ServerHeaderMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_server_header(message):
+            if message["type"] == "http.response.start":
+                # Jos haluttu, voidaan myös tarkastella NGROK_URL:a tässäkin,
+                # mutta tässä käytetään sitä vain OpenAPI-skeemassa.
+                MutableHeaders(scope=message)["Server"] = "FastAPI"
+            await send(message)
+
+        await self.app(scope, receive, send_with_server_header)
+
+app.add_middleware(ServerHeaderMiddleware)
+
+# Vastaukset pakataan asiakkaan Accept-Encoding-otsakkeen mukaan (zstd, br tai gzip)
+app.add_middleware(CompressionMiddleware)
 
 # Mountataan static-tiedostojen hakemisto julkiseen käyttöön
 app.mount("/static", StaticFiles(directory=BASE_DIR / "tmp"), name="static")
@@ -57,6 +76,12 @@ from api.search_files_endpoint import router as search_files_router
 from api.file_metadata_endpoint import router as file_metadata_router
 from api.github_repo_endpoint import router as github_repo_router
 from api.files_endpoint import router as files_router  # ADDED
+from api.jobs_endpoint import router as jobs_router
+from api.sessions_endpoint import router as sessions_router
+from api.metrics_endpoint import router as metrics_router
+from api.find_path_endpoint import router as find_path_router
+from api.symbols_endpoint import router as symbols_router
+from api.relevant_files_endpoint import router as relevant_files_router
 
 # Lisätään routerit sovellukseen
 app.include_router(directories_router)
@@ -71,6 +96,12 @@ app.include_router(search_files_router)
 app.include_router(file_metadata_router)
 app.include_router(github_repo_router)
 app.include_router(files_router)  # ADDED
+app.include_router(jobs_router)
+app.include_router(sessions_router)
+app.include_router(metrics_router)
+app.include_router(find_path_router)
+app.include_router(symbols_router)
+app.include_router(relevant_files_router)
 
 # Perusreititys
 @app.get("/")
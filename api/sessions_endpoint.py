@@ -0,0 +1,263 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+from pathlib import Path
+from typing import Optional
+import asyncio
+import os
+import re
+import time
+import traceback
+from api.config import logger, WORK_DIR, get_api_key, SESSION_TTL, MAX_SESSIONS
+from api.run_command_endpoint import RunCommandRequest, run_command_chain
+from api.cancellation import run_until_disconnected
+
+router = APIRouter()
+
+SESSION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+ENV_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+ENV_REFERENCE_PATTERN = re.compile(r"\$(?:\{([A-Za-z_][A-Za-z0-9_]*)\}|([A-Za-z_][A-Za-z0-9_]*))")
+
+# Variables that would let a session run other programs than the whitelisted commands or
+# inject code into them. PATH and VIRTUAL_ENV are managed by source/deactivate only.
+BLOCKED_ENV_PREFIXES = ("LD_", "DYLD_", "GIT_CONFIG_")
+BLOCKED_ENV_NAMES = {
+    "PATH", "VIRTUAL_ENV", "BASH_ENV", "ENV", "PROMPT_COMMAND", "SHELL", "IFS",
+    "PAGER", "EDITOR", "VISUAL", "BROWSER", "MANPAGER", "LESSOPEN", "LESSCLOSE",
+    "GIT_PAGER", "GIT_EDITOR", "GIT_SEQUENCE_EDITOR", "GIT_SSH", "GIT_SSH_COMMAND", "GIT_EXTERNAL_DIFF",
+    "GIT_ASKPASS", "SSH_ASKPASS", "GIT_EXEC_PATH", "GIT_PROXY_COMMAND", "GIT_TEMPLATE_DIR", "GIT_CONFIG",
+    "PYTHONPATH", "PYTHONHOME", "PYTHONSTARTUP", "PYTHONUSERBASE", "PYTHONEXECUTABLE", "PYTHONBREAKPOINT",
+    "NODE_OPTIONS", "NODE_PATH", "PERL5LIB", "PERL5OPT", "PERLLIB", "RUBYOPT", "RUBYLIB"
+}
+
+class SessionRequest(BaseModel):
+    name: Optional[str] = None
+
+def _is_blocked_env(name: str) -> bool:
+    return name in BLOCKED_ENV_NAMES or name.startswith(BLOCKED_ENV_PREFIXES)
+
+class ShellSession:
+    """
+    A named, long-lived command context that keeps its working directory and environment
+    between calls. State changing commands (cd, export, unset, source <venv>/bin/activate,
+    deactivate) are handled by the session itself; everything else still goes through
+    the SAFE_COMMANDS checks of /run-command.
+    """
+
+    BUILTINS = {"cd", "export", "unset", "source", ".", "deactivate"}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cwd = Path(os.path.abspath(WORK_DIR))
+        self.env = {}
+        self.created = time.time()
+        self.last_used = self.created
+        self.lock = asyncio.Lock()
+
+    def venv_bin(self):
+        """
+        The bin directory of the activated virtualenv, or None. Only interpreters
+        (VENV_COMMANDS) are looked up there; every other command, and the PATH commands
+        get, is the server's own, so a whitelisted name never resolves to a program
+        written into WORK_DIR.
+        """
+        venv_dir = self.env.get("VIRTUAL_ENV")
+        if venv_dir is None or not (Path(venv_dir) / "pyvenv.cfg").is_file():
+            return None
+        return str(Path(venv_dir) / "bin")
+
+    def environment(self) -> dict:
+        env = dict(os.environ)
+        for name, value in self.env.items():
+            if value is None:
+                env.pop(name, None)
+            else:
+                env[name] = value
+        env["PWD"] = str(self.cwd)
+        return env
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "cwd": os.path.relpath(self.cwd, os.path.abspath(WORK_DIR)),
+            "env": {name: value for name, value in self.env.items() if value is not None},
+            "unset": sorted(name for name, value in self.env.items() if value is None),
+            "virtual_env": self.env.get("VIRTUAL_ENV"),
+            "created": self.created,
+            "last_used": self.last_used,
+            "expires_in": max(0, round(self.last_used + SESSION_TTL - time.time()))
+        }
+
+    def is_builtin(self, stages) -> bool:
+        return len(stages) == 1 and stages[0][0] in self.BUILTINS
+
+    def run_builtin(self, stages):
+        """Runs a session builtin and returns (exit_code, stdout, stderr) like a command would."""
+        name, args = stages[0][0], stages[0][1:]
+        logger.info(f"Session {self.name}: {name} {' '.join(args)}")
+        if name == "cd":
+            return self._cd(args)
+        if name == "export":
+            return self._export(args)
+        if name == "unset":
+            return self._unset(args)
+        if name == "deactivate":
+            return self._deactivate()
+        return self._source(name, args)
+
+    def _resolve(self, target: str):
+        """Resolves a path relative to the session cwd, or None if it points outside WORK_DIR."""
+        work_dir = os.path.realpath(WORK_DIR)
+        full_path = os.path.realpath(os.path.join(self.cwd, target))
+        if full_path == work_dir or full_path.startswith(work_dir + os.sep):
+            # Keep paths under WORK_DIR as configured so process_command_tokens accepts them
+            return Path(os.path.abspath(WORK_DIR)) / os.path.relpath(full_path, work_dir)
+        return None
+
+    def _cd(self, args):
+        if not args:
+            self.cwd = Path(os.path.abspath(WORK_DIR))
+            return 0, "", ""
+        target = self._resolve(args[0])
+        if target is None:
+            return 1, "", "cd: path traversal not allowed"
+        if not target.is_dir():
+            return 1, "", f"cd: {args[0]}: No such directory"
+        self.cwd = target
+        return 0, "", ""
+
+    def _expand(self, value: str) -> str:
+        env = self.environment()
+        return ENV_REFERENCE_PATTERN.sub(lambda m: env.get(m.group(1) or m.group(2), ""), value)
+
+    def _export(self, args):
+        if not args:
+            return 0, "\n".join(f"{name}={value}" for name, value in sorted(self.env.items()) if value is not None), ""
+        for arg in args:
+            name, has_value, value = arg.partition("=")
+            if not ENV_NAME_PATTERN.match(name):
+                return 1, "", f"export: '{arg}': not a valid identifier"
+            if _is_blocked_env(name):
+                return 1, "", f"export: {name} is not allowed"
+            if has_value:
+                self.env[name] = self._expand(value)
+        return 0, "", ""
+
+    def _unset(self, args):
+        for name in args:
+            if not ENV_NAME_PATTERN.match(name):
+                return 1, "", f"unset: '{name}': not a valid identifier"
+            if _is_blocked_env(name):
+                return 1, "", f"unset: {name} is not allowed"
+            self.env[name] = None
+        return 0, "", ""
+
+    def _source(self, name: str, args):
+        if len(args) != 1 or Path(args[0]).parts[-2:] != ("bin", "activate"):
+            return 1, "", f"{name}: only virtualenv activate scripts are supported"
+        script = self._resolve(args[0])
+        if script is None:
+            return 1, "", f"{name}: path traversal not allowed"
+        if not script.is_file():
+            return 1, "", f"{name}: {args[0]}: No such file"
+        # Only a real virtualenv (created by venv or virtualenv) has pyvenv.cfg
+        if not (script.parent.parent / "pyvenv.cfg").is_file():
+            return 1, "", f"{name}: {script.parent.parent.name} is not a virtualenv"
+        # venv_bin() makes its interpreters take precedence over the server's
+        self.env["VIRTUAL_ENV"] = str(script.parent.parent)
+        self.env["PYTHONHOME"] = None
+        return 0, "", ""
+
+    def _deactivate(self):
+        self.env.pop("VIRTUAL_ENV", None)
+        self.env.pop("PYTHONHOME", None)
+        return 0, "", ""
+
+class SessionManager:
+    """Keeps named sessions in memory and evicts the ones idle for longer than the TTL."""
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+
+    def evict_idle(self):
+        cutoff = time.time() - self.ttl
+        for name, session in list(self._sessions.items()):
+            if session.last_used < cutoff and not session.lock.locked():
+                logger.info(f"Evicting idle session: {name}")
+                del self._sessions[name]
+
+    def get(self, name: str):
+        self.evict_idle()
+        return self._sessions.get(name)
+
+    def get_or_create(self, name: str) -> ShellSession:
+        if not SESSION_NAME_PATTERN.match(name):
+            raise HTTPException(status_code=400, detail="Invalid session name.")
+        session = self.get(name)
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                raise HTTPException(status_code=429, detail="Too many sessions.")
+            session = ShellSession(name)
+            self._sessions[name] = session
+            logger.info(f"Created session: {name}")
+        session.last_used = time.time()
+        return session
+
+    def delete(self, name: str) -> bool:
+        return self._sessions.pop(name, None) is not None
+
+    def list(self):
+        self.evict_idle()
+        return list(self._sessions.values())
+
+session_manager = SessionManager(SESSION_TTL, MAX_SESSIONS)
+
+@router.post("/sessions", dependencies=[Depends(get_api_key)])
+def create_session(request: SessionRequest):
+    """Creates a named session, or returns the existing one with the same name."""
+    name = request.name or os.urandom(8).hex()
+    return session_manager.get_or_create(name).info()
+
+@router.get("/sessions", dependencies=[Depends(get_api_key)])
+def list_sessions():
+    return {"sessions": [session.info() for session in session_manager.list()]}
+
+@router.get("/sessions/{name}", dependencies=[Depends(get_api_key)])
+def get_session(name: str):
+    session = session_manager.get(name)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session.info()
+
+@router.post("/sessions/{name}/run-command", dependencies=[Depends(get_api_key)])
+async def run_session_command(name: str, request: RunCommandRequest, http_request: Request):
+    """
+    Runs a command chain inside a session, like /run-command but keeping the working directory
+    and environment between calls. The session is created on first use. Commands of one
+    session run one request at a time.
+    """
+    logger.info(f"Received session command request ({name}): {request.command}")
+    session = session_manager.get_or_create(name)
+    try:
+        async with session.lock:
+            result = await run_until_disconnected(
+                http_request, run_command_chain(request.command, session), "session_run_command"
+            )
+        session.last_used = time.time()
+        result["session"] = session.info()
+        return result
+    except HTTPException as he:
+        raise he
+    except asyncio.TimeoutError as te:
+        logger.error(f"Command timeout: {str(te)}")
+        raise HTTPException(status_code=504, detail="Command execution timed out.")
+    except Exception as e:
+        logger.error(f"Command execution failed: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail="Command execution failed.")
+
+@router.delete("/sessions/{name}", dependencies=[Depends(get_api_key)])
+def delete_session(name: str):
+    if not session_manager.delete(name):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": f"Session '{name}' deleted successfully"}
@@ -0,0 +1,259 @@
+import difflib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from api.config import logger, WORK_DIR, SNAPSHOT_DB, SNAPSHOT_HISTORY
+
+SCHEMA_VERSION = 2
+
+# Files whose content is stored per transaction by the background snapshotter
+SNAPSHOT_BATCH_SIZE = 200
+
+class SnapshotStore:
+    """
+    Remembers recent /for-chat-gpt versions in SQLite so that a client can ask what changed
+    since the version it has. A version is a manifest: the path, size and mtime of every file.
+    Recording one stores only that listing, so serving a page never reads more than the page.
+    A background thread then stores the content of files that changed since the previous
+    version (compressed, once per content hash); that content is only needed for diffs.
+    """
+
+    def __init__(self, root, db_path, history: int):
+        self.root = os.path.abspath(root)
+        self.history = history
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._pending = []
+        self._pending_lock = threading.Condition()
+        self._snapshotter = None
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS version_files")
+                self._conn.execute("DROP TABLE IF EXISTS versions")
+                self._conn.execute("DROP TABLE IF EXISTS blobs")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions (seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+                "root TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # digest is NULL until the content is stored, and stays NULL if the file changed first
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS version_files (
+                    version TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT,
+                    PRIMARY KEY (version, path)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS version_files_digest ON version_files (digest)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, content BLOB NOT NULL)")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _latest_files(self) -> dict:
+        row = self._conn.execute(
+            "SELECT id FROM versions WHERE root = ? ORDER BY seq DESC LIMIT 1", (self.root,)
+        ).fetchone()
+        if row is None:
+            return {}
+        return {
+            path: (size, mtime_ns, digest)
+            for path, size, mtime_ns, digest in self._conn.execute(
+                "SELECT path, size, mtime_ns, digest FROM version_files WHERE version = ?", (row[0],)
+            )
+        }
+
+    def _read(self, path: str, size: int, mtime_ns: int):
+        """Returns a file's content if it still has the given size and mtime, otherwise None."""
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                content = f.read()
+                st = os.fstat(f.fileno())
+        except OSError as e:
+            logger.warning(f"Could not snapshot {path}: {e}")
+            return None
+        if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+            return None
+        return content
+
+    def record(self, manifest) -> str:
+        """
+        Records a manifest as a version, if it is not recorded yet, and returns the version token.
+        Content hashes of files unchanged since the latest version are carried over; the others
+        are stored in the background.
+        """
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM versions WHERE id = ?", (manifest.id,)).fetchone():
+                return manifest.id
+            previous = self._latest_files()
+            rows = []
+            missing = False
+            for path, size, mtime_ns in manifest.entries:
+                known = previous.get(path)
+                digest = known[2] if known is not None and known[:2] == (size, mtime_ns) else None
+                missing = missing or digest is None
+                rows.append((manifest.id, path, size, mtime_ns, digest))
+            self._conn.execute(
+                "INSERT INTO versions (id, root, created) VALUES (?, ?, ?)", (manifest.id, self.root, time.time())
+            )
+            self._conn.executemany("INSERT INTO version_files VALUES (?, ?, ?, ?, ?)", rows)
+            self._prune()
+        if missing:
+            self._schedule(manifest.id)
+        return manifest.id
+
+    def _schedule(self, version: str):
+        with self._pending_lock:
+            self._pending.append(version)
+            if self._snapshotter is None:
+                self._snapshotter = threading.Thread(target=self._snapshot_loop, name="snapshots", daemon=True)
+                self._snapshotter.start()
+
+    def _snapshot_loop(self):
+        while True:
+            with self._pending_lock:
+                if not self._pending:
+                    self._snapshotter = None
+                    self._pending_lock.notify_all()
+                    return
+                version = self._pending[0]
+            try:
+                self._store_contents(version)
+            except Exception as e:
+                logger.error(f"Failed to store snapshot contents of {version}: {e}", exc_info=True)
+            with self._pending_lock:
+                self._pending.pop(0)
+
+    def _store_contents(self, version: str):
+        """Stores the content of the files of a version that have no digest yet."""
+        with self._lock:
+            missing = self._conn.execute(
+                "SELECT path, size, mtime_ns FROM version_files WHERE version = ? AND digest IS NULL", (version,)
+            ).fetchall()
+        for start in range(0, len(missing), SNAPSHOT_BATCH_SIZE):
+            updates = []
+            blobs = {}
+            for path, size, mtime_ns in missing[start:start + SNAPSHOT_BATCH_SIZE]:
+                content = self._read(path, size, mtime_ns)
+                if content is None:
+                    continue
+                digest = hashlib.sha1(content).hexdigest()
+                blobs[digest] = content
+                updates.append((digest, path, size, mtime_ns))
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO blobs (digest, content) VALUES (?, ?)",
+                    ((digest, zlib.compress(content)) for digest, content in blobs.items())
+                )
+                # Every version listing this exact file state gets the digest
+                self._conn.executemany(
+                    "UPDATE version_files SET digest = ? WHERE path = ? AND size = ? AND mtime_ns = ? AND digest IS NULL",
+                    updates
+                )
+
+    def flush(self, timeout=None):
+        """Waits until the background snapshotter has stored the content of every recorded version."""
+        with self._pending_lock:
+            self._pending_lock.wait_for(lambda: self._snapshotter is None, timeout)
+
+    def _prune(self):
+        expired = [
+            row[0] for row in self._conn.execute(
+                "SELECT id FROM versions ORDER BY seq DESC LIMIT -1 OFFSET ?", (self.history,)
+            )
+        ]
+        if not expired:
+            return
+        for version in expired:
+            self._conn.execute("DELETE FROM version_files WHERE version = ?", (version,))
+            self._conn.execute("DELETE FROM versions WHERE id = ?", (version,))
+        self._conn.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM version_files WHERE digest IS NOT NULL)")
+
+    def files(self, version: str):
+        """Returns {path: (size, mtime_ns, digest)} of a recorded version, or None if it is unknown or expired."""
+        with self._lock:
+            if not self._conn.execute(
+                "SELECT 1 FROM versions WHERE id = ? AND root = ?", (version, self.root)
+            ).fetchone():
+                return None
+            return {
+                path: (size, mtime_ns, digest)
+                for path, size, mtime_ns, digest in self._conn.execute(
+                    "SELECT path, size, mtime_ns, digest FROM version_files WHERE version = ?", (version,)
+                )
+            }
+
+    def content(self, digest: str):
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8", errors="ignore") if row else None
+
+    def _current_content(self, path: str, file_state) -> str:
+        """Content of a file of the newer version: stored if it is, otherwise read from disk."""
+        content = self.content(file_state[2]) if file_state[2] is not None else None
+        if content is None:
+            try:
+                with open(os.path.join(self.root, path), "r", encoding="utf-8", errors="ignore") as f:
+                    content = f.read()
+            except OSError:
+                content = ""
+        return content
+
+    def delta(self, since: str, version: str, unified_diff: bool = False, context_lines: int = 3):
+        """
+        Returns the changes from version `since` to `version`: added and modified files with
+        their content (or a unified diff for modified files) and deleted paths. A file is
+        modified when its size or mtime changed, unless both contents are stored and equal.
+        A diff needs the old content; if it was not stored before the file changed, the full
+        new content is returned instead. Returns None if `since` is unknown or expired.
+        """
+        old = self.files(since)
+        if old is None:
+            return None
+        new = self.files(version)
+        added = [{"path": path, "content": self._current_content(path, new[path])} for path in sorted(new.keys() - old.keys())]
+        modified = []
+        for path in sorted(new.keys() & old.keys()):
+            old_state, new_state = old[path], new[path]
+            if old_state[:2] == new_state[:2]:
+                continue
+            if old_state[2] is not None and old_state[2] == new_state[2]:
+                continue
+            content = self._current_content(path, new_state)
+            old_content = self.content(old_state[2]) if unified_diff and old_state[2] is not None else None
+            if old_content is not None:
+                diff = difflib.unified_diff(
+                    old_content.splitlines(keepends=True), content.splitlines(keepends=True),
+                    fromfile=f"a/{path}", tofile=f"b/{path}", n=context_lines
+                )
+                modified.append({"path": path, "diff": "".join(diff)})
+            else:
+                modified.append({"path": path, "content": content})
+        return {"added": added, "modified": modified, "deleted": sorted(old.keys() - new.keys())}
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_snapshot_store() -> SnapshotStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            SNAPSHOT_DB.parent.mkdir(parents=True, exist_ok=True)
+            _store = SnapshotStore(WORK_DIR, SNAPSHOT_DB, SNAPSHOT_HISTORY)
+        return _store
@@ -0,0 +1,238 @@
+import ast
+import hashlib
+import os
+import threading
+import time
+from api.config import logger, WORK_DIR, SYMBOL_INDEX_REFRESH_INTERVAL
+from api.tree_walker import walk_files
+from api.content_search import get_search_pool
+from api.workspace_changes import change_generation
+
+# Larger Python files (usually generated) are not parsed
+MAX_PARSED_BYTES = 2 * 1024 * 1024
+
+# Number of files sent to a worker process at a time
+PARSE_CHUNK_FILES = 32
+
+def _symbol(node, kind: str, qualname: str, parent):
+    start_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+    return {
+        "name": node.name,
+        "qualname": qualname,
+        "kind": kind,
+        "parent": parent,
+        "line": node.lineno,
+        "start_line": start_line,
+        "end_line": node.end_lineno
+    }
+
+def parse_symbols(source: bytes) -> list:
+    """
+    Returns the classes, functions and methods defined in Python source, in source order.
+    Nested definitions get dotted qualnames ("Class.method"). Invalid source has no symbols.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    symbols = []
+    pending = [(node, None, False) for node in reversed(tree.body)]
+    while pending:
+        node, parent, in_class = pending.pop()
+        if isinstance(node, ast.ClassDef):
+            kind = "class"
+        elif isinstance(node, ast.FunctionDef):
+            kind = "method" if in_class else "function"
+        elif isinstance(node, ast.AsyncFunctionDef):
+            kind = "async method" if in_class else "async function"
+        else:
+            # Definitions inside if/try/with blocks still belong to the enclosing scope
+            for field in ("body", "orelse", "finalbody", "handlers"):
+                pending.extend((child, parent, in_class) for child in reversed(getattr(node, field, [])))
+            continue
+        qualname = f"{parent}.{node.name}" if parent else node.name
+        symbols.append(_symbol(node, kind, qualname, parent))
+        pending.extend((child, qualname, kind == "class") for child in reversed(node.body))
+    return symbols
+
+def parse_sources(sources: list) -> list:
+    """Worker entry point: parses [(digest, source)] and returns [(digest, symbols)]."""
+    return [(digest, parse_symbols(source)) for digest, source in sources]
+
+def file_digest(source: bytes) -> str:
+    return hashlib.sha1(source).hexdigest()
+
+class SymbolIndex:
+    """
+    In-memory index of the Python definitions under a root. Files are re-read only when
+    their mtime or size changes, and parsed only when their content hash has not been seen
+    before, so renames, copies and touched files are not parsed again. Parsing runs on the
+    shared worker pool.
+    """
+
+    def __init__(self, root, refresh_interval: float):
+        self.root = os.path.abspath(root)
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0.0
+        self.refreshed_generation = None
+        self._files = {}
+        self._symbols = {}
+        self._by_name = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+
+    def _stat(self, path: str):
+        try:
+            st = os.stat(os.path.join(self.root, path))
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self, path: str):
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                return f.read(MAX_PARSED_BYTES + 1)
+        except OSError as e:
+            logger.warning(f"Could not read {path} for the symbol index: {e}")
+            return None
+
+    def _parse_new(self, sources: dict, parallel: bool) -> dict:
+        """Parses {digest: source} and returns {digest: symbols}."""
+        items = list(sources.items())
+        if not parallel or len(items) <= 1:
+            return dict(parse_sources(items))
+        chunks = [items[start:start + PARSE_CHUNK_FILES] for start in range(0, len(items), PARSE_CHUNK_FILES)]
+        parsed = {}
+        for results in get_search_pool().map(parse_sources, chunks):
+            parsed.update(results)
+        return parsed
+
+    def _update(self, changed: dict, removed, parallel: bool = True):
+        """Reads changed {path: (mtime_ns, size)} files, parses unseen content and swaps the tables in."""
+        entries = {}
+        unseen = {}
+        for path, file_stat in changed.items():
+            source = self._read(path)
+            if source is None:
+                continue
+            if len(source) > MAX_PARSED_BYTES:
+                source = b""
+            digest = file_digest(source)
+            entries[path] = (file_stat, digest)
+            if digest not in self._symbols:
+                unseen[digest] = source
+        parsed = self._parse_new(unseen, parallel)
+        with self._lock:
+            files = dict(self._files)
+            for path in removed:
+                files.pop(path, None)
+            files.update(entries)
+            symbols = {**self._symbols, **parsed}
+            # Content no file has anymore is forgotten
+            used = {digest for _, digest in files.values()}
+            symbols = {digest: value for digest, value in symbols.items() if digest in used}
+            by_name = {}
+            for path, (_, digest) in sorted(files.items()):
+                for symbol in symbols[digest]:
+                    by_name.setdefault(symbol["name"], []).append((path, symbol))
+            self._files, self._symbols, self._by_name = files, symbols, by_name
+        return len(entries), len(parsed)
+
+    def refresh(self):
+        """Brings the index up to date with the Python files on disk."""
+        with self._refresh_lock:
+            started = time.time()
+            generation = change_generation()
+            on_disk = {}
+            for full_path in walk_files(self.root):
+                if full_path.endswith(".py"):
+                    path = os.path.relpath(full_path, self.root)
+                    file_stat = self._stat(path)
+                    if file_stat is not None:
+                        on_disk[path] = file_stat
+            with self._lock:
+                indexed = {path: file_stat for path, (file_stat, _) in self._files.items()}
+            changed = {path: file_stat for path, file_stat in on_disk.items() if indexed.get(path) != file_stat}
+            removed = [path for path in indexed if path not in on_disk]
+            if changed or removed:
+                read, parsed = self._update(changed, removed)
+                logger.info(
+                    f"Symbol index refreshed: {read} files read, {parsed} parsed, {len(removed)} removed "
+                    f"in {time.time() - started:.2f}s"
+                )
+            self.last_refresh = time.time()
+            self.refreshed_generation = generation
+
+    def is_stale(self) -> bool:
+        """True when the refresh interval has passed or the workspace was marked changed since the last refresh."""
+        return (
+            time.time() - self.last_refresh >= self.refresh_interval
+            or self.refreshed_generation != change_generation()
+        )
+
+    def refresh_if_stale(self):
+        if self.is_stale():
+            with self._refresh_lock:
+                # Another thread may have refreshed the index while this one waited
+                if self.is_stale():
+                    self.refresh()
+
+    def refresh_file(self, path: str):
+        """Re-indexes one file if it changed since the last refresh, without walking the tree."""
+        with self._refresh_lock:
+            file_stat = self._stat(path)
+            with self._lock:
+                entry = self._files.get(path)
+            if file_stat is None:
+                if entry is not None:
+                    self._update({}, [path], parallel=False)
+            elif entry is None or entry[0] != file_stat:
+                self._update({path: file_stat}, [], parallel=False)
+
+    def definitions(self, name: str, kind=None) -> list:
+        """
+        Returns [(path, symbol)] for definitions whose name or qualname equals `name`
+        ("parse" or "Parser.parse"), optionally limited to one kind.
+        """
+        with self._lock:
+            candidates = self._by_name.get(name.rsplit(".", 1)[-1], [])
+        return [
+            (path, symbol) for path, symbol in candidates
+            if (symbol["name"] == name or symbol["qualname"] == name) and (kind is None or symbol["kind"] == kind)
+        ]
+
+    def outline(self, path: str):
+        """Returns the symbols of one file in source order, or None if it is not an indexed Python file."""
+        with self._lock:
+            entry = self._files.get(path)
+            return None if entry is None else list(self._symbols[entry[1]])
+
+    def source(self, path: str, qualname: str):
+        """
+        Returns (symbol, source lines) of one definition, decorators included, or None if the
+        file has no such definition. The file is read once and its symbols are taken from the
+        same content, so line numbers cannot be stale.
+        """
+        source = self._read(path)
+        if source is None:
+            return None
+        digest = file_digest(source)
+        with self._lock:
+            symbols = self._symbols.get(digest)
+        if symbols is None:
+            symbols = parse_symbols(source)
+        for symbol in symbols:
+            if symbol["qualname"] == qualname:
+                lines = source.decode("utf-8", errors="replace").splitlines()
+                return symbol, lines[symbol["start_line"] - 1:symbol["end_line"]]
+        return None
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_symbol_index() -> SymbolIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SymbolIndex(WORK_DIR, SYMBOL_INDEX_REFRESH_INTERVAL)
+        return _index
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+import asyncio
+import os
+from api.config import logger, get_api_key
+from api.symbol_index import get_symbol_index
+
+router = APIRouter()
+
+SYMBOL_KINDS = ("class", "function", "method", "async function", "async method")
+
+def _python_path(path: str) -> str:
+    """Normalizes a relative path to a Python file under WORK_DIR."""
+    normalized = os.path.normpath(path)
+    if os.path.isabs(normalized) or normalized == ".." or normalized.startswith(".." + os.sep):
+        raise HTTPException(status_code=400, detail="Path must be relative to the work directory")
+    if not normalized.endswith(".py"):
+        raise HTTPException(status_code=400, detail="Only Python files are indexed")
+    return normalized
+
+@router.get("/symbols/definitions", dependencies=[Depends(get_api_key)])
+async def find_definitions(
+    name: str = Query(..., description="Symbol name or qualname, e.g. 'parse' or 'Parser.parse'"),
+    kind: Optional[str] = Query(None, description="One of: " + ", ".join(SYMBOL_KINDS))
+):
+    """Go to definition: where classes, functions and methods with the given name are defined."""
+    if kind is not None and kind not in SYMBOL_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
+    index = get_symbol_index()
+    try:
+        await asyncio.to_thread(index.refresh_if_stale)
+    except Exception as e:
+        logger.error(f"Symbol index refresh failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Symbol index refresh failed: {str(e)}")
+    definitions = index.definitions(name, kind)
+    return {
+        "name": name,
+        "definitions": [{"path": path, **symbol} for path, symbol in definitions]
+    }
+
+@router.get("/symbols/outline/{path:path}", dependencies=[Depends(get_api_key)])
+async def file_outline(path: str):
+    """Lists the classes, functions and methods of one Python file with their line ranges."""
+    path = _python_path(path)
+    index = get_symbol_index()
+    await asyncio.to_thread(index.refresh_file, path)
+    symbols = index.outline(path)
+    if symbols is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"path": path, "symbols": symbols}
+
+@router.get("/symbols/source/{path:path}", dependencies=[Depends(get_api_key)])
+async def symbol_source(path: str, name: str = Query(..., description="Qualname, e.g. 'Parser.parse'")):
+    """Returns the source of one class or function, decorators included, instead of the whole file."""
+    path = _python_path(path)
+    index = get_symbol_index()
+    result = await asyncio.to_thread(index.source, path, name)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Symbol '{name}' not found in {path}")
+    symbol, lines = result
+    return {"path": path, **symbol, "source": "\n".join(lines) + "\n"}
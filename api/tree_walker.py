@@ -0,0 +1,221 @@
+import functools
+import os
+import re
+import threading
+from api.config import logger, IGNORE_PATTERNS
+
+# Ignore files read in every directory; rules of later files take precedence
+IGNORE_FILES = (".gitignore", ".ignore")
+
+def translate_pattern(pattern: str) -> str:
+    """Translates one gitignore pattern (without "!" and trailing "/") to a regular expression."""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i) and i + 2 == len(pattern) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body + "]")
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    # Patterns without a slash match at any depth below the ignore file
+    prefix = "" if anchored else "(?:.*/)?"
+    return prefix + "".join(parts)
+
+class IgnoreRules:
+    """Compiled rules of one directory's ignore files, matched against paths relative to `base`."""
+
+    def __init__(self, base: str, lines):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate or line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            try:
+                self.rules.append((re.compile(translate_pattern(line) + "$"), negate, dir_only))
+            except re.error:
+                logger.warning(f"Ignoring invalid ignore pattern in {base}: {line}")
+        self.has_negations = any(negate for _, negate, _ in self.rules)
+        # Without negations the last-match-wins rule reduces to "any rule matches"
+        self._file_regex = self._combine(rule for rule in self.rules if not rule[2])
+        self._dir_regex = self._combine(self.rules)
+
+    @staticmethod
+    def _combine(rules):
+        patterns = [regex.pattern for regex, _, _ in rules]
+        return re.compile("|".join(f"(?:{pattern})" for pattern in patterns)) if patterns else None
+
+    def match(self, relative_path: str, is_dir: bool):
+        """Returns True (ignored), False (re-included with "!") or None when no rule matches."""
+        if not self.has_negations:
+            regex = self._dir_regex if is_dir else self._file_regex
+            return True if regex is not None and regex.match(relative_path) else None
+        for regex, negate, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                return not negate
+        return None
+
+class IgnoreMatcher:
+    """The ignore rules in effect in one directory: its own rules on top of its ancestors'."""
+
+    def __init__(self, rule_sets=()):
+        self.rule_sets = tuple(rule_sets)
+
+    def extend(self, rules):
+        return IgnoreMatcher(self.rule_sets + (rules,)) if rules is not None and rules.rules else self
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        for rules in reversed(self.rule_sets):
+            if path.startswith(rules.base + os.sep):
+                relative_path = path[len(rules.base) + 1:]
+            else:
+                relative_path = os.path.relpath(path, rules.base)
+            if os.sep != "/":
+                relative_path = relative_path.replace(os.sep, "/")
+            result = rules.match(relative_path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+_rules_cache = {}
+_rules_cache_lock = threading.Lock()
+
+def load_ignore_rules(directory: str, ignore_files):
+    """
+    Returns the compiled rules of a directory's ignore files, or None if it has none.
+    `ignore_files` maps ignore file names present in the directory to their stat results.
+    Compiled rules are cached per directory until one of its ignore files changes.
+    """
+    if not ignore_files:
+        return None
+    signature = tuple(
+        (name, ignore_files[name].st_mtime_ns, ignore_files[name].st_size)
+        for name in IGNORE_FILES if name in ignore_files
+    )
+    with _rules_cache_lock:
+        cached = _rules_cache.get(directory)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    lines = []
+    for name, _, _ in signature:
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8", errors="ignore") as f:
+                lines.extend(f.readlines())
+        except OSError as e:
+            logger.warning(f"Could not read ignore file {os.path.join(directory, name)}: {e}")
+    rules = IgnoreRules(directory, lines)
+    with _rules_cache_lock:
+        _rules_cache[directory] = (signature, rules)
+    return rules
+
+def root_matcher(root) -> IgnoreMatcher:
+    """Returns the matcher for the root of a walk: the configured global ignore patterns."""
+    return _root_matcher(os.path.abspath(root))
+
+@functools.lru_cache(maxsize=16)
+def _root_matcher(root: str) -> IgnoreMatcher:
+    return IgnoreMatcher().extend(IgnoreRules(root, IGNORE_PATTERNS))
+
+def scan_directory(path: str, matcher: IgnoreMatcher, include_ignored: bool = False, follow_symlinks: bool = False):
+    """
+    Lists one directory with a single os.scandir call and applies its ignore files.
+    Returns (files, directories, matcher) with full paths; the returned matcher is the one
+    to pass when scanning the subdirectories. Symlinked directories are only listed with
+    follow_symlinks, so walks cannot loop.
+    """
+    entries = []
+    ignore_files = {}
+    try:
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+                    if not is_dir and not entry.is_file():
+                        continue
+                    if entry.name in IGNORE_FILES and not is_dir:
+                        ignore_files[entry.name] = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, is_dir))
+    except OSError as e:
+        logger.warning(f"Could not read directory {path}: {e}")
+        return [], [], matcher
+    matcher = matcher.extend(load_ignore_rules(path, ignore_files))
+    files, directories = [], []
+    for entry_path, is_dir in entries:
+        if not include_ignored and matcher.is_ignored(entry_path, is_dir):
+            continue
+        (directories if is_dir else files).append(entry_path)
+    return sorted(files), sorted(directories), matcher
+
+def parent_matcher(root, directory) -> IgnoreMatcher:
+    """
+    Builds the matcher to pass to scan_directory for `directory`: the global patterns plus
+    the ignore files of every ancestor from root down to the directory's parent.
+    """
+    root = os.path.abspath(root)
+    matcher = root_matcher(root)
+    relative = os.path.relpath(os.path.abspath(directory), root)
+    if relative == "." or relative.startswith(".."):
+        return matcher
+    current = root
+    for part in [None] + relative.split(os.sep)[:-1]:
+        if part is not None:
+            current = os.path.join(current, part)
+        ignore_files = {}
+        for name in IGNORE_FILES:
+            try:
+                ignore_files[name] = os.stat(os.path.join(current, name))
+            except OSError:
+                continue
+        matcher = matcher.extend(load_ignore_rules(current, ignore_files))
+    return matcher
+
+def walk_files(root, include_ignored: bool = False):
+    """
+    Yields the full paths of the files under root that are not ignored, depth first.
+    Ignored directories are pruned, so nothing inside them is listed or stat'ed.
+    """
+    pending = [(os.path.abspath(root), root_matcher(root))]
+    while pending:
+        directory, matcher = pending.pop()
+        files, directories, matcher = scan_directory(directory, matcher, include_ignored)
+        yield from files
+        pending.extend((subdirectory, matcher) for subdirectory in reversed(directories))
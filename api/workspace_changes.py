@@ -0,0 +1,18 @@
+import threading
+
+_generation = 0
+_lock = threading.Lock()
+
+def mark_changed():
+    """
+    Records that files under WORK_DIR may have changed: called after the API writes, moves or
+    deletes files and after every command exits. Indexes compare change_generation() with the
+    value they last refreshed at, so the next query after a change sees it without waiting
+    for their refresh interval.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+
+def change_generation() -> int:
+    return _generation
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from api.config import logger, WORK_DIR, MANIFEST_REFRESH_INTERVAL
+from api.tree_walker import walk_files
+from api.binary_detection import is_binary_file
+from api.workspace_changes import change_generation
+
+# File types included in /for-chat-gpt snapshots
+TEXT_EXTENSIONS = (".py", ".txt", ".md", ".yaml", ".sh")
+
+# Number of past manifests kept so that cursors into them stay valid
+MAX_MANIFESTS = 32
+
+class Manifest:
+    """
+    Immutable list of the text files of a tree at one moment: sorted (path, size, mtime_ns)
+    entries. The id is derived from the entries, so it changes whenever a file is added,
+    removed or modified, and stays the same while nothing changes.
+    """
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        digest = hashlib.sha1()
+        for path, size, mtime_ns in entries:
+            digest.update(f"{path}\0{size}\0{mtime_ns}\n".encode("utf-8", errors="surrogateescape"))
+        self.id = digest.hexdigest()[:20]
+        self.total_size = sum(size for _, size, _ in entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+class ManifestStore:
+    """Builds manifests of a root, reusing the latest for a short while, and remembers recent ones by id."""
+
+    def __init__(self, root, refresh_interval: float, max_manifests: int = MAX_MANIFESTS):
+        self.root = os.path.abspath(root)
+        self.refresh_interval = refresh_interval
+        self.max_manifests = max_manifests
+        self._manifests = OrderedDict()
+        self._current = None
+        self._built_at = 0.0
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> list:
+        entries = []
+        # Ignored paths (.gitignore, .ignore and IGNORE_PATTERNS) are skipped by the walker
+        for full_path in walk_files(self.root):
+            if not full_path.endswith(TEXT_EXTENSIONS):
+                continue
+            try:
+                st = os.stat(full_path)
+                if is_binary_file(full_path, st):
+                    logger.debug(f"Skipping binary file: {full_path}")
+                    continue
+            except OSError as e:
+                logger.warning(f"Skipping file due to error: {full_path}. Error: {e}")
+                continue
+            entries.append((os.path.relpath(full_path, self.root), st.st_size, st.st_mtime_ns))
+        entries.sort()
+        return entries
+
+    def current(self) -> Manifest:
+        """
+        Returns a manifest of the tree as it is now: at most refresh_interval seconds old, and
+        rebuilt at once after the workspace is marked changed.
+        """
+        with self._lock:
+            if (
+                self._current is not None
+                and time.time() - self._built_at < self.refresh_interval
+                and self._generation == change_generation()
+            ):
+                return self._current
+            generation = change_generation()
+            manifest = Manifest(self._scan())
+            # An unchanged tree keeps the manifest it had, so its cursors and ETags stay valid
+            manifest = self._manifests.get(manifest.id, manifest)
+            self._manifests[manifest.id] = manifest
+            self._manifests.move_to_end(manifest.id)
+            while len(self._manifests) > self.max_manifests:
+                self._manifests.popitem(last=False)
+            self._current, self._built_at, self._generation = manifest, time.time(), generation
+            return manifest
+
+    def get(self, manifest_id: str):
+        """Returns a recent manifest by id, or None if it has been forgotten."""
+        with self._lock:
+            return self._manifests.get(manifest_id)
+
+def encode_cursor(manifest_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{manifest_id}:{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Returns (manifest id, offset) from a cursor, or raises ValueError."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        manifest_id, offset = data.split(":")
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return manifest_id, offset
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_manifest_store() -> ManifestStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ManifestStore(WORK_DIR, MANIFEST_REFRESH_INTERVAL)
+        return _store
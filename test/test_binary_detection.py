@@ -0,0 +1,54 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.binary_detection import looks_binary, BinaryFileCache
+from api.search_index import get_search_index
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_looks_binary():
+    assert not looks_binary(b"")
+    assert not looks_binary("plain text, ääkköset\n".encode("utf-8"))
+    # A multi-byte character cut at the end of the sniffed block is still text
+    assert not looks_binary("ä".encode("utf-8")[:1].rjust(10, b"a"))
+    assert not looks_binary("latin-1 text: \xe4".encode("latin-1"))
+    assert looks_binary(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR")
+    assert looks_binary(bytes(range(1, 32)) * 4 + b"\xff")
+
+def test_binary_cache_is_invalidated_by_changes(tmp_path):
+    cache = BinaryFileCache(max_entries=1)
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"text")
+    assert cache.is_binary(path) is False
+    path.write_bytes(b"\x00\x01\x02 longer")
+    assert cache.is_binary(path) is True
+
+    other = tmp_path / "other.txt"
+    other.write_text("text")
+    assert cache.is_binary(other) is False
+    assert list(cache._entries) == [str(other)]
+
+def test_content_endpoints_skip_binary_files(monkeypatch):
+    monkeypatch.setattr(get_search_index(), "refresh_interval", 0)
+    path = os.path.join(WORK_DIR, "binary_test_file.dat")
+    with open(path, "wb") as f:
+        f.write(b"binarymarker\x00\x01\x02\x03")
+    try:
+        response = client.get("/files/binary_test_file.dat", headers=HEADERS)
+        assert response.status_code == 415
+        response = client.post("/search-files", json={"query": "binarymarker"}, headers=HEADERS)
+        assert "binary_test_file.dat" not in response.json()["matches"]
+        response = client.post("/search-files/lines", json={"pattern": "binarymarker"}, headers=HEADERS)
+        assert response.json()["matches"] == []
+    finally:
+        os.remove(path)
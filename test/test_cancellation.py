@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from api.cancellation import run_until_disconnected
+from api import metrics
+
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+def test_run_until_disconnected_cancels_work():
+    cancelled = []
+
+    async def slow_work():
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    before = metrics.snapshot().get("cancelled_on_disconnect.test", 0)
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(run_until_disconnected(DisconnectedRequest(), slow_work(), "test"))
+    assert excinfo.value.status_code == 499
+    assert cancelled == [True]
+    assert metrics.snapshot()["cancelled_on_disconnect.test"] == before + 1
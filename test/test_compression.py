@@ -0,0 +1,145 @@
+import gzip
+import os
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.compression import (
+    CompressionMiddleware, EncodedBodyCache, StreamEncoder, compress, decode_if_none_match, encoded_etag, negotiate
+)
+from api.workspace_manifest import get_manifest_store
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+BODY = "line of text\n" * 1000
+
+cache = EncodedBodyCache(1024 * 1024)
+test_app = FastAPI()
+test_app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+
+@test_app.get("/text")
+def text():
+    return PlainTextResponse(BODY)
+
+@test_app.get("/small")
+def small():
+    return PlainTextResponse("short")
+
+@test_app.get("/image")
+def image():
+    return Response(b"\x89PNG" + b"\0" * 5000, media_type="image/png")
+
+@test_app.get("/cached")
+def cached():
+    return PlainTextResponse(BODY, headers={"ETag": '"v1"'})
+
+@test_app.get("/for-etag")
+def for_etag(request: Request):
+    if request.headers.get("if-none-match") == '"v1"':
+        return Response(status_code=304, headers={"ETag": '"v1"'})
+    return PlainTextResponse(BODY, headers={"ETag": '"v1"'})
+
+@test_app.get("/stream")
+def stream():
+    return StreamingResponse(iter([BODY, BODY]), media_type="text/plain")
+
+@test_app.get("/ndjson")
+def ndjson():
+    return StreamingResponse(iter(['{"a": 1}\n' * 100]), media_type="application/x-ndjson")
+
+test_client = TestClient(test_app)
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def get(path, accept_encoding="gzip"):
+    return test_client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+def test_negotiate():
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, identity") is None
+    assert negotiate("") is None
+    assert negotiate("*") is not None
+
+def test_compresses_by_type_and_size():
+    response = get("/text")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.text == BODY
+    assert int(response.headers["Content-Length"]) < len(BODY)
+
+    assert "Content-Encoding" not in get("/text", "identity").headers
+    assert "Content-Encoding" not in get("/small").headers
+    assert "Content-Encoding" not in get("/image").headers
+
+def test_streams_are_compressed_except_ndjson():
+    response = get("/stream")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.text == BODY * 2
+    response = get("/ndjson")
+    assert "Content-Encoding" not in response.headers
+    assert response.text == '{"a": 1}\n' * 100
+
+def test_bodies_with_etag_are_cached():
+    assert get("/cached").text == BODY
+    encoded = cache.get("/cached", '"v1"', "gzip")
+    assert gzip.decompress(encoded) == BODY.encode()
+
+@pytest.mark.parametrize("encoding, module", [("gzip", "gzip"), ("br", "brotli"), ("zstd", "zstandard")])
+def test_each_encoding_round_trips(encoding, module):
+    library = pytest.importorskip(module)
+    assert negotiate(f"{encoding}, identity;q=0.5") == encoding
+    encoded = compress(BODY.encode(), encoding, 6)
+    if encoding == "zstd":
+        decoded = library.ZstdDecompressor().decompress(encoded)
+    else:
+        decoded = library.decompress(encoded)
+    assert decoded == BODY.encode()
+
+    streamed = StreamEncoder(encoding, 6)
+    chunks = streamed.compress(BODY.encode(), final=False) + streamed.compress(BODY.encode(), final=True)
+    if encoding == "zstd":
+        decoded = library.ZstdDecompressor().decompressobj().decompress(chunks)
+    else:
+        decoded = library.decompress(chunks)
+    assert decoded == BODY.encode() * 2
+
+    response = get("/cached", encoding)
+    assert response.headers["Content-Encoding"] == encoding
+    assert response.headers["ETag"] == f'"v1-{encoding}"'
+
+def test_etag_is_specific_to_the_encoding():
+    compressed = get("/cached")
+    assert compressed.headers["ETag"] == '"v1-gzip"'
+    assert get("/cached", "identity").headers["ETag"] == '"v1"'
+    assert encoded_etag('W/"v1"', "br") == 'W/"v1-br"'
+
+    revalidated = test_client.get("/for-etag", headers={"Accept-Encoding": "gzip", "If-None-Match": '"v1-gzip"'})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == '"v1-gzip"'
+    # The identity body has a different ETag, so it is not revalidated with the gzip one
+    identity = test_client.get("/for-etag", headers={"Accept-Encoding": "identity", "If-None-Match": '"v1-gzip"'})
+    assert identity.status_code == 200
+    assert decode_if_none_match('"a-gzip", "b"', "gzip") == ('"a", "b"', {'"a"'})
+
+def test_for_chat_gpt_uses_negotiated_encoding(monkeypatch):
+    path = WORK_DIR / "compression_test_file.txt"
+    path.write_text(BODY)
+    monkeypatch.setattr(get_manifest_store(), "refresh_interval", 0)
+    try:
+        response = client.get("/for-chat-gpt", headers={**HEADERS, "Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Content-Type"] == "application/json"
+        response = client.get("/for-chat-gpt", headers={**HEADERS, "Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "compression_test_file.txt" in [file["path"] for file in response.json()["files"]]
+    finally:
+        path.unlink()
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.files_endpoint import SendfileResponse
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def data_file():
+    path = WORK_DIR / "download_test.bin"
+    path.write_bytes(b"\x00\x01binary payload\xff")
+    yield path
+    path.unlink()
+
+def test_raw_download_and_conditional_get(data_file):
+    response = client.get("/files-raw/download_test.bin", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.content == b"\x00\x01binary payload\xff"
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response = client.get("/files-raw/download_test.bin", headers={**HEADERS, "If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.get("/files-raw/download_test.bin", headers={**HEADERS, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    data_file.write_bytes(b"changed content")
+    response = client.get("/files-raw/download_test.bin", headers={**HEADERS, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content == b"changed content"
+
+    response = client.get("/files-raw/download_test.bin", headers={**HEADERS, "Range": "bytes=0-6"})
+    assert response.status_code == 206
+    assert response.content == b"changed"
+
+    assert client.get("/files-raw/missing_download.bin", headers=HEADERS).status_code == 404
+
+def test_file_named_raw_is_readable():
+    directory = WORK_DIR / "download_test_dir"
+    directory.mkdir(exist_ok=True)
+    (directory / "raw").write_text("not a download\n")
+    try:
+        response = client.get("/files/download_test_dir/raw", headers=HEADERS)
+        assert response.status_code == 200
+        assert response.json() == "not a download\n"
+        response = client.get("/files-raw/download_test_dir/raw", headers=HEADERS)
+        assert response.content == b"not a download\n"
+    finally:
+        (directory / "raw").unlink()
+        directory.rmdir()
+
+def test_sendfile_response_uses_pathsend(data_file):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http", "method": "GET", "headers": [],
+        "extensions": {"http.response.pathsend": {}}
+    }
+    response = SendfileResponse(data_file, stat_result=os.stat(data_file))
+    asyncio.run(response(scope, receive, send))
+    assert [message["type"] for message in messages] == ["http.response.start", "http.response.pathsend"]
+    assert messages[1]["path"] == str(data_file)
@@ -0,0 +1,63 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def batch_files():
+    paths = [WORK_DIR / name for name in ("batch_a.txt", "batch_b.txt", "batch_new.txt")]
+    paths[0].write_text("a1\na2\na3\n")
+    paths[1].write_text("b\n")
+    yield paths
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+def test_batch_runs_operations_in_order_per_path(batch_files):
+    response = client.post("/files/batch", json={"operations": [
+        {"op": "read", "path": "batch_a.txt", "tail": 1},
+        {"op": "write", "path": "batch_new.txt", "content": "new\n"},
+        {"op": "append", "path": "batch_new.txt", "content": "more\n"},
+        {"op": "read", "path": "batch_new.txt"},
+        {"op": "delete", "path": "batch_b.txt"},
+        {"op": "read", "path": "batch_missing.txt"},
+        {"op": "write", "path": "batch_a.txt"}
+    ]}, headers=HEADERS)
+    assert response.status_code == 200
+    body = response.json()
+    results = body["results"]
+    assert results[0]["result"]["content"] == "a3\n"
+    assert results[3]["result"] == "new\nmore\n"
+    assert results[4]["status"] == 200
+    assert results[5]["status"] == 404
+    assert results[6]["status"] == 400
+    assert (body["succeeded"], body["failed"], body["rolled_back"]) == (5, 2, False)
+    assert not batch_files[1].exists()
+
+def test_atomic_batch_restores_files_on_failure(batch_files):
+    response = client.post("/files/batch", json={"atomic": True, "operations": [
+        {"op": "write", "path": "batch_a.txt", "content": "overwritten"},
+        {"op": "append", "path": "batch_b.txt", "content": "appended\n"},
+        {"op": "write", "path": "batch_new.txt", "content": "created"},
+        {"op": "delete", "path": "batch_missing.txt"}
+    ]}, headers=HEADERS)
+    body = response.json()
+    assert body["rolled_back"] is True
+    assert body["failed"] == 1
+    assert batch_files[0].read_text() == "a1\na2\na3\n"
+    assert batch_files[1].read_text() == "b\n"
+    assert not batch_files[2].exists()
+
+def test_batch_requires_operations():
+    response = client.post("/files/batch", json={"operations": []}, headers=HEADERS)
+    assert response.status_code == 422
@@ -0,0 +1,63 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.find_path_endpoint import PathIndex, fuzzy_score
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def write(path, content=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+def test_fuzzy_score_prefers_file_name_and_boundaries():
+    query = "srchep"
+    assert fuzzy_score("api/readme.txt", "api/readme.txt", query) is None
+    in_name = fuzzy_score("api/search_files_endpoint.py", "api/search_files_endpoint.py", query)
+    in_directories = fuzzy_score("search/endpoint/x.py", "search/endpoint/x.py", query)
+    assert in_name > in_directories
+
+def test_path_index_ranks_and_refreshes(tmp_path):
+    write(tmp_path / "api" / "search_files_endpoint.py")
+    write(tmp_path / "api" / "files_endpoint.py")
+    write(tmp_path / "search" / "help" / "notes.txt")
+    write(tmp_path / "node_modules" / "search_files_endpoint.py")
+    index = PathIndex(tmp_path, refresh_interval=60)
+    index.refresh()
+
+    total, results = index.find("srchep", 10)
+    paths = [path for path, _ in results]
+    assert paths[0] == os.path.join("api", "search_files_endpoint.py")
+    assert total == len(paths)
+    assert not any(path.startswith("node_modules") for path in paths)
+
+    total, results = index.find("help", 10)
+    assert os.path.join("search", "help") + "/" in [path for path, _ in results]
+
+    write(tmp_path / "api" / "new_module.py")
+    index.refresh()
+    assert index.find("newmod", 10)[1][0][0] == os.path.join("api", "new_module.py")
+
+    os.remove(tmp_path / "api" / "new_module.py")
+    index.refresh()
+    assert index.find("newmod", 10) == (0, [])
+
+def test_find_path_endpoint():
+    response = client.get("/find-path", params={"query": "svr", "limit": 5}, headers=HEADERS)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["query"] == "svr"
+    assert len(data["results"]) <= 5
+    assert all({"path", "score"} <= set(result) for result in data["results"])
+
+    response = client.get("/find-path", params={"query": "  "}, headers=HEADERS)
+    assert response.status_code == 400
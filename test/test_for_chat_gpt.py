@@ -0,0 +1,177 @@
+import os
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.workspace_manifest import ManifestStore, encode_cursor, decode_cursor, get_manifest_store
+from api.context_packing import estimate_tokens, rank_entries, pack_files
+from api.search_index import get_search_index
+from api.snapshot_store import SnapshotStore, get_snapshot_store
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_manifest_id_follows_changes(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.md").write_text("# b\n")
+    (tmp_path / "blob.txt").write_bytes(b"\x00\x01\x02")
+    store = ManifestStore(tmp_path, refresh_interval=0)
+
+    first = store.current()
+    assert [path for path, _, _ in first.entries] == ["a.py", "b.md"]
+    assert store.current() is first
+
+    (tmp_path / "c.txt").write_text("c\n")
+    second = store.current()
+    assert second.id != first.id
+    assert store.get(first.id) is first
+
+    assert decode_cursor(encode_cursor(second.id, 50)) == (second.id, 50)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+def test_cursor_pages_stay_stable(monkeypatch):
+    directory = WORK_DIR / "for_chat_gpt_test"
+    directory.mkdir(exist_ok=True)
+    for i in range(3):
+        (directory / f"file{i}.txt").write_text(f"content {i}\n")
+    monkeypatch.setattr(get_manifest_store(), "refresh_interval", 0)
+    try:
+        response = client.get("/for-chat-gpt", params={"page_size": 1}, headers=HEADERS)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["files"]) == 1
+        etag = response.headers["ETag"]
+        assert client.get(
+            "/for-chat-gpt", params={"page_size": 1}, headers={**HEADERS, "If-None-Match": etag}
+        ).status_code == 304
+
+        # A file added before the first listed path does not shift the next page
+        (WORK_DIR / "0000_for_chat_gpt_test.txt").write_text("new\n")
+        response = client.get(
+            "/for-chat-gpt", params={"page_size": 1, "cursor": data["next_cursor"]}, headers=HEADERS
+        )
+        assert response.status_code == 200
+        second = response.json()
+        assert second["manifest_id"] == data["manifest_id"]
+        assert second["page"] == 2
+        assert second["files"][0]["path"] != data["files"][0]["path"]
+
+        assert client.get("/for-chat-gpt", params={"cursor": "bad"}, headers=HEADERS).status_code == 400
+        expired = encode_cursor("0" * 20, 0)
+        assert client.get("/for-chat-gpt", params={"cursor": expired}, headers=HEADERS).status_code == 410
+    finally:
+        for path in directory.iterdir():
+            path.unlink()
+        directory.rmdir()
+        (WORK_DIR / "0000_for_chat_gpt_test.txt").unlink(missing_ok=True)
+
+def test_pack_files_ranks_and_fits_budget(tmp_path):
+    (tmp_path / "api").mkdir()
+    (tmp_path / "api" / "server.py").write_text("import os\n" * 50)
+    (tmp_path / "notes.md").write_text("word " * 2000)
+    (tmp_path / "small.txt").write_text("tiny\n")
+    entries = ManifestStore(tmp_path, refresh_interval=0).current().entries
+
+    ranked = rank_entries(entries, ["api/**"], ["*.txt"], {"notes.md": 1}, recent_first=True)
+    assert [path for path, _, _ in ranked] == [os.path.join("api", "server.py"), "notes.md"]
+
+    server_tokens = estimate_tokens("import os\n" * 50)
+    packed = pack_files(tmp_path, ranked, server_tokens + 300)
+    assert [(f["path"], f["truncated"]) for f in packed["files"]] == [
+        (os.path.join("api", "server.py"), False), ("notes.md", True)
+    ]
+    assert packed["tokens_used"] <= server_tokens + 300
+
+    packed = pack_files(tmp_path, ranked, server_tokens + 300, truncate=False)
+    assert [f["path"] for f in packed["files"]] == [os.path.join("api", "server.py")]
+    assert packed["files_omitted"] == 1
+
+def test_pack_endpoint(monkeypatch):
+    path = WORK_DIR / "pack_test_unicorn.md"
+    path.write_text("the unicorn section\n")
+    monkeypatch.setattr(get_manifest_store(), "refresh_interval", 0)
+    monkeypatch.setattr(get_search_index(), "refresh_interval", 0)
+    try:
+        response = client.post(
+            "/for-chat-gpt/pack", json={"token_budget": 2000, "query": "unicorn"}, headers=HEADERS
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["files"][0]["path"] == "pack_test_unicorn.md"
+        assert data["tokens_used"] <= 2000
+        assert client.post("/for-chat-gpt/pack", json={"token_budget": 0}, headers=HEADERS).status_code == 422
+    finally:
+        path.unlink()
+
+def test_snapshot_delta(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "keep.py").write_text("a = 1\n")
+    (root / "change.py").write_text("x = 1\ny = 2\n")
+    (root / "remove.md").write_text("bye\n")
+    manifests = ManifestStore(root, refresh_interval=0)
+    store = SnapshotStore(root, tmp_path / "snapshots.sqlite3", history=2)
+    read = store._read
+    reading_threads = set()
+
+    def recording_read(*args):
+        reading_threads.add(threading.current_thread().name)
+        return read(*args)
+
+    monkeypatch.setattr(store, "_read", recording_read)
+    try:
+        first = store.record(manifests.current())
+        assert store.record(manifests.current()) == first
+        # Contents are stored by the background snapshotter, never while recording
+        store.flush()
+        assert reading_threads == {"snapshots"}
+
+        (root / "change.py").write_text("x = 1\ny = 3\n")
+        os.utime(root / "change.py", ns=(1, 1))
+        os.remove(root / "remove.md")
+        (root / "new.txt").write_text("hello\n")
+        second = store.record(manifests.current())
+
+        changes = store.delta(first, second)
+        assert changes["added"] == [{"path": "new.txt", "content": "hello\n"}]
+        assert changes["modified"] == [{"path": "change.py", "content": "x = 1\ny = 3\n"}]
+        assert changes["deleted"] == ["remove.md"]
+        diff = store.delta(first, second, unified_diff=True)["modified"][0]["diff"]
+        assert "-y = 2\n+y = 3\n" in diff
+        assert store.delta(second, second) == {"added": [], "modified": [], "deleted": []}
+
+        (root / "new.txt").write_text("hello again\n")
+        store.record(manifests.current())
+        assert store.delta(first, second) is None
+    finally:
+        store.close()
+
+def test_since_returns_only_changes(monkeypatch):
+    monkeypatch.setattr(get_manifest_store(), "refresh_interval", 0)
+    path = WORK_DIR / "since_test_file.txt"
+    path.write_text("one\n")
+    try:
+        version = client.get("/for-chat-gpt", headers=HEADERS).json()["version"]
+        get_snapshot_store().flush()
+        path.write_text("one\ntwo\n")
+        response = client.get("/for-chat-gpt", params={"since": version, "diff": True}, headers=HEADERS)
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["path"] for item in data["modified"]] == ["since_test_file.txt"]
+        assert "+two" in data["modified"][0]["diff"]
+        assert data["added"] == [] and data["deleted"] == []
+
+        response = client.get("/for-chat-gpt", params={"since": data["version"]}, headers=HEADERS)
+        assert response.json()["modified"] == []
+        assert client.get("/for-chat-gpt", params={"since": "unknown"}, headers=HEADERS).status_code == 410
+    finally:
+        path.unlink()
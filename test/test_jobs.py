@@ -0,0 +1,101 @@
+import os
+import subprocess
+import time
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import SAFE_COMMANDS
+from api.jobs_endpoint import JobManager
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}", headers=HEADERS).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish in time")
+
+def test_job_runs_and_output_is_readable_by_offset(client):
+    response = client.post("/jobs", json={"command": "echo Hello && echo World", "plan": "testing"}, headers=HEADERS)
+    assert response.status_code == 200
+    job_id = response.json()["id"]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "succeeded"
+    assert job["exit_code"] == 0
+
+    output = client.get(f"/jobs/{job_id}/output", params={"offset": 6}, headers=HEADERS).json()
+    assert output["output"] == "World\n"
+    assert output["complete"] is True
+
+    jobs = client.get("/jobs", headers=HEADERS).json()["jobs"]
+    assert job_id in [job["id"] for job in jobs]
+
+def test_job_rejects_unsafe_command(client):
+    response = client.post("/jobs", json={"command": "rm -rf /", "plan": "testing"}, headers=HEADERS)
+    assert response.status_code == 403
+
+def test_cancel_running_job(client, monkeypatch):
+    monkeypatch.setattr("api.run_command_endpoint.SAFE_COMMANDS", SAFE_COMMANDS | {"sleep"})
+    job_id = client.post("/jobs", json={"command": "sleep 30", "plan": "testing"}, headers=HEADERS).json()["id"]
+    deadline = time.time() + 5
+    while client.get(f"/jobs/{job_id}", headers=HEADERS).json()["status"] != "running" and time.time() < deadline:
+        time.sleep(0.05)
+
+    response = client.post(f"/jobs/{job_id}/cancel", headers=HEADERS)
+    assert response.status_code == 200
+    assert wait_for_job(client, job_id)["status"] == "cancelled"
+
+def test_job_runs_with_command_limits(client, monkeypatch):
+    monkeypatch.setattr("api.run_command_endpoint.SAFE_COMMANDS", SAFE_COMMANDS | {"sh", "seq"})
+    monkeypatch.setattr("api.run_command_endpoint.COMMAND_MAX_OPEN_FILES", 64)
+    response = client.post("/jobs", json={"command": "sh -c 'ulimit -Hn'", "plan": "testing"}, headers=HEADERS)
+    job_id = response.json()["id"]
+    assert wait_for_job(client, job_id)["status"] == "succeeded"
+    assert client.get(f"/jobs/{job_id}/output", headers=HEADERS).json()["output"] == "64\n"
+
+    monkeypatch.setattr("api.jobs_endpoint.COMMAND_MAX_OUTPUT_BYTES", 1000)
+    job_id = client.post("/jobs", json={"command": "seq 1 1000000", "plan": "testing"}, headers=HEADERS).json()["id"]
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "Output exceeded 1000 bytes"
+    output = client.get(f"/jobs/{job_id}/output", headers=HEADERS).json()["output"]
+    assert len(output) == 1000 and output.startswith("1\n2\n")
+
+def test_job_timeout_must_be_positive_and_bounded(client):
+    for timeout in (0, -1, 10 ** 9):
+        response = client.post(
+            "/jobs", json={"command": "echo Hello", "plan": "testing", "timeout": timeout}, headers=HEADERS
+        )
+        assert response.status_code == 422
+
+def test_restart_kills_process_groups_of_interrupted_jobs(tmp_path):
+    orphan = subprocess.Popen(["sleep", "30"], start_new_session=True)
+    dead_server = subprocess.Popen(["true"])
+    dead_server.wait()
+    manager = JobManager(tmp_path / "jobs.sqlite3", tmp_path / "jobs", 1)
+    manager._execute(
+        "INSERT INTO jobs (id, command, plan, status, owner, created, pgids) VALUES (?, ?, ?, 'running', ?, ?, ?)",
+        ("orphaned", "sleep 30", "testing", dead_server.pid, time.time(), str(orphan.pid))
+    )
+    try:
+        JobManager(tmp_path / "jobs.sqlite3", tmp_path / "jobs", 1)
+        assert orphan.wait(timeout=5) == -9
+        assert manager.get("orphaned")["status"] == "interrupted"
+    finally:
+        orphan.kill()
+        orphan.wait()
@@ -0,0 +1,58 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.output_capture import RingBuffer, OutputCapture
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_ring_buffer_keeps_most_recent_bytes():
+    ring = RingBuffer(8)
+    ring.write(b"abcde")
+    ring.write(b"fghij")
+    assert ring.getvalue() == b"cdefghij"
+    ring.write(b"0123456789")
+    assert ring.getvalue() == b"23456789"
+
+def test_output_capture_keeps_head_and_tail():
+    capture = OutputCapture(head_bytes=4, tail_bytes=4)
+    capture.write(b"0123")
+    capture.write(b"4567")
+    assert not capture.truncated
+    capture.write(b"89ab")
+    capture.close()
+    assert capture.truncated
+    assert capture.total_bytes == 12
+    value = capture.getvalue()
+    assert value.startswith(b"0123") and value.endswith(b"89ab")
+    assert b"4 bytes truncated" in value
+
+def test_run_command_spills_large_output():
+    content = "".join(f"line {i}\n" for i in range(40000))
+    client.put("/files/large_output.txt", json={"content": content}, headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"})
+    response = client.post(
+        "/run-command",
+        json={"command": "cat large_output.txt", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["truncated"] is True
+    output_file = body["output_files"][0]
+    assert output_file["total_bytes"] == len(content)
+
+    page = client.get(
+        f"/run-command/output/{output_file['handle']}",
+        params={"offset": 0, "limit": 14},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert page.status_code == 200
+    assert page.json()["output"] == "line 0\nline 1\n"
+    assert page.json()["next_offset"] == 14
+    client.delete("/files/large_output.txt", headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"})
@@ -0,0 +1,84 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api import line_index
+from api.line_index import read_line_range, read_tail, line_index_cache
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+LINES = [f"line {i}\n" for i in range(1, 101)]
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def log_file():
+    path = WORK_DIR / "range_test.log"
+    path.write_text("".join(LINES))
+    yield path
+    path.unlink()
+
+def test_line_ranges_across_checkpoints_and_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(line_index, "CHECKPOINT_LINES", 7)
+    monkeypatch.setattr(line_index, "BLOCK_SIZE", 16)
+    monkeypatch.setattr(line_index, "TAIL_BLOCK_SIZE", 10)
+    path = tmp_path / "numbers.txt"
+    path.write_text("".join(LINES[:-1]) + "line 100")
+
+    result = read_line_range(path, 13, 16)
+    assert result["content"] == "".join(LINES[12:16])
+    assert (result["start_line"], result["end_line"], result["total_lines"]) == (13, 16, 100)
+    assert read_line_range(path, 99)["content"] == "line 99\nline 100"
+    assert read_line_range(path, 150)["content"] == ""
+
+    tail = read_tail(path, 3)
+    assert tail["content"] == "line 98\nline 99\nline 100"
+    assert (tail["start_line"], tail["end_line"]) == (98, 100)
+
+    path.write_text("changed\n")
+    assert read_line_range(path, 1)["total_lines"] == 1
+    assert read_tail(path, 0)["content"] == ""
+
+def test_read_file_lines_and_tail(log_file):
+    response = client.get("/files/range_test.log", params={"start_line": 10, "end_line": 12}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()["content"] == "line 10\nline 11\nline 12\n"
+
+    response = client.get("/files/range_test.log", params={"tail": 2}, headers=HEADERS)
+    assert response.json()["content"] == "line 99\nline 100\n"
+
+    response = client.get("/files/range_test.log", params={"start_line": 5, "end_line": 4}, headers=HEADERS)
+    assert response.status_code == 400
+
+def test_read_file_byte_range(log_file):
+    response = client.get("/files/range_test.log", headers={**HEADERS, "Range": "bytes=0-6"})
+    assert response.status_code == 206
+    assert response.content == b"line 1\n"
+    assert response.headers["Content-Range"] == f"bytes 0-6/{len(''.join(LINES))}"
+
+    response = client.get("/files/range_test.log", headers={**HEADERS, "Range": "bytes=-9"})
+    assert response.content == b"line 100\n"
+
+    response = client.get("/files/range_test.log", headers={**HEADERS, "Range": "bytes=99999-"})
+    assert response.status_code == 416
+
+def test_byte_range_of_directory_or_binary_file():
+    directory = WORK_DIR / "range_test_dir"
+    directory.mkdir(exist_ok=True)
+    binary = WORK_DIR / "range_test.bin"
+    binary.write_bytes(b"\x00\x01\x02binary" * 100)
+    try:
+        response = client.get("/files/range_test_dir", headers={**HEADERS, "Range": "bytes=0-6"})
+        assert response.status_code == 404
+        response = client.get("/files/range_test.bin", headers={**HEADERS, "Range": "bytes=0-6"})
+        assert response.status_code == 415
+    finally:
+        directory.rmdir()
+        binary.unlink()
@@ -0,0 +1,71 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.relevance_index import RelevanceIndex, tokenize, get_relevance_index
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("parseHTTPRequest") == ["parse", "http", "request"]
+    assert tokenize("the retry_count") == ["retry", "count", "retry_count"]
+
+def test_index_ranks_chunks_and_updates(tmp_path):
+    filler = "".join(f"value_{i} = {i}\n" for i in range(120))
+    (tmp_path / "billing.py").write_text(filler + "def charge_invoice(invoice):\n    refund the invoice payment\n")
+    (tmp_path / "notes.md").write_text("The invoice template lives elsewhere.\n")
+    (tmp_path / "other.txt").write_text("nothing relevant here\n")
+    index = RelevanceIndex(tmp_path, refresh_interval=0)
+    index.refresh()
+
+    results = index.query("refund invoice payment", top_k=5, chunks_per_file=1)
+    assert [path for path, _, _ in results] == ["billing.py", "notes.md"]
+    assert results[0][2][0][:2] == (101, 122)
+    assert index.query("unknownword", 5, 1) == []
+
+    (tmp_path / "other.txt").write_text("refund policy for every payment and refund\n")
+    os.remove(tmp_path / "notes.md")
+    index.refresh()
+    paths = [path for path, _, _ in index.query("refund payment", 5, 1)]
+    assert "other.txt" in paths and "notes.md" not in paths
+
+def test_index_covers_all_text_files_and_drops_unused_terms(tmp_path):
+    (tmp_path / "app.js").write_text("function renderWidget() { return widget; }\n")
+    (tmp_path / "Makefile").write_text("widget:\n\tbuild widget\n")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\0\0widget" * 10)
+    (tmp_path / "old.toml").write_text("obsolete_setting = 1\n")
+    index = RelevanceIndex(tmp_path, refresh_interval=0)
+    index.refresh()
+    assert sorted(path for path, _, _ in index.query("widget", 5, 1)) == ["Makefile", "app.js"]
+    assert "obsolete" in index._vocabulary
+
+    (tmp_path / "old.toml").write_text("current_setting = 2\n")
+    index.refresh()
+    assert "obsolete" not in index._vocabulary and "obsolete_setting" not in index._vocabulary
+    assert [path for path, _, _ in index.query("current setting", 5, 1)] == ["old.toml"]
+    assert index.query("obsolete", 5, 1) == []
+
+def test_relevant_files_endpoint(monkeypatch):
+    path = WORK_DIR / "relevance_test_file.md"
+    path.write_text("How the zeppelin docking procedure works.\n")
+    monkeypatch.setattr(get_relevance_index(), "refresh_interval", 0)
+    try:
+        response = client.post(
+            "/relevant-files", json={"query": "zeppelin docking", "include_text": True}, headers=HEADERS
+        )
+        assert response.status_code == 200
+        result = response.json()["results"][0]
+        assert result["path"] == "relevance_test_file.md"
+        assert result["chunks"][0]["text"] == "How the zeppelin docking procedure works."
+        assert client.post("/relevant-files", json={"query": " "}, headers=HEADERS).status_code == 400
+    finally:
+        path.unlink()
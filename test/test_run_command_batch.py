@@ -0,0 +1,27 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_run_command_batch():
+    response = client.post(
+        "/run-command/batch",
+        json={"commands": ["echo first", "rm -rf /", "echo third"], "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["stdout"] == "first"
+    assert results[0]["error"] is None
+    assert results[1]["status_code"] == 403
+    assert results[2]["stdout"] == "third"
+    assert all("elapsed" in result for result in results)
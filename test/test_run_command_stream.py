@@ -0,0 +1,49 @@
+import os
+import json
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_run_command_stream():
+    response = client.post(
+        "/run-command/stream",
+        json={"command": "echo Hello && echo World", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    frames = [json.loads(line) for line in response.text.splitlines() if line]
+    stdout = [(frame["index"], frame["line"]) for frame in frames if frame["type"] == "stdout"]
+    assert stdout == [(0, "Hello"), (1, "World")]
+    assert frames[-1] == {"type": "end", "exit_code": 0}
+
+def test_run_command_stream_rejects_unsafe_command():
+    response = client.post(
+        "/run-command/stream",
+        json={"command": "echo Hello && rm -rf /", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 403
+
+def test_run_command_stream_enforces_output_limit(monkeypatch):
+    monkeypatch.setattr("api.run_command_endpoint.COMMAND_MAX_OUTPUT_BYTES", 1000)
+    monkeypatch.setattr("api.run_command_endpoint.SAFE_COMMANDS", {"seq"})
+    response = client.post(
+        "/run-command/stream",
+        json={"command": "seq 1 1000000", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    frames = [json.loads(line) for line in response.text.splitlines() if line]
+    stdout = [frame["line"] for frame in frames if frame["type"] == "stdout"]
+    assert sum(len(line) + 1 for line in stdout) <= 1000
+    exit_frame = [frame for frame in frames if frame["type"] == "exit"][0]
+    assert exit_frame["resources"]["output_limit_exceeded"] is True
+    assert exit_frame["exit_code"] != 0
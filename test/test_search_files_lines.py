@@ -0,0 +1,78 @@
+import os
+import shutil
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.search_index import get_search_index
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def source_file(monkeypatch):
+    monkeypatch.setattr(get_search_index(), "refresh_interval", 0)
+    directory = os.path.join(WORK_DIR, "search_lines_test")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "sample.py"), "w") as f:
+        f.write("import os\n\ndef lookup_value(x):\n    return LookupValue(x)\n# lookup_values\n")
+    yield os.path.join("search_lines_test", "sample.py")
+    shutil.rmtree(directory)
+
+def test_search_lines_returns_line_numbers_and_context(source_file):
+    response = client.post(
+        "/search-files/lines",
+        json={"pattern": "lookup_value", "whole_word": True, "context_lines": 1},
+        headers=HEADERS
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["matches"] == [{
+        "path": source_file,
+        "line": 3,
+        "column": 5,
+        "text": "def lookup_value(x):",
+        "before": [""],
+        "after": ["    return LookupValue(x)"]
+    }]
+    assert data["truncated"] is False
+
+def test_search_lines_supports_case_sensitive_regex(source_file):
+    response = client.post(
+        "/search-files/lines",
+        json={"pattern": r"Lookup\w+\(", "regex": True, "case_sensitive": True},
+        headers=HEADERS
+    )
+    matches = [match for match in response.json()["matches"] if match["path"] == source_file]
+    assert [(match["line"], match["column"]) for match in matches] == [(4, 12)]
+
+    response = client.post("/search-files/lines", json={"pattern": "(", "regex": True}, headers=HEADERS)
+    assert response.status_code == 400
+
+def test_search_lines_reads_past_indexed_start(monkeypatch):
+    monkeypatch.setattr(get_search_index(), "refresh_interval", 0)
+    path = os.path.join(WORK_DIR, "search_lines_large.txt")
+    with open(path, "w") as f:
+        f.write("filler line of text\n" * 120000)
+        f.write("uniqueneedle here\n")
+    try:
+        response = client.post("/search-files/lines", json={"pattern": "uniqueneedle"}, headers=HEADERS)
+        matches = [match for match in response.json()["matches"] if match["path"] == "search_lines_large.txt"]
+        assert [match["line"] for match in matches] == [120001]
+    finally:
+        os.remove(path)
+
+def test_search_lines_truncated_only_when_matches_are_left_out(source_file):
+    request = {"pattern": "lookup_value", "whole_word": True, "max_results": 1}
+    assert client.post("/search-files/lines", json=request, headers=HEADERS).json()["truncated"] is False
+    request["whole_word"] = False
+    response = client.post("/search-files/lines", json=request, headers=HEADERS).json()
+    assert response["truncated"] is True
+    assert len(response["matches"]) == 1
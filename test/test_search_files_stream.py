@@ -0,0 +1,55 @@
+import os
+import json
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.search_index import get_search_index
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def search_dir(monkeypatch):
+    monkeypatch.setattr(get_search_index(), "refresh_interval", 0)
+    directory = os.path.join(WORK_DIR, "search_stream_test")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(5):
+        path = os.path.join(directory, f"file{i}.txt")
+        with open(path, "w") as f:
+            f.write(f"streamed search marker {i}")
+        paths.append(path)
+    yield directory
+    for path in paths:
+        os.remove(path)
+    os.rmdir(directory)
+
+def test_search_files_stream_returns_matches_and_summary(search_dir):
+    response = client.post("/search-files/stream", json={"query": "search marker"}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    frames = [json.loads(line) for line in response.text.splitlines() if line]
+    paths = sorted(frame["path"] for frame in frames if frame["type"] == "match")
+    assert paths == [os.path.join("search_stream_test", f"file{i}.txt") for i in range(5)]
+    assert frames[-1] == {"type": "end", "matches": 5, "truncated": False, "timed_out": False}
+
+def test_search_files_stops_at_max_results(search_dir):
+    response = client.post("/search-files", json={"query": "search marker", "max_results": 2}, headers=HEADERS)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["matches"]) == 2
+    assert data["truncated"] is True
+
+    # Short queries have no trigrams and walk the tree instead of the index
+    response = client.post("/search-files/stream", json={"query": "r 3", "max_results": 1}, headers=HEADERS)
+    frames = [json.loads(line) for line in response.text.splitlines() if line]
+    assert frames[0] == {"type": "match", "path": os.path.join("search_stream_test", "file3.txt")}
+    assert frames[-1]["truncated"] is True
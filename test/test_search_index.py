@@ -0,0 +1,79 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.search_index import TrigramIndex, get_search_index
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def index(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    index = TrigramIndex(root, tmp_path / "index.sqlite3", refresh_interval=0)
+    yield index
+    index.close()
+
+def test_index_finds_candidates_by_content_and_name(index):
+    root = index.root
+    with open(os.path.join(root, "alpha.txt"), "w") as f:
+        f.write("The Quick brown fox")
+    with open(os.path.join(root, "beta.txt"), "w") as f:
+        f.write("lazy dog")
+    index.refresh()
+    assert index.candidates("quick brown") == ["alpha.txt"]
+    assert index.candidates("BETA") == ["beta.txt"]
+    assert index.candidates("missing") == []
+
+def test_index_follows_changed_and_removed_files(index, tmp_path):
+    path = os.path.join(index.root, "notes.txt")
+    with open(path, "w") as f:
+        f.write("first version")
+    index.refresh()
+    assert index.candidates("first") == ["notes.txt"]
+
+    with open(path, "w") as f:
+        f.write("second version, longer")
+    index.refresh()
+    assert index.candidates("first") == []
+    assert index.candidates("second") == ["notes.txt"]
+
+    os.remove(path)
+    index.refresh()
+    assert index.candidates("second") == []
+
+    # The index survives reopening and is not rebuilt for unchanged files
+    reopened = TrigramIndex(index.root, tmp_path / "index.sqlite3", refresh_interval=0)
+    with open(os.path.join(index.root, "kept.txt"), "w") as f:
+        f.write("persistent content")
+    reopened.refresh()
+    reopened.close()
+    assert index.candidates("persistent") == ["kept.txt"]
+
+def test_search_files_uses_index_and_confirms_matches():
+    path = os.path.join(WORK_DIR, "search_index_test_file.txt")
+    try:
+        # Written through the API, so the next search refreshes the index at once
+        response = client.put("/files/search_index_test_file.txt", json={"content": "needle in a haystack"}, headers=HEADERS)
+        assert response.status_code == 200
+        response = client.post("/search-files", json={"query": "Needle in"}, headers=HEADERS)
+        assert response.status_code == 200
+        assert "search_index_test_file.txt" in response.json()["matches"]
+        # Every trigram occurs in the file, but not the query as a whole
+        response = client.post("/search-files", json={"query": "in a needle"}, headers=HEADERS)
+        assert "search_index_test_file.txt" not in response.json()["matches"]
+
+        client.put("/files/search_index_test_file.txt", json={"content": "zebra crossing"}, headers=HEADERS)
+        response = client.post("/search-files", json={"query": "zebra"}, headers=HEADERS)
+        assert "search_index_test_file.txt" in response.json()["matches"]
+    finally:
+        os.remove(path)
@@ -1,7 +1,11 @@
+import asyncio
 import os
+import resource
+import sys
 import pytest
 from fastapi.testclient import TestClient
 from api.server import app
+from api.run_command_endpoint import spawn_process, split_commands
 
 client = TestClient(app)
 
@@ -91,4 +95,78 @@ def test_run_command():
         headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
     )
     assert response.status_code == 200
-    assert response.json()["stdout"] == "Hello"
\ No newline at end of file
+    assert response.json()["stdout"] == "Hello"
+
+def test_run_command_chain_stops_on_failure():
+    response = client.post(
+        "/run-command",
+        json={"command": "ls nonexistent_dir_for_test && echo after", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 200
+    assert response.json()["exit_code"] != 0
+    assert "after" not in response.json()["stdout"]
+
+
+def test_run_command_pipe():
+    response = client.post(
+        "/run-command",
+        json={"command": "echo 'fix one|two' | cat | cat", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 200
+    assert response.json()["stdout"] == "fix one|two"
+    assert response.json()["exit_code"] == 0
+
+
+def test_split_commands_keeps_escaped_quotes_and_operators():
+    assert split_commands('echo "a \\" ; b"') == [[["echo", 'a " ; b']]]
+    assert split_commands("echo a\\;b \\| c && ls") == [[["echo", "a;b", "|", "c"]], [["ls"]]]
+    # Inside single quotes a backslash is an ordinary character
+    assert split_commands("echo 'a\\' ; ls") == [[["echo", "a\\"]], [["ls"]]]
+    response = client.post(
+        "/run-command",
+        json={"command": 'echo "a \\" ; b"', "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.json()["stdout"] == 'a " ; b'
+
+
+def test_run_command_reports_resources():
+    response = client.post(
+        "/run-command",
+        json={"command": "echo Hello | cat", "plan": "testing"},
+        headers={"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+    )
+    assert response.status_code == 200
+    resources = response.json()["resources"]
+    assert len(resources) == 1
+    assert resources[0]["command"] == "echo Hello | cat"
+    # The peak is the command's own, not the server's it was forked from (None if it exited too quickly)
+    server_peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert resources[0]["max_rss_kb"] is None or resources[0]["max_rss_kb"] < server_peak_kb // 2
+    assert resources[0]["wall_time"] >= 0
+
+
+def test_spawn_process_samples_peak_rss_and_applies_limits():
+    async def run(tokens, limits=None):
+        process = await spawn_process(
+            tokens, stdout=asyncio.subprocess.PIPE, resource_limits=limits
+        )
+        output = await process.stdout.read()
+        await process.wait()
+        return process, output
+
+    allocate = "import time; data = bytearray(200 * 1024 * 1024); time.sleep(0.2)"
+    process, _ = asyncio.run(run([sys.executable, "-c", allocate]))
+    assert process.peak_rss_kb >= 200 * 1024
+
+    process, _ = asyncio.run(run(["sleep", "0.2"]))
+    assert process.peak_rss_kb < 50 * 1024
+
+    report_limit = "import resource; print(resource.getrlimit(resource.RLIMIT_NOFILE)[0])"
+    process, output = asyncio.run(run([sys.executable, "-c", report_limit], [(resource.RLIMIT_NOFILE, 64)]))
+    assert output.strip() == b"64"
+    # Set before exec, and the hard limit too, so the command cannot raise it back
+    process, output = asyncio.run(run(["sh", "-c", "ulimit -Hn"], [(resource.RLIMIT_NOFILE, 64)]))
+    assert output.strip() == b"64"
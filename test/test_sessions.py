@@ -0,0 +1,96 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+
+client = TestClient(app)
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    client.post("/directories/session_test_dir", headers=HEADERS)
+    yield
+    client.delete("/sessions/test_session", headers=HEADERS)
+    client.delete("/directories/session_test_dir", headers=HEADERS)
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def run(command):
+    return client.post(
+        "/sessions/test_session/run-command",
+        json={"command": command, "plan": "testing"},
+        headers=HEADERS
+    )
+
+def test_session_keeps_cwd_and_env_between_calls():
+    assert run("cd session_test_dir && export GREETING=Hello").status_code == 200
+    response = run("pwd")
+    assert response.status_code == 200
+    assert response.json()["stdout"].endswith("session_test_dir")
+    assert response.json()["session"]["cwd"] == "session_test_dir"
+    assert response.json()["session"]["env"] == {"GREETING": "Hello"}
+
+def test_session_blocks_traversal_and_unsafe_commands():
+    response = run("cd ../..")
+    assert response.json()["exit_code"] == 1
+    assert "path traversal" in response.json()["stderr"]
+    assert run("rm -rf /").status_code == 403
+    assert run("export LD_PRELOAD=/tmp/x.so").json()["exit_code"] == 1
+
+def test_session_cannot_shadow_whitelisted_commands():
+    from api.config import WORK_DIR
+    fake_bin = WORK_DIR / "session_test_dir" / "fakebin"
+    fake_bin.mkdir()
+    fake_ls = fake_bin / "ls"
+    fake_ls.write_text("#!/bin/sh\necho shadowed\n")
+    fake_ls.chmod(0o755)
+    try:
+        response = run(f"export PATH={fake_bin}:$PATH")
+        assert response.json()["exit_code"] == 1
+        assert "PATH is not allowed" in response.json()["stderr"]
+        assert run("unset PATH").json()["exit_code"] == 1
+        response = run("ls")
+        assert response.status_code == 200
+        assert "shadowed" not in response.json()["stdout"]
+        for name in ("GIT_CONFIG_COUNT", "GIT_CONFIG_KEY_0", "GIT_CONFIG_PARAMETERS", "PYTHONPATH", "NODE_OPTIONS", "VIRTUAL_ENV"):
+            assert run(f"export {name}=x").json()["exit_code"] == 1
+    finally:
+        fake_ls.unlink()
+        fake_bin.rmdir()
+
+def test_sourced_directory_cannot_shadow_whitelisted_commands(monkeypatch):
+    from api.config import WORK_DIR
+    monkeypatch.setattr("api.run_command_endpoint.SAFE_COMMANDS", {"ls", "cat", "python"})
+    evil_bin = WORK_DIR / "session_test_dir" / "evil" / "bin"
+    evil_bin.mkdir(parents=True)
+    (evil_bin / "activate").write_text("")
+    for name in ("ls", "python"):
+        (evil_bin / name).write_text("#!/bin/sh\necho PWNED\n")
+        (evil_bin / name).chmod(0o755)
+
+    def run_in(command):
+        return client.post(
+            "/sessions/venv_session/run-command",
+            json={"command": command, "plan": "testing"},
+            headers=HEADERS
+        ).json()
+
+    try:
+        response = run_in("source session_test_dir/evil/bin/activate && ls")
+        assert response["exit_code"] == 1
+        assert "not a virtualenv" in response["stderr"]
+        assert "PWNED" not in response["stdout"]
+
+        # In a real virtualenv only the interpreter comes from its bin directory
+        (evil_bin.parent / "pyvenv.cfg").write_text("home = /usr/bin\n")
+        response = run_in("source session_test_dir/evil/bin/activate && ls session_test_dir")
+        assert response["exit_code"] == 0
+        assert "PWNED" not in response["stdout"] and "evil" in response["stdout"]
+        assert run_in("python")["stdout"] == "PWNED"
+    finally:
+        client.delete("/sessions/venv_session", headers=HEADERS)
+        for name in ("activate", "ls", "python"):
+            (evil_bin / name).unlink()
+        (evil_bin.parent / "pyvenv.cfg").unlink(missing_ok=True)
+        evil_bin.rmdir()
+        evil_bin.parent.rmdir()
@@ -0,0 +1,99 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.symbol_index import SymbolIndex, get_symbol_index
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+SOURCE = '''import functools
+
+class Parser:
+    """Parses things."""
+
+    @functools.cache
+    def parse(self, text):
+        return text.split()
+
+    async def close(self):
+        pass
+
+def parse(text):
+    def helper():
+        return text
+    return helper()
+'''
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def test_index_reparses_only_changed_content(tmp_path):
+    (tmp_path / "parser.py").write_text(SOURCE)
+    (tmp_path / "copy.py").write_text(SOURCE)
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+    index = SymbolIndex(tmp_path, refresh_interval=0)
+    index.refresh()
+
+    definitions = index.definitions("parse")
+    assert [(path, symbol["qualname"]) for path, symbol in definitions] == [
+        ("copy.py", "Parser.parse"), ("copy.py", "parse"), ("parser.py", "Parser.parse"), ("parser.py", "parse")
+    ]
+    assert index.definitions("Parser.parse", kind="method")[0][1]["start_line"] == 6
+    assert [symbol["kind"] for symbol in index.outline("parser.py")] == [
+        "class", "method", "async method", "function", "function"
+    ]
+    assert index.outline("broken.py") == []
+    assert len(index._symbols) == 2
+
+    (tmp_path / "copy.py").write_text("def other():\n    pass\n")
+    os.remove(tmp_path / "broken.py")
+    index.refresh()
+    assert [path for path, _ in index.definitions("parse")] == ["parser.py", "parser.py"]
+    assert index.definitions("other")[0][0] == "copy.py"
+    assert index.outline("broken.py") is None
+
+def test_symbols_endpoints():
+    relative = "symbols_test_module.py"
+    path = WORK_DIR / relative
+    path.write_text(SOURCE)
+    try:
+        get_symbol_index().refresh()
+        response = client.get("/symbols/definitions", params={"name": "Parser"}, headers=HEADERS)
+        assert response.status_code == 200
+        assert {"path": relative, "kind": "class", "line": 3, "end_line": 11}.items() <= response.json()["definitions"][0].items()
+
+        response = client.get(f"/symbols/outline/{relative}", headers=HEADERS)
+        assert response.status_code == 200
+        assert [symbol["qualname"] for symbol in response.json()["symbols"]] == [
+            "Parser", "Parser.parse", "Parser.close", "parse", "parse.helper"
+        ]
+
+        response = client.get(f"/symbols/source/{relative}", params={"name": "Parser.parse"}, headers=HEADERS)
+        assert response.status_code == 200
+        assert response.json()["source"] == (
+            "    @functools.cache\n    def parse(self, text):\n        return text.split()\n"
+        )
+
+        response = client.get(f"/symbols/source/{relative}", params={"name": "missing"}, headers=HEADERS)
+        assert response.status_code == 404
+        response = client.get("/symbols/outline/../secret.py", headers=HEADERS)
+        assert response.status_code in (400, 404)
+    finally:
+        path.unlink()
+
+def test_symbols_see_files_written_through_the_api():
+    relative = "symbols_written_module.py"
+    get_symbol_index().refresh()
+    try:
+        response = client.put(f"/files/{relative}", json={"content": "def freshly_written():\n    pass\n"}, headers=HEADERS)
+        assert response.status_code == 200
+        response = client.get("/symbols/definitions", params={"name": "freshly_written"}, headers=HEADERS)
+        assert [definition["path"] for definition in response.json()["definitions"]] == [relative]
+    finally:
+        (WORK_DIR / relative).unlink()
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.log_follow import follow_file
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+@pytest.fixture
+def log_file():
+    path = WORK_DIR / "tail_test.log"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 21)))
+    yield path
+    path.unlink(missing_ok=True)
+
+def test_tail_without_follow(log_file):
+    response = client.get("/files-tail/tail_test.log", params={"lines": 2}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()["content"] == "line 19\nline 20\n"
+    assert client.get("/files-tail/missing.log", headers=HEADERS).status_code == 404
+
+def test_file_named_tail_is_readable():
+    directory = WORK_DIR / "tail_test_dir"
+    directory.mkdir(exist_ok=True)
+    (directory / "tail").write_text("not a tail\n")
+    try:
+        response = client.get("/files/tail_test_dir/tail", headers=HEADERS)
+        assert response.status_code == 200
+        assert response.json() == "not a tail\n"
+        response = client.get("/files-tail/tail_test_dir/tail", headers=HEADERS)
+        assert response.json()["content"] == "not a tail\n"
+    finally:
+        (directory / "tail").unlink()
+        directory.rmdir()
+
+def test_follow_stream_ends_after_timeout(log_file):
+    response = client.get(
+        "/files-tail/tail_test.log", params={"lines": 1, "follow": True, "timeout_ms": 50}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    frames = [json.loads(line) for line in response.text.splitlines()]
+    assert frames[0]["type"] == "tail" and frames[0]["content"] == "line 20\n"
+    assert frames[-1] == {"type": "end", "reason": "timeout"}
+
+def test_follow_appends_truncation_and_rotation(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("old 1\nold 2\n")
+
+    async def run():
+        frames = []
+        follower = follow_file(path, 1, poll_interval=0.05)
+
+        async def next_frame():
+            frame = await asyncio.wait_for(follower.__anext__(), 5)
+            frames.append(frame)
+            return frame
+
+        assert (await next_frame())["content"] == "old 2\n"
+        with open(path, "ab") as f:
+            # The euro sign is split across writes; the decoder holds the first bytes back
+            f.write("new ".encode() + "€".encode()[:1])
+            f.flush()
+            assert (await next_frame()) == {"type": "data", "content": "new "}
+            f.write("€".encode()[1:] + b"\n")
+        assert (await next_frame()) == {"type": "data", "content": "€\n"}
+
+        path.write_text("")
+        with open(path, "ab") as f:
+            f.write(b"after truncate\n")
+        assert (await next_frame()) == {"type": "truncated"}
+        assert (await next_frame()) == {"type": "data", "content": "after truncate\n"}
+
+        os.rename(path, tmp_path / "app.log.1")
+        path.write_text("rotated\n")
+        received = [await next_frame()]
+        while received[-1] != {"type": "data", "content": "rotated\n"}:
+            received.append(await next_frame())
+        assert {"type": "rotated"} in received
+        await follower.aclose()
+        return frames
+
+    asyncio.run(run())
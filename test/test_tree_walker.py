@@ -0,0 +1,62 @@
+import os
+import shutil
+import pytest
+from fastapi.testclient import TestClient
+from api.server import app
+from api.config import WORK_DIR
+from api.tree_walker import walk_files, translate_pattern
+
+client = TestClient(app)
+
+HEADERS = {"GPTONROIDS_API_KEY": "test_GPTONROIDS_API_KEY"}
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_env():
+    os.environ["GPTONROIDS_API_KEY"] = "test_GPTONROIDS_API_KEY"
+    yield
+    del os.environ["GPTONROIDS_API_KEY"]
+
+def write(path, content=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+def test_translate_pattern():
+    assert translate_pattern("*.log") == r"(?:.*/)?[^/]*\.log"
+    assert translate_pattern("/build") == "build"
+    assert translate_pattern("docs/**/*.md") == r"docs/(?:.*/)?[^/]*\.md"
+
+def test_walk_files_honors_ignore_files(tmp_path):
+    root = tmp_path
+    write(root / ".gitignore", "*.log\n!keep.log\nbuild/\n/top.txt\n")
+    write(root / "app.py")
+    write(root / "debug.log")
+    write(root / "keep.log")
+    write(root / "top.txt")
+    write(root / "build" / "out.py")
+    write(root / "src" / "top.txt")
+    write(root / "src" / ".ignore", "generated.py\n")
+    write(root / "src" / "generated.py")
+    write(root / "src" / "nested" / "generated.py")
+    write(root / "node_modules" / "lib" / "index.js")
+    write(root / "build.py")
+
+    files = sorted(os.path.relpath(path, root) for path in walk_files(root))
+    assert files == [
+        ".gitignore", "app.py", "build.py", "keep.log",
+        os.path.join("src", ".ignore"), os.path.join("src", "top.txt")
+    ]
+    assert len(list(walk_files(root, include_ignored=True))) == 12
+
+def test_directory_listing_skips_ignored_entries():
+    directory = os.path.join(WORK_DIR, "tree_walker_test")
+    write(os.path.join(directory, ".gitignore"), "ignored.txt\n")
+    write(os.path.join(directory, "ignored.txt"))
+    write(os.path.join(directory, "kept.txt"))
+    try:
+        response = client.get("/directories/tree_walker_test", headers=HEADERS)
+        assert response.json()["files"] == [".gitignore", "kept.txt"]
+        response = client.get("/directories/tree_walker_test?include_ignored=true", headers=HEADERS)
+        assert response.json()["files"] == [".gitignore", "ignored.txt", "kept.txt"]
+    finally:
+        shutil.rmtree(directory)